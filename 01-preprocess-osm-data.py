@@ -1,32 +1,43 @@
+import argparse
 import pandas as pd
-import sys
-from transform import get_tag_data
 
-def main(input_file, output_file):
-    """Preprocess OSM data by filling in wikidata identifiers (qid)
-    for OSM entries that have a Wikidata entry but are not associated with one.
-        - write preprocessed OSM data to output_file
+import instrument
+
+from collections import Counter
+
+from instrument import traced
+from names import get_fuzzy_matches
+from storage import (
+    get_format, write_arrow_chunks, write_frame, write_json_chunks
+)
+from transform import get_tags_data
+
+def add_tag_columns(osm_data):
+    """Add the qid (brand:wikidata) and cuisine tags of each OSM entry as
+    columns
 
     Args:
-        input_file (str):
-            osm_output_file from scrape_wikidata.py - should include the data
-            from amenities-vancouver.json.gz along with an additional column
-            for qid
-            
-        output_file (str):
-            json file in which some qids have been filled in
+        osm_data (dataframe): OSM data with a tags column
+
+    Returns:
+        None
+    """
+
+    tags_data = get_tags_data(osm_data['tags'], ['brand:wikidata', 'cuisine'])
+    osm_data['qid'] = tags_data['brand:wikidata']
+    osm_data['cuisine'] = tags_data['cuisine']
+
+def get_name_qid(osm_data):
+    """Get a dict with (name, qid) key value pairs for OSM entries that have
+    both a name and a qid - later entries win for names with several qids
+
+    Args:
+        osm_data (dataframe): OSM data with name and qid columns
+
+    Returns:
+        name_qid (dict): contains (name, qid) key value pairs
     """
-    # trailing data error - line adapted from
-    # https://stackoverflow.com/questions/30088006/
-    osm_data = pd.read_json(input_file, lines=True)
 
-    osm_data['qid'] = osm_data['tags'].apply(
-        lambda tags: get_tag_data(tags, 'brand:wikidata')
-    )
-    osm_data['cuisine'] = osm_data['tags'].apply(
-        lambda tags: get_tag_data(tags, 'cuisine')
-    )
-    
     has_qid = osm_data['qid'].notna()
     has_name = osm_data['name'].notna()
 
@@ -34,12 +45,74 @@ def main(input_file, output_file):
     # Wouter Overmeire's answer at https://stackoverflow.com/questions/17426292/
     valid_name_qid = osm_data.loc[has_qid & has_name, ['name', 'qid']].copy()
     name_qid = dict(zip(valid_name_qid['name'], valid_name_qid['qid']))
+    return name_qid
+
+def get_unmatched_name_counts(osm_data):
+    """Count the names of OSM entries that do not have a qid
+
+    Args:
+        osm_data (dataframe): OSM data with name and qid columns
+
+    Returns:
+        name_counts (series): number of entries without a qid per name
+    """
+
+    has_unmatched_name = osm_data['qid'].isna() & osm_data['name'].notna()
+    name_counts = osm_data.loc[has_unmatched_name, 'name'].value_counts()
+    return name_counts
+
+@traced
+def get_fuzzy_name_qid(name_counts, name_qid, threshold):
+    """Propose qids for names of OSM entries without a qid that are not in
+    name_qid by fuzzy matching them to the names in name_qid (see names.py),
+    and print the number of matches
+
+    Args:
+        name_counts (series):
+            number of entries without a qid per name, from
+            get_unmatched_name_counts
+
+        name_qid (dict): contains (name, qid) key value pairs
+        threshold (float): smallest similarity (0 to 1) of a match
+
+    Returns:
+        fuzzy_name_qid (dict):
+            contains (name, qid) key value pairs for the matched names -
+            none of them are keys of name_qid
+    """
+
+    # names with a qid elsewhere are filled in by the exact lookup
+    name_counts = name_counts[~name_counts.index.isin(name_qid.keys())]
+    matches = get_fuzzy_matches(name_counts.index, name_qid, threshold)
+    num_entries = int(name_counts[matches['name']].sum())
+    print(
+        f'Fuzzy name matching: {len(matches)} of {len(name_counts)} unmatched '
+        f'names ({num_entries} entries) matched to a qid'
+    )
+    fuzzy_name_qid = dict(zip(matches['name'], matches['qid']))
+    return fuzzy_name_qid
+
+@traced
+def fill_qids(osm_data, name_qid):
+    """Fill in missing qids using name_qid
+
+    Args:
+        osm_data (dataframe): OSM data with name, qid and cuisine columns
+        name_qid (dict): contains (name, qid) key value pairs
+
+    Returns:
+        preprocessed_osm_data (dataframe):
+            OSM data with the qid column replaced by the filled in qids
+    """
+
+    has_qid = osm_data['qid'].notna()
+    has_name = osm_data['name'].notna()
 
     # fill in missing qids for OSM data that have a Wikidata entry
     osm_data['mapped_qid'] = osm_data['name'].map(name_qid)
 
     # set mapped_qid of OSM data that have a qid but do not have a name
-    # equal to qid 
+    # equal to qid
     osm_data.loc[has_qid & ~has_name, 'mapped_qid'] = (
         osm_data.loc[has_qid & ~has_name, 'qid']
     )
@@ -53,7 +126,131 @@ def main(input_file, output_file):
     # replace qid column values with mapped_qid
     preprocessed_osm_data = osm_data.drop(['qid'], axis=1)
     preprocessed_osm_data.rename(columns={'mapped_qid': 'qid'}, inplace=True)
-    preprocessed_osm_data.to_json(output_file)
-    
+    return preprocessed_osm_data
+
+@traced
+def preprocess_osm_data(osm_data, fuzzy_threshold=None):
+    """Fill in the qids of OSM data held in memory
+
+    Args:
+        osm_data (dataframe): OSM data read from amenities-vancouver.json.gz
+        fuzzy_threshold (float):
+            smallest similarity of a fuzzy name match (see names.py), None
+            to only fill in qids of entries with exactly the same name
+
+    Returns:
+        preprocessed_osm_data (dataframe):
+            OSM data with cuisine and (filled in) qid columns
+    """
+
+    add_tag_columns(osm_data)
+    name_qid = get_name_qid(osm_data)
+    if fuzzy_threshold is not None:
+        name_qid.update(get_fuzzy_name_qid(
+            get_unmatched_name_counts(osm_data), name_qid, fuzzy_threshold
+        ))
+    preprocessed_osm_data = fill_qids(osm_data, name_qid)
+    return preprocessed_osm_data
+
+def iter_preprocessed_chunks(input_file, chunksize, name_qid):
+    """Read OSM data chunksize lines at a time and fill in the qids of each
+    chunk
+
+    Args:
+        input_file (str): json-lines OSM data
+        chunksize (int): number of lines read at a time
+        name_qid (dict): contains (name, qid) key value pairs
+
+    Yields:
+        preprocessed_osm_data (dataframe): preprocessed chunk
+    """
+
+    for osm_data in pd.read_json(input_file, lines=True, chunksize=chunksize):
+        add_tag_columns(osm_data)
+        yield fill_qids(osm_data, name_qid)
+
+def main(input_file, output_file, chunksize=None, fuzzy_threshold=None):
+    """Preprocess OSM data by filling in wikidata identifiers (qid)
+    for OSM entries that have a Wikidata entry but are not associated with one.
+        - write preprocessed OSM data to output_file
+
+    Args:
+        input_file (str):
+            osm_output_file from scrape_wikidata.py - should include the data
+            from amenities-vancouver.json.gz along with an additional column
+            for qid
+
+        output_file (str):
+            json file in which some qids have been filled in - written as
+            parquet/feather instead if it ends with .parquet/.feather
+
+        chunksize (int):
+            number of lines read at a time, None to read the whole file at
+            once - when given, the file is read twice (once to build the
+            name/qid pairs, once to fill in the qids) and memory use is
+            bounded by the chunk size, output_file is the same either way
+
+        fuzzy_threshold (float):
+            smallest similarity of a fuzzy name match, None (the default)
+            to only use exact name matches
+    """
+
+    if chunksize is None:
+        # trailing data error - line adapted from
+        # https://stackoverflow.com/questions/30088006/
+        with instrument.span('read') as read_span:
+            osm_data = pd.read_json(input_file, lines=True)
+            read_span.rows_out = len(osm_data)
+        preprocessed_osm_data = preprocess_osm_data(osm_data, fuzzy_threshold)
+        with instrument.span('write', len(preprocessed_osm_data)):
+            write_frame(preprocessed_osm_data, output_file)
+        return
+
+    # first pass - build the (name, qid) pairs and collect the columns in
+    # the order pd.read_json would give them
+    name_qid = {}
+    columns = {}
+    name_counts = Counter()
+    with instrument.span('first pass') as first_pass_span:
+        first_pass_span.rows_in = 0
+        for osm_data in pd.read_json(input_file, lines=True, chunksize=chunksize):
+            first_pass_span.rows_in += len(osm_data)
+            columns.update(dict.fromkeys(osm_data.columns))
+            add_tag_columns(osm_data)
+            name_qid.update(get_name_qid(osm_data))
+            if fuzzy_threshold is not None:
+                name_counts.update(get_unmatched_name_counts(osm_data).to_dict())
+
+    if fuzzy_threshold is not None:
+        name_qid.update(get_fuzzy_name_qid(
+            pd.Series(name_counts, dtype='int64'), name_qid, fuzzy_threshold
+        ))
+
+    # second pass - fill in qids one chunk at a time
+    columns = [column for column in columns if column != 'qid']
+    columns.extend(['cuisine', 'qid'])
+    preprocessed_chunks = iter_preprocessed_chunks(input_file, chunksize, name_qid)
+    with instrument.span('second pass'):
+        if get_format(output_file) == 'json':
+            write_json_chunks(preprocessed_chunks, output_file, columns)
+        else:
+            write_arrow_chunks(preprocessed_chunks, output_file, columns)
+
 if __name__ == '__main__':
-    main(sys.argv[1], sys.argv[2])
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_file')
+    parser.add_argument('output_file')
+    parser.add_argument(
+        '--chunksize', type=int, default=None,
+        help='read the input this many lines at a time to bound memory use'
+    )
+    parser.add_argument(
+        '--fuzzy-threshold', type=float, default=None,
+        help='also fill in qids of names similar to a name with a qid, e.g. '
+             '0.85 (off by default)'
+    )
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure_from_args(args)
+    with instrument.span('preprocess-osm-data'):
+        main(args.input_file, args.output_file, args.chunksize, args.fuzzy_threshold)
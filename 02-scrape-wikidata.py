@@ -1,30 +1,46 @@
+import argparse
+import json
+import os
 import pandas as pd
-import requests
-import sys
-import time
 
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
-def scrape_wikidata(qid):
+import cache
+import fetch
+import instrument
+
+from instrument import traced
+from storage import read_frame, write_frame
+
+WIKIDATA_URL = 'https://www.wikidata.org'
+
+# wbgetentities accepts at most 50 ids per request
+MAX_ENTITIES_PER_REQUEST = 50
+
+def scrape_wikidata(qid, session, rate_limiter=None, base_url=WIKIDATA_URL):
     """Request the identifier's Wikidata page 
     
     Args:
         qid (str): Wikidata identifier 
+        session (requests.Session): shared (pooled) session
+        rate_limiter (fetch.TokenBucket): limits requests per second
+        base_url (str): Wikidata host, can point to a local mirror/stub
         
     Returns:
         wikidata_response (requests.models.Response): Wikidata response 
     """
     
-    wikidata_url = (f'https://www.wikidata.org/wiki/{qid}')
-    wikidata_response = requests.get(wikidata_url)
+    wikidata_url = (f'{base_url}/wiki/{qid}')
+    wikidata_response = fetch.get(wikidata_url, session, rate_limiter)
     return wikidata_response
 
-def get_names(wikidata_response):
+def get_names(wikidata_response, soup=None):
     """Get the names from the Wikidata response
     
     Args:
         wikidata_response (requests.models.Response): Wikidata response 
+        soup (BeautifulSoup): parsed response, parsed here if not given
         
     Returns:
         names (list): names for the Wikidata entry
@@ -37,7 +53,8 @@ def get_names(wikidata_response):
         ]
     """
     
-    soup = BeautifulSoup(wikidata_response.text, 'lxml')
+    if soup is None:
+        soup = BeautifulSoup(wikidata_response.text, 'lxml')
     names = [soup.find(property='og:title').get('content')]
     other_name_tags = soup.findAll(
         'li', 
@@ -46,11 +63,12 @@ def get_names(wikidata_response):
     names.extend(name_tag.text for name_tag in other_name_tags)
     return names
 
-def get_description(wikidata_response):
+def get_description(wikidata_response, soup=None):
     """Get the description from the Wikidata response
     
     Args:
         wikidata_response (requests.models.response): Wikidata response
+        soup (BeautifulSoup): parsed response, parsed here if not given
         
     Returns:
         description (str): 
@@ -62,14 +80,560 @@ def get_description(wikidata_response):
         page returns 'American fast food restaurant chain'
     """
     
-    soup = BeautifulSoup(wikidata_response.text, 'lxml')
+    if soup is None:
+        soup = BeautifulSoup(wikidata_response.text, 'lxml')
     try:
         description = soup.find(property='og:description').get('content')
     except:
         description = ''
     return description
 
-def main(input_file, output_file):
+def scrape_wikidata_pages(qids, session, rate_limiter=None, base_url=WIKIDATA_URL):
+    """Scrape the names and descriptions of Wikidata entries from their
+    HTML pages, one request per entry
+
+    Args:
+        qids (tuple): Wikidata identifiers
+        session (requests.Session): shared (pooled) session
+        rate_limiter (fetch.TokenBucket): limits requests per second
+        base_url (str): Wikidata host, can point to a local mirror/stub
+
+    Returns:
+        wikidata_entries (dict):
+            contains (qid, (names, description)) key value pairs
+    """
+
+    wikidata_entries = {}
+    for qid in qids:
+        wikidata_response = scrape_wikidata(qid, session, rate_limiter, base_url)
+        soup = BeautifulSoup(wikidata_response.text, 'lxml')
+        wikidata_entries[qid] = (
+            get_names(wikidata_response, soup),
+            get_description(wikidata_response, soup)
+        )
+    return wikidata_entries
+
+def get_entity_names(entity, languages=('en',)):
+    """Get the names from a wbgetentities entity - the label followed by
+    the aliases, in the same order as get_names
+
+    Args:
+        entity (dict): entity from the wbgetentities JSON response
+        languages (tuple): language codes in order of preference
+
+    Returns:
+        names (list): names for the Wikidata entry
+    """
+
+    labels = entity.get('labels', {})
+    aliases = entity.get('aliases', {})
+    label = next(
+        (labels[language]['value'] for language in languages
+         if language in labels),
+        entity['id']
+    )
+    names = [label]
+    for language in languages:
+        if language in aliases:
+            names.extend(alias['value'] for alias in aliases[language])
+            break
+    return names
+
+def get_entity_description(entity, languages=('en',)):
+    """Get the description from a wbgetentities entity
+
+    Args:
+        entity (dict): entity from the wbgetentities JSON response
+        languages (tuple): language codes in order of preference
+
+    Returns:
+        description (str):
+            description for the Wikidata entry - returns an empty string
+            if the entity does not have a description
+    """
+
+    descriptions = entity.get('descriptions', {})
+    description = next(
+        (descriptions[language]['value'] for language in languages
+         if language in descriptions),
+        ''
+    )
+    return description
+
+def scrape_wikidata_entities(qids, session, rate_limiter=None,
+                             base_url=WIKIDATA_URL, languages=('en',)):
+    """Get the names and descriptions of up to MAX_ENTITIES_PER_REQUEST
+    Wikidata entries with a single wbgetentities API request
+
+    Args:
+        qids (tuple): Wikidata identifiers
+        session (requests.Session): shared (pooled) session
+        rate_limiter (fetch.TokenBucket): limits requests per second
+        base_url (str): Wikidata host, can point to a local mirror/stub
+        languages (tuple): language codes in order of preference
+
+    Returns:
+        wikidata_entries (dict):
+            contains (qid, (names, description)) key value pairs - missing
+            or deleted entities are left out
+    """
+
+    params = {
+        'action': 'wbgetentities',
+        'ids': '|'.join(qids),
+        'props': 'labels|aliases|descriptions',
+        'languages': '|'.join(languages),
+        'format': 'json'
+    }
+    wikidata_response = fetch.get(
+        f'{base_url}/w/api.php', session, rate_limiter, params=params
+    )
+    entities = wikidata_response.json().get('entities', {})
+
+    wikidata_entries = {}
+    for qid, entity in entities.items():
+        if 'missing' in entity:
+            continue
+        # redirected entities are keyed by the qid they redirect to
+        qid = entity.get('redirects', {}).get('from', qid)
+        wikidata_entries[qid] = (
+            get_entity_names(entity, languages),
+            get_entity_description(entity, languages)
+        )
+    return wikidata_entries
+
+def get_default_cache_file(output_file):
+    """Get the SQLite cache used when none is given - wikidata-cache.sqlite
+    next to output_file
+
+    Args:
+        output_file (str): json output file
+
+    Returns:
+        cache_file (str): SQLite file
+    """
+
+    return os.path.join(os.path.dirname(output_file), 'wikidata-cache.sqlite')
+
+def get_source(mode='api', languages=('en',)):
+    """Get how Wikidata entries are fetched - entries fetched in one mode
+    or in one set of languages are not reused for another
+
+    Args:
+        mode (str): 'api' or 'html', see get_wikidata
+        languages (tuple): language codes in order of preference
+
+    Returns:
+        source (dict):
+            mode and languages - the HTML pages do not depend on the
+            languages, so they are left out for the 'html' mode
+    """
+
+    return {
+        'mode': mode,
+        'languages': list(languages) if mode == 'api' else []
+    }
+
+def get_source_file(file):
+    """Get the hidden file recording how the entries in file were fetched
+
+    Args:
+        file (str): json output or partial file
+
+    Returns:
+        source_file (str): json file next to file
+    """
+
+    directory, name = os.path.split(file)
+    return os.path.join(directory, f'.{name}.source')
+
+def read_source(file):
+    """Read how the entries in file were fetched
+
+    Args:
+        file (str): json output or partial file
+
+    Returns:
+        source (dict):
+            output of get_source, None if it was not recorded (e.g. file was
+            written before sources were recorded)
+    """
+
+    source_file = get_source_file(file)
+    if not os.path.exists(source_file):
+        return None
+    with open(source_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def write_source(file, source):
+    """Record how the entries in file were fetched
+
+    Args:
+        file (str): json output or partial file
+        source (dict): output of get_source
+
+    Returns:
+        None
+    """
+
+    with open(get_source_file(file), 'w', encoding='utf-8') as f:
+        json.dump(source, f)
+
+def read_previous_wikidata(output_file, mode='api', languages=('en',)):
+    """Read an existing output to reuse its entries - only if they were
+    fetched in the same mode and languages
+
+    Args:
+        output_file (str): json output file
+        mode (str): 'api' or 'html', see get_wikidata
+        languages (tuple): language codes in order of preference
+
+    Returns:
+        previous_wikidata (dataframe):
+            qid, names and description of the previous entries, None if
+            there is no output_file or its entries were fetched differently
+    """
+
+    if not os.path.exists(output_file):
+        return None
+    if read_source(output_file) != get_source(mode, languages):
+        print(
+            f'Incremental: {output_file} was not fetched with mode {mode} '
+            f'and languages {",".join(languages)}, scraping every qid'
+        )
+        return None
+    return read_frame(output_file)
+
+def get_partial_file(output_file):
+    """Get the file that scraped entries are appended to while output_file
+    is being produced
+
+    Args:
+        output_file (str): json output file
+
+    Returns:
+        partial_file (str): json-lines file next to output_file
+    """
+
+    return f'{output_file}.partial'
+
+def remove_partial_file(partial_file):
+    """Remove the partial output and its recorded source once the output
+    has been written
+
+    Args:
+        partial_file (str): json-lines file written by write_wikidata_entry
+
+    Returns:
+        None
+    """
+
+    os.remove(partial_file)
+    source_file = get_source_file(partial_file)
+    if os.path.exists(source_file):
+        os.remove(source_file)
+
+def write_wikidata_entry(partial_file, qid, names, description):
+    """Append a Wikidata entry to the partial output as one json line - the
+    line is flushed right away so an interrupted run keeps every entry
+    written so far
+
+    Args:
+        partial_file (file object): json-lines file opened for appending
+        qid (str): Wikidata identifier
+        names (list): names for the Wikidata entry
+        description (str): description for the Wikidata entry
+
+    Returns:
+        None
+    """
+
+    entry = {'qid': qid, 'names': names, 'description': description}
+    partial_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    partial_file.flush()
+
+def iter_wikidata_entries(partial_file):
+    """Iterate over the entries appended to the partial output
+
+    Args:
+        partial_file (str): json-lines file written by write_wikidata_entry
+
+    Yields:
+        entry (dict):
+            qid, names and description of an entry - a truncated line (from
+            an interrupted write) is skipped
+    """
+
+    with open(partial_file, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield entry
+
+def read_wikidata_entries(partial_file, qids):
+    """Read the entries appended to the partial output
+
+    Args:
+        partial_file (str): json-lines file written by write_wikidata_entry
+        qids (array): qids to keep, in the order they should be returned
+
+    Returns:
+        wikidata (dataframe):
+            qid, names and description of the entries - an entry written
+            more than once keeps its last line
+    """
+
+    wikidata_entries = {
+        entry['qid']: entry for entry in iter_wikidata_entries(partial_file)
+    }
+    wikidata = pd.DataFrame(
+        [wikidata_entries[qid] for qid in qids if qid in wikidata_entries],
+        columns=['qid', 'names', 'description']
+    )
+    return wikidata
+
+def open_checkpoint(partial_file, resume=True, source=None):
+    """Open the partial output for appending and get the qids it already
+    contains
+
+    Args:
+        partial_file (str): json-lines file written by write_wikidata_entry
+        resume (bool): keep the entries of a previous (interrupted) run
+        source (dict):
+            output of get_source - the entries of a previous run are only
+            kept if they were fetched the same way
+
+    Returns:
+        f, checkpointed_qids (tuple):
+            file object opened for appending and the set of qids that were
+            already written
+    """
+
+    source = get_source() if source is None else source
+    if resume and os.path.exists(partial_file):
+        if read_source(partial_file) != source:
+            print(
+                f'Restarting: {partial_file} was scraped with a different '
+                f'mode or languages'
+            )
+            resume = False
+
+    if not resume or not os.path.exists(partial_file):
+        write_source(partial_file, source)
+        return open(partial_file, 'w', encoding='utf-8'), set()
+
+    checkpointed_qids = {
+        entry['qid'] for entry in iter_wikidata_entries(partial_file)
+    }
+
+    # end a line left truncated by an interrupted write so the next entry
+    # starts on its own line (the truncated line is skipped when read)
+    is_truncated = False
+    if os.path.getsize(partial_file) > 0:
+        with open(partial_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            is_truncated = (f.read(1) != b'\n')
+
+    f = open(partial_file, 'a', encoding='utf-8')
+    if is_truncated:
+        f.write('\n')
+    return f, checkpointed_qids
+
+@traced
+def get_wikidata(osm_data, partial_file, previous_wikidata=None, max_workers=8,
+                 rate=5, base_url=WIKIDATA_URL, cache_file=None, cache_ttl=None,
+                 cache_size=None, mode='api', languages=('en',), resume=True):
+    """Get the names and descriptions of the Wikidata entries referenced by
+    the OSM data
+
+    Args:
+        osm_data (dataframe):
+            preprocessed OSM data - only the qid column is used
+
+        partial_file (str):
+            json-lines file entries are appended to as they are scraped, see
+            get_partial_file
+
+        previous_wikidata (dataframe):
+            output of a previous run in the same mode and languages (see
+            read_previous_wikidata) whose entries are reused for qids that
+            are still in osm_data - only new qids, and (with a cache) qids
+            without a valid cache entry - expired or evicted - are scraped
+            (None to scrape every qid)
+
+        max_workers (int):
+            maximum number of requests in flight at the same time
+
+        rate (float):
+            maximum number of requests sent to Wikidata per second
+
+        base_url (str):
+            Wikidata host, can point to a local mirror/stub
+
+        cache_file (str):
+            SQLite file caching the names and descriptions of previously
+            scraped entries, None to scrape every entry
+
+        cache_ttl (float):
+            seconds before a cached entry is scraped again, None to never
+            expire entries
+
+        cache_size (int):
+            maximum number of cached entries, None for no limit
+
+        mode (str):
+            'api' to request up to 50 entries at a time from the
+            wbgetentities JSON API, 'html' to scrape each entry's page
+
+        languages (tuple):
+            language codes of the names and descriptions, in order of
+            preference - only used by the 'api' mode
+
+        resume (bool):
+            continue from the entries left in partial_file by an interrupted
+            run instead of starting over
+
+    Returns:
+        wikidata (dataframe):
+            qid, names and description of the Wikidata entries that were
+            successfully fetched, in the order of the OSM data
+
+    Notes:
+        - Requests are sent concurrently but never faster than rate per
+          second. Rate limited (429) and server error (5xx) responses are
+          retried with exponential backoff.
+        - Entries that still fail are reported and left out, the remaining
+          entries are still scraped.
+        - Entries found in the cache are not requested at all. Cache
+          entries are keyed by qid, mode and languages.
+        - Entries are appended to partial_file as they are scraped, so an
+          interrupted run leaves valid partial output and a rerun picks up
+          where it stopped.
+        - The 'api' mode gets the same names and descriptions as scraping
+          the HTML pages with a fraction of the requests and bytes.
+    """
+    
+    unique_qids = osm_data['qid'].dropna().unique()
+    source = get_source(mode, languages)
+
+    wikidata_cache = None
+    if cache_file is not None:
+        wikidata_cache = cache.WikidataCache(
+            cache_file, cache_ttl, cache_size, mode, source['languages']
+        )
+
+    try:
+        # entries from a previous output that are still needed
+        previous_entries = {}
+        if previous_wikidata is not None:
+            is_current = previous_wikidata['qid'].isin(unique_qids)
+            for qid, names, description in previous_wikidata.loc[
+                is_current, ['qid', 'names', 'description']
+            ].itertuples(index=False):
+                if wikidata_cache is None or wikidata_cache.is_fresh(qid):
+                    previous_entries[qid] = (names, description)
+            print(
+                f'Incremental: reusing {len(previous_entries)} entries, '
+                f'{len(unique_qids) - len(previous_entries)} new or stale, '
+                f'{int((~is_current).sum())} no longer used'
+            )
+
+        # append each entry to the partial output as soon as it is available
+        # rather than keeping responses in memory - starting with the entries
+        # checkpointed by an interrupted run, reused from the previous output
+        # or already cached
+        f, checkpointed_qids = open_checkpoint(partial_file, resume, source)
+        if checkpointed_qids:
+            print(f'Resuming: {len(checkpointed_qids)} entries already scraped')
+
+        with f:
+            missing_qids = []
+            for qid in unique_qids:
+                if qid in checkpointed_qids:
+                    continue
+                if qid in previous_entries:
+                    names, description = previous_entries[qid]
+                    write_wikidata_entry(f, qid, names, description)
+                    continue
+
+                cached_entry = (
+                    wikidata_cache.get(qid) if wikidata_cache is not None else None
+                )
+                if cached_entry is None:
+                    missing_qids.append(qid)
+                else:
+                    names, description, _ = cached_entry
+                    write_wikidata_entry(f, qid, names, description)
+
+            session = fetch.create_session(pool_size=max_workers)
+            rate_limiter = fetch.TokenBucket(rate)
+
+            if mode == 'api':
+                batch_size = MAX_ENTITIES_PER_REQUEST
+                scrape = lambda qids: scrape_wikidata_entities(
+                    qids, session, rate_limiter, base_url, languages
+                )
+            elif mode == 'html':
+                batch_size = 1
+                scrape = lambda qids: scrape_wikidata_pages(
+                    qids, session, rate_limiter, base_url
+                )
+            else:
+                raise ValueError(f"mode must be 'api' or 'html', got {mode!r}")
+
+            qid_batches = (
+                tuple(missing_qids[i:i + batch_size])
+                for i in range(0, len(missing_qids), batch_size)
+            )
+
+            failed_qids = []
+            with instrument.span('scrape', len(missing_qids)) as scrape_span:
+                results = fetch.fetch_all(qid_batches, scrape, max_workers=max_workers)
+                with tqdm(total=len(missing_qids)) as progress_bar:
+                    for qids, scraped_entries, error in results:
+                        progress_bar.update(len(qids))
+                        if error is not None:
+                            print(f'Failed to scrape {", ".join(qids)}:', error)
+                            failed_qids.extend(qids)
+                            continue
+
+                        failed_qids.extend(
+                            qid for qid in qids if qid not in scraped_entries
+                        )
+                        for qid, (names, description) in scraped_entries.items():
+                            write_wikidata_entry(f, qid, names, description)
+                            if wikidata_cache is not None:
+                                wikidata_cache.put(qid, names, description)
+                        # commit each batch so an interrupted run keeps what
+                        # it scraped
+                        if wikidata_cache is not None:
+                            wikidata_cache.commit()
+                scrape_span.rows_out = len(missing_qids) - len(failed_qids)
+
+        if failed_qids:
+            print(f'Failed to scrape {len(failed_qids)} of {len(unique_qids)} qids')
+
+        if wikidata_cache is not None:
+            print(
+                f'Cache hits: {wikidata_cache.hits}, '
+                f'misses: {wikidata_cache.misses}'
+            )
+    finally:
+        # close (and so commit) the cache even if the scrape fails or is
+        # interrupted
+        if wikidata_cache is not None:
+            wikidata_cache.close()
+
+    # create dataframe with the qids that were successfully fetched - keep
+    # the order of the OSM data rather than the order of completion
+    wikidata = read_wikidata_entries(partial_file, unique_qids)
+    return wikidata
+
+def main(input_file, output_file, max_workers=8, rate=5, base_url=WIKIDATA_URL,
+         cache_file=None, cache_ttl=None, cache_size=None, mode='api',
+         languages=('en',), resume=True, incremental=False):
     """Scrape Wikidata entries for their names and descriptions.
         - write the qid, names and description of the Wikidata entries to
           output_file
@@ -83,50 +647,103 @@ def main(input_file, output_file):
             json output file containing qid, names and descriptions of
             the Wikidata entries
 
+        incremental (bool):
+            reuse the entries of an existing output_file for qids that are
+            still in input_file, if they were fetched in the same mode and
+            languages
+
+        other args:
+            see get_wikidata - entries are appended to output_file +
+            '.partial' while scraping, the file is removed once output_file
+            is written
+
     Returns:
         None
-
-    Notes:
-        - It takes approximately 1 to 2 seconds to scrape each Wikidata
-          entry. Running the program with the preprocessed OSM data may take
-          a few minutes.
-        - Upon receiving a bad request the program will stop scraping Wikidata
-          and process the data it managed to retrieve.
     """
-    
-    osm_data = pd.read_json(input_file)
-    unique_qids = osm_data['qid'].dropna().unique()
 
-    # create dict with (qid, response) key value pairs
-    wikidata_responses = {} 
-    for qid in tqdm(unique_qids):
-        # exception handling adapted from jouell's answer at
-        # https://stackoverflow.com/questions/16511337/ 
-        try:
-            wikidata_response = scrape_wikidata(qid)
-            wikidata_response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            # print the error and stop scraping if we get a bad HTTP response
-            print("Http Error:", e)
-            break
-        
-        wikidata_responses[qid] = wikidata_response
-        time.sleep(1)
+    with instrument.span('read') as read_span:
+        osm_data = read_frame(input_file, columns=['qid'])
+        read_span.rows_out = len(osm_data)
 
-    # create dataframe with the qids that were successfully fetched
-    fetched_qids = list(wikidata_responses.keys())
-    wikidata = pd.DataFrame(fetched_qids, columns=['qid'])
-    
-    # get names and descriptions for each Wikidata entry using qid
-    wikidata['names'] = (
-        wikidata['qid'].apply(lambda qid: get_names(wikidata_responses[qid]))
-    )
-    wikidata['description'] = (
-        wikidata['qid'].apply(lambda qid: get_description(wikidata_responses[qid]))
+    previous_wikidata = None
+    if incremental:
+        previous_wikidata = read_previous_wikidata(
+            output_file, mode, languages
+        )
+
+    partial_file = get_partial_file(output_file)
+    wikidata = get_wikidata(
+        osm_data, partial_file, previous_wikidata, max_workers, rate, base_url,
+        cache_file, cache_ttl, cache_size, mode, languages, resume
     )
 
     # write wikidata qid, names and description to json
-    wikidata.to_json(output_file)
+    with instrument.span('write', len(wikidata)):
+        write_frame(wikidata, output_file)
+    write_source(output_file, get_source(mode, languages))
+    remove_partial_file(partial_file)
 
 if __name__ == '__main__':
-    main(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_file')
+    parser.add_argument('output_file')
+    parser.add_argument(
+        '--workers', type=int, default=8,
+        help='maximum number of concurrent requests'
+    )
+    parser.add_argument(
+        '--rate', type=float, default=5,
+        help='maximum number of requests per second'
+    )
+    parser.add_argument('--base-url', default=WIKIDATA_URL)
+    parser.add_argument(
+        '--cache', default=None,
+        help='SQLite cache file (default: wikidata-cache.sqlite next to '
+             'output_file)'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='scrape every entry without reading or writing the cache'
+    )
+    parser.add_argument(
+        '--cache-ttl', type=float, default=30,
+        help='days before a cached entry is scraped again'
+    )
+    parser.add_argument(
+        '--cache-size', type=int, default=100000,
+        help='maximum number of cached entries'
+    )
+    parser.add_argument(
+        '--mode', choices=['api', 'html'], default='api',
+        help='request entries in bulk from the JSON API or scrape each page'
+    )
+    parser.add_argument(
+        '--languages', default='en',
+        help='comma separated language codes in order of preference'
+    )
+    parser.add_argument(
+        '--restart', action='store_true',
+        help='discard the entries left by an interrupted run'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='only scrape qids that are new or stale compared to an '
+             'existing output_file'
+    )
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure_from_args(args)
+
+    cache_file = args.cache
+    if args.no_cache:
+        cache_file = None
+    elif cache_file is None:
+        cache_file = get_default_cache_file(args.output_file)
+
+    with instrument.span('scrape-wikidata'):
+        main(
+            args.input_file, args.output_file, args.workers, args.rate,
+            args.base_url, cache_file, args.cache_ttl * 24 * 60 * 60,
+            args.cache_size, args.mode, tuple(args.languages.split(',')),
+            not args.restart, args.incremental
+        )
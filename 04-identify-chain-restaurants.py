@@ -1,48 +1,89 @@
+import argparse
 import numpy as np
 import pandas as pd
-import sys
 
-from scipy.cluster.hierarchy import fcluster, linkage
 from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
+import cluster
+import instrument
 import transform
 
-def main(preprocessed_osm_data, raw_wikidata, preprocessed_wikidata, output_file):
-    # load data
-    osm_data = pd.read_json(preprocessed_osm_data)
+from instrument import traced
+from storage import read_frame, write_frame
+
+@traced
+def identify_chain_restaurants(osm_data, raw_wikidata, preprocessed_wikidata,
+                               num_clusters=3, method='hierarchical',
+                               linkage_method='complete',
+                               linkage_input='similarities',
+                               required_terms=('chain', 'restaurant'),
+                               optional_terms=()):
+    """Identify the Wikidata entries of chain restaurants using keywords in
+    their descriptions and clustering
+
+    Args:
+        osm_data (dataframe):
+            preprocessed OSM data - not used, chain restaurants are identified
+            from Wikidata alone (stage 05 maps them back to the OSM data)
+        raw_wikidata (dataframe): qid, names and descriptions
+        preprocessed_wikidata (dataframe):
+            qid, preprocessed names and preprocessed descriptions
+
+        num_clusters (int): number of clusters the descriptions are split into
+        method (str):
+            clustering method - 'hierarchical' (dense cosine similarities,
+            only practical for a few thousand entries), 'kmeans' or 'graph'
+            (sparse, see cluster.py)
+
+        linkage_method (str): scipy linkage method ('hierarchical' only)
+        linkage_input (str):
+            'similarities' (the original analysis) or 'distances'
+            ('hierarchical' only, see cluster.cluster_hierarchical)
+
+        required_terms (tuple):
+            keywords (regex patterns) that must all be in the description of
+            a chain restaurant
+
+        optional_terms (tuple):
+            keywords of which at least one must also be in the description,
+            e.g. ('franchise', 'fast food') - none by default
+
+    Returns:
+        final_chain_restaurant_qids (dataframe):
+            qid and is_chain_restaurant (1) columns for chain restaurants
+    """
 
-    raw_wikidata = pd.read_json(raw_wikidata)
-    preprocessed_wikidata = pd.read_json(preprocessed_wikidata)
     wikidata = raw_wikidata.merge(preprocessed_wikidata, on='qid')
 
     wikidata['name'] = wikidata['names'].apply(lambda names: names[0])
     descriptions = wikidata['preprocessed_description']
 
-    # check for the words 'chain' and 'restaurant' in Wikidata descriptions
-    contains_chain = wikidata['preprocessed_description'].apply(
-        lambda description: transform.get_match('chain', description)
-    ).notna()
-    contains_restaurant = wikidata['preprocessed_description'].apply(
-        lambda description: transform.get_match('restaurant', description)
-    ).notna()
-
-    contains_chain_and_restaurant = (contains_chain & contains_restaurant)
+    # check for keywords (by default 'chain' and 'restaurant') in Wikidata
+    # descriptions - the terms are combined into one pattern, so each
+    # description is searched once however many terms there are
+    term_matches = transform.get_term_matches(
+        descriptions, list(required_terms) + list(optional_terms)
+    )
+    matches_keywords = transform.get_rule_matches(
+        term_matches, required_terms, optional_terms
+    )
 
-    # include entries that contain the words 'chain' and 'restaurant'
-    chain_restaurant_wikidata = wikidata[contains_chain_and_restaurant]
+    # include entries that contain the keywords
+    chain_restaurant_wikidata = wikidata[matches_keywords]
 
-    # calculate cosine similarities between each Wikidata description
+    # cluster Wikidata descriptions by the words they contain
     vectorizer = CountVectorizer(lowercase=False)
     document_term_matrix = vectorizer.fit_transform(descriptions)
-    cosine_similarities = cosine_similarity(document_term_matrix)
 
     # get names of chain restaurants 
     chain_restaurant_names = chain_restaurant_wikidata['name'].values
     names = wikidata['name']
 
-    Z = linkage(cosine_similarities, method='complete')
-    clusters = fcluster(Z, t=3, criterion='maxclust')
+    with instrument.span('clustering', document_term_matrix.shape[0]):
+        clusters = cluster.get_clusters(
+            document_term_matrix, num_clusters, method, linkage_method,
+            linkage_input
+        )
     
     # create dataframe containing columns for name and cluster
     name_cluster = pd.DataFrame.from_dict(
@@ -55,29 +96,85 @@ def main(preprocessed_osm_data, raw_wikidata, preprocessed_wikidata, output_file
     chain_restaurant_cluster = chain_restaurant_wikidata['cluster'].value_counts().idxmax()
 
     is_within_chain_restaurant_cluster = (name_cluster['cluster'] == chain_restaurant_cluster)
-    is_chain_restaurant = (contains_chain_and_restaurant | is_within_chain_restaurant_cluster)
+    is_chain_restaurant = (matches_keywords | is_within_chain_restaurant_cluster)
 
     # include entries within the cluster with the most chain restaurants 
     updated_chain_restaurant_wikidata = wikidata[is_chain_restaurant]
-    updated_chain_restaurant_qids = transform.get_chain_restaurant_qids(updated_chain_restaurant_wikidata)
-
-    # map back to OSM data to get the updated number of chain restaurants
-    updated_num_chain_restaurants = transform.get_num_chain_restaurants(
-        osm_data, 
-        updated_chain_restaurant_qids
-    )
+    updated_chain_restaurant_qids = updated_chain_restaurant_wikidata['qid'].drop_duplicates()
 
     # convert to dataframe and write to json
-    final_chain_restaurant_qids = pd.DataFrame.from_dict(
-        updated_chain_restaurant_qids, 
-        orient='index'
-    )
-    final_chain_restaurant_qids.reset_index(inplace=True)
-    final_chain_restaurant_qids.rename(
-        columns={'index': 'qid', 0:'is_chain_restaurant'},
-        inplace=True
+    final_chain_restaurant_qids = pd.DataFrame({
+        'qid': updated_chain_restaurant_qids.values,
+        'is_chain_restaurant': np.ones(len(updated_chain_restaurant_qids), dtype=int)
+    })
+    return final_chain_restaurant_qids
+
+def main(preprocessed_osm_data, raw_wikidata, preprocessed_wikidata, output_file,
+         num_clusters=3, method='hierarchical', linkage_method='complete',
+         linkage_input='similarities', required_terms=('chain', 'restaurant'),
+         optional_terms=()):
+    # load data
+    with instrument.span('read') as read_span:
+        osm_data = read_frame(preprocessed_osm_data, columns=['qid'])
+        raw_wikidata = read_frame(raw_wikidata)
+        preprocessed_wikidata = read_frame(preprocessed_wikidata)
+        read_span.rows_out = len(osm_data) + len(raw_wikidata) + len(preprocessed_wikidata)
+
+    final_chain_restaurant_qids = identify_chain_restaurants(
+        osm_data,
+        raw_wikidata,
+        preprocessed_wikidata,
+        num_clusters,
+        method,
+        linkage_method,
+        linkage_input,
+        required_terms,
+        optional_terms
     )
-    final_chain_restaurant_qids.to_json(output_file)
+    with instrument.span('write', len(final_chain_restaurant_qids)):
+        write_frame(final_chain_restaurant_qids, output_file)
 
 if __name__ == '__main__':
-    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    parser = argparse.ArgumentParser()
+    parser.add_argument('preprocessed_osm_data')
+    parser.add_argument('raw_wikidata')
+    parser.add_argument('preprocessed_wikidata')
+    parser.add_argument('output_file')
+    parser.add_argument('--num-clusters', type=int, default=3)
+    parser.add_argument(
+        '--method', choices=cluster.CLUSTERING_METHODS, default='hierarchical',
+        help='hierarchical (dense, small inputs) or kmeans/graph (sparse)'
+    )
+    parser.add_argument(
+        '--linkage', default='complete',
+        help='scipy linkage method for --method hierarchical'
+    )
+    parser.add_argument(
+        '--linkage-input', choices=cluster.LINKAGE_INPUTS, default='similarities',
+        help='cluster rows of cosine similarities (the original analysis) or '
+             'the condensed distances between them (same clusters, faster)'
+    )
+    parser.add_argument(
+        '--required-terms', nargs='+', default=['chain', 'restaurant'],
+        help='keywords that must all be in a chain restaurant\'s description'
+    )
+    parser.add_argument(
+        '--optional-terms', nargs='*', default=[],
+        help='keywords of which at least one must also be in the description'
+    )
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure_from_args(args)
+    with instrument.span('identify-chain-restaurants'):
+        main(
+            args.preprocessed_osm_data,
+            args.raw_wikidata,
+            args.preprocessed_wikidata,
+            args.output_file,
+            args.num_clusters,
+            args.method,
+            args.linkage,
+            args.linkage_input,
+            args.required_terms,
+            args.optional_terms
+        )
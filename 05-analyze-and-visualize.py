@@ -1,84 +1,60 @@
+import argparse
 import folium
 import numpy as np
-import pandas as pd
 
-from folium.plugins import HeatMap
-from haversine import haversine, Unit, haversine_vector
 from scipy.stats import chi2_contingency
 
-def make_matrix(location, size):
-    return [location for i in range(size)]
-
-def nonRestaurestaurant(): 
-    return [
-    'ATLAS_clean_room' ,'EVSE','Observation Platform' ,'Pharmacy','animal_shelter','arts_centre','atm','atm;bank',
-    'bank','bench','bicycle_parking','bicycle_rental','bicycle_repair_station','car_rental','car_rep','car_sharing',
-    'car_wash','casino','charging_station','childcare','chiropractor','cinema','clinic','clock','college',
-    'community_centre','compressed_air','conference_centre','construction','courthouse','cram_school','dentist',
-    'events_venue','family_centre','ferry_terminal','fire_station','first_aid','fountain','fuel','gambling','gym',
-    'healthcare','hospital','housing co-op','hunting_stand','kindergarten','language_school','leisure','letter_box',
-    'library','loading_dock','lobby','lounge','luggage_locker','marketplace','meditation_centre','monastery',
-    'money_transfer','motorcycle_parking','motorcycle_rental','music_school','nightclub','nursery',
-    'office|financial','park','parking','parking_entrance','parking_space','payment_terminal','pharmacy',
-    'photo_booth','place_of_worship','playground','police','post_box','post_depot','post_office','prep_school',
-    'public_bookcase','public_building','ranger_station','recycling','research_institute','safety',
-    'sanitary_dump_station','school','science','scrapyard','seaplane terminal','shelter','shop|clothes','shower',
-    'smoking_area','social_centre','social_facility','spa','storage','storage_rental','stripclub','studio',
-    'taxi','telephone','theatre','toilets','townhall','training','trash','trolley_bay','university','vacuum_cleaner',
-    'vending_machine','driving_school','veterinary','waste_basket','waste_disposal','waste_transfer_station',
-    'water_point','watering_place','workshop''bureau_de_change','bus_station','internet_cafe', 'doctors',
-    'dojo','bureau_de_change', 'boat_rental', 'workshop', 'drinking_water'
-
-    ]
-    
+import instrument
 
-def main(file1, file2, location1, location2, dist):
-    osm_data = pd.read_json(file1)
-    
-    # chain restaurant data using qid
-    chain_qids=pd.read_json(file2)
-    
-    # merge osm_data and chain_qid to identify chain restaurants in 
-    osm_data=osm_data.merge(chain_qids, how='left', on='qid')
-    osm_data['is_chain_restaurant']=osm_data.is_chain_restaurant.fillna(0)
-    
-    # filter restaurants from non restaurant in osm_data
-    amenity=osm_data['amenity']
-    restaurant=list(dict.fromkeys([i for i in amenity if i not in nonRestaurestaurant()]))
-    #print(restaurant)
-    osm_data=osm_data[osm_data['amenity'].isin(restaurant)]
-    
-    size=osm_data.lat.size
-    
-        
-    #convert locations list to matrix for haversine_vector(), distance calculation
-    location1_matrix=make_matrix(location1, size)
-    location2_matrix=make_matrix(location2, size)
-
-    #distance between location 1 and osm_data locations
-    osm_data['dist1']=haversine_vector(
-        osm_data[['lat', 'lon']].values.tolist(), [location1 for i in range(size)], 
-        Unit.KILOMETERS
-    )
+from categories import is_restaurant
+from comparison import compare_locations, get_grid_pairs, read_location_pairs
+from instrument import traced
+from maps import (
+    HEAT_MAP_MODES, MARKER_MODES, add_heat_map, add_restaurant_markers
+)
+from spatial import build_spatial_index, query_radius
+from storage import read_frame
 
-    #distance between location 2 and osm_data locations
-    osm_data['dist2']=haversine_vector(
-        osm_data[['lat', 'lon']].values.tolist(), [location2 for i in range(size)], 
-        Unit.KILOMETERS
+@traced
+def get_restaurants(osm_data, chain_qids):
+    # identify chain restaurants in osm_data by looking their qids up in
+    # chain_qids (rather than merging on qid)
+    chain_qids=chain_qids.loc[chain_qids.is_chain_restaurant==1, 'qid']
+    osm_data=osm_data.assign(
+        is_chain_restaurant=osm_data['qid'].isin(chain_qids).astype(int)
     )
     
+    # filter restaurants from non restaurant in osm_data (see categories.py)
+    osm_data=osm_data[is_restaurant(osm_data['amenity'])]
+    return osm_data
+
+@traced
+def analyze_and_visualize(osm_data, chain_qids, location1, location2, dist,
+                          marker_mode='circles', heat_map_mode='points',
+                          heat_map_zoom=13):
+    osm_data=get_restaurants(osm_data, chain_qids)
+    
+    # index the restaurants once - the restaurants near each location are
+    # then found without computing the distance to every restaurant
+    with instrument.span('radius query', len(osm_data)) as query_span:
+        spatial_index = build_spatial_index(osm_data[['lat', 'lon']].values)
+        within_dist1, within_dist2 = query_radius(
+            spatial_index, [location1, location2], dist
+        )
+        query_span.rows_out = len(within_dist1) + len(within_dist2)
+    is_chain_restaurant = (osm_data.is_chain_restaurant == 1).values
     
     # number of chain restaurants with chosen distance of location 1
-    dist1_and_chain=osm_data[(osm_data.dist1<dist)&(osm_data.is_chain_restaurant==1)].shape[0]
+    dist1_and_chain=int(is_chain_restaurant[within_dist1].sum())
     
     # number of chain restaurants with chosen distance of location 2
-    dist2_and_chain=osm_data[(osm_data.dist2<dist)&(osm_data.is_chain_restaurant==1)].shape[0]
+    dist2_and_chain=int(is_chain_restaurant[within_dist2].sum())
     
     # number of non chain restaurants with chosen distance of location 1
-    dist1_and_nonchain=osm_data[(osm_data.dist1<dist)&(osm_data.is_chain_restaurant==0)].shape[0]
+    dist1_and_nonchain=len(within_dist1)-dist1_and_chain
     
     # number of non chain restaurants with chosen distance of location 2
-    dist2_and_nonchain=osm_data[(osm_data.dist2<dist)&(osm_data.is_chain_restaurant==0)].shape[0]
+    dist2_and_nonchain=len(within_dist2)-dist2_and_chain
     
 
     # perform chi-squared with filtered distances to compare
@@ -94,51 +70,107 @@ def main(file1, file2, location1, location2, dist):
     p_value = chi2_contingency(restaurant_contingency)[1]
     print(f'Chi-squared p-value: {p_value}')
     
-    # for map visualization
-    # put a marker on location 1 and 2 on map
-    m3=folium.Map(location=location2, zoom_start=100)
-    folium.Marker(location1, popup='<b>Location 1</b>').add_to(m3)
-    folium.Marker(location2, popup='<b>Location 2</b>').add_to(m3)
-    
-    
     # select only restauarnts with distance of your chosen distance
-    within_distance=osm_data[(osm_data.dist2<dist)|(osm_data.dist1<dist)]
-    chain_restaurant = within_distance[within_distance.is_chain_restaurant==1][["lat","lon"]].values
-    non_chain_restaurant = within_distance[within_distance.is_chain_restaurant==0][["lat","lon"]].values
-    
+    within_distance=osm_data.iloc[np.union1d(within_dist1, within_dist2)]
     
-    # blue for restaurants within chosen distance of location 1
-    for i in range(len(chain_restaurant)):
-        folium.CircleMarker(chain_restaurant[i], radius=8, color='blue', fill=True).add_to(m3)
-    
-
-    # red for restaurants within chosen distance of location 2   
-    for i in range(len(non_chain_restaurant)):
-        folium.CircleMarker(non_chain_restaurant[i], radius=2, color='red', s=25, fill=True).add_to(m3)
+    # for map visualization
+    # put a marker on location 1 and 2 on map
+    with instrument.span('map', len(within_distance)):
+        m3=folium.Map(location=location2, zoom_start=100)
+        folium.Marker(location1, popup='<b>Location 1</b>').add_to(m3)
+        folium.Marker(location2, popup='<b>Location 2</b>').add_to(m3)
         
-    m3.save('map.html')
+        # blue for chain restaurants, red for the others (see maps.py)
+        add_restaurant_markers(
+            m3,
+            within_distance[["lat","lon"]].values,
+            (within_distance.is_chain_restaurant==1).values,
+            marker_mode
+        )
+            
+        m3.save('map.html')
     
     # For heat map visualization - with similar procedure
-    m=folium.Map(location=location2, zoom_start=100)
-    folium.Marker(location1, popup='<b>SFU Burnaby</b>').add_to(m)
-    folium.Marker(location2, popup='<b>SFU Vancouver</b>').add_to(m)
-    latlons = osm_data[["lat","lon"]].values
-    HeatMap(latlons).add_to(m)
-    m.save('heat_map.html')
+    with instrument.span('heat map', len(osm_data)):
+        m=folium.Map(location=location2, zoom_start=100)
+        folium.Marker(location1, popup='<b>SFU Burnaby</b>').add_to(m)
+        folium.Marker(location2, popup='<b>SFU Vancouver</b>').add_to(m)
+        latlons = osm_data[["lat","lon"]].values
+        add_heat_map(
+            m, latlons, (osm_data.is_chain_restaurant==1).values, heat_map_mode,
+            heat_map_zoom
+        )
+        m.save('heat_map.html')
+
+def main(file1, file2, location1, location2, dist, marker_mode='circles',
+         heat_map_mode='points', heat_map_zoom=13):
+    # only read the columns needed (parquet/feather skip the others on disk)
+    with instrument.span('read') as read_span:
+        osm_data = read_frame(file1, columns=['lat', 'lon', 'amenity', 'qid'])
+        
+        # chain restaurant data using qid
+        chain_qids=read_frame(file2)
+        read_span.rows_out = len(osm_data) + len(chain_qids)
+
+    analyze_and_visualize(
+        osm_data, chain_qids, location1, location2, dist, marker_mode,
+        heat_map_mode, heat_map_zoom
+    )
+
+def main_batch(file1, file2, output_file, radii, pairs_file=None, grid=None,
+               grid_size=(10, 10)):
+    """Compare many pairs of locations at once - the data is read once and
+    the chain/non chain restaurant counts and chi-squared p-values of every
+    pair and radius are written to a CSV
+
+    Args:
+        file1 (str): preprocessed OSM data
+        file2 (str): chain restaurant qids
+        output_file (str): CSV the results are written to
+        radii (list): distances in km
+        pairs_file (str): CSV with lat1, lon1, lat2 and lon2 columns
+        grid (list):
+            lat_min, lon_min, lat_max and lon_max of a grid whose locations
+            are all compared with each other (used if pairs_file is None)
+
+        grid_size (tuple): number of latitudes and longitudes of the grid
+
+    Returns:
+        None
+    """
+
+    with instrument.span('read') as read_span:
+        osm_data = read_frame(file1, columns=['lat', 'lon', 'amenity', 'qid'])
+        chain_qids = read_frame(file2)
+        read_span.rows_out = len(osm_data) + len(chain_qids)
+    restaurants = get_restaurants(osm_data, chain_qids)
+
+    if pairs_file is not None:
+        location_pairs = read_location_pairs(pairs_file)
+    else:
+        location_pairs = get_grid_pairs(*grid, *grid_size)
+
+    with instrument.span('compare_locations', len(location_pairs)) as compare_span:
+        results = compare_locations(restaurants, location_pairs, radii)
+        compare_span.rows_out = len(results)
+    with instrument.span('write', len(results)):
+        results.to_csv(output_file, index=False)
+    print(f'{len(results)} comparisons written to {output_file}')
+
+def prompt_and_analyze(file1, file2, marker_mode='circles',
+                       heat_map_mode='points', heat_map_zoom=13):
+    """Ask for two locations and a distance (or use the default SFU
+    campuses and 5 km) and run the analysis on them
+    """
 
-if __name__ == '__main__':
-    # default intializations
-    file1='data/preprocessed-osm-data.json.gz'
-    file2='data/chain-restaurant-qids.json'
-    
     while True:
-    
+
         # https://stackoverflow.com/questions/1841565/valueerror-invalid-literal-for-int-with-base-10
         flag=int(float(input("Choose:\n0 - to enter your own values\n1 - to use default values: \n")))
-        
-    
-    
     
+
+
+
         if flag==0:
 
             print("Enter coordinations for location 1:\n")
@@ -156,7 +188,11 @@ if __name__ == '__main__':
             location2 = [lat2,  lon2]
 
             print('\n\n\n')
-            main(file1, file2, location1, location2, dist)
+            with instrument.span('analyze-and-visualize'):
+                main(
+                    file1, file2, location1, location2, dist, marker_mode,
+                    heat_map_mode, heat_map_zoom
+                )
             break
 
         if flag==1:
@@ -171,8 +207,61 @@ if __name__ == '__main__':
             print('distance within location 1 and 2  interested in: ', dist,'km')
 
             print('\n\n\n')
-            main(file1, file2, location1, location2, dist)
+            with instrument.span('analyze-and-visualize'):
+                main(
+                    file1, file2, location1, location2, dist, marker_mode,
+                    heat_map_mode, heat_map_zoom
+                )
             break
-        
-        
-    
+
+if __name__ == '__main__':
+    # default intializations
+    file1='data/preprocessed-osm-data.json.gz'
+    file2='data/chain-restaurant-qids.json'
+
+    # without --pairs or --grid the locations are entered interactively
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--osm-data', default=file1)
+    parser.add_argument('--chain-qids', default=file2)
+    parser.add_argument(
+        '--pairs', help='CSV of locations to compare (lat1, lon1, lat2, lon2)'
+    )
+    parser.add_argument(
+        '--grid', type=float, nargs=4,
+        metavar=('LAT_MIN', 'LON_MIN', 'LAT_MAX', 'LON_MAX'),
+        help='compare every pair of locations of a grid'
+    )
+    parser.add_argument(
+        '--grid-size', type=int, nargs=2, default=[10, 10],
+        metavar=('NUM_LATS', 'NUM_LONS')
+    )
+    parser.add_argument('--radii', type=float, nargs='+', default=[5])
+    parser.add_argument('--output', default='comparisons.csv')
+    parser.add_argument(
+        '--markers', choices=MARKER_MODES, default='circles',
+        help='how restaurants are drawn on map.html'
+    )
+    parser.add_argument(
+        '--heat-map', choices=HEAT_MAP_MODES, default='points',
+        help='send every restaurant or grid cell counts to heat_map.html'
+    )
+    parser.add_argument(
+        '--heat-map-zoom', type=int, default=13,
+        help='zoom level whose resolution the heat map grid cells have'
+    )
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure_from_args(args)
+
+    # in interactive mode the span starts once the locations are entered
+    if args.pairs is not None or args.grid is not None:
+        with instrument.span('analyze-and-visualize'):
+            main_batch(
+                args.osm_data, args.chain_qids, args.output, args.radii,
+                args.pairs, args.grid, args.grid_size
+            )
+    else:
+        prompt_and_analyze(
+            args.osm_data, args.chain_qids, args.markers, args.heat_map,
+            args.heat_map_zoom
+        )
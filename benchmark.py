@@ -0,0 +1,1788 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import folium
+import numpy as np
+import pandas as pd
+
+import categories
+import cluster
+import comparison
+import fetch
+import maps
+import names
+import pipeline
+import spatial
+import storage
+import transform
+
+from haversine import Unit, haversine_vector
+from scipy.spatial.distance import pdist
+from scipy.stats import chi2_contingency
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# wbgetentities response and entity pages served to stage 02 by the
+# wikidata benchmark
+WIKIDATA_FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures', 'wikidata')
+STAGE_SCRIPTS = [
+    '01-preprocess-osm-data.py', '02-scrape-wikidata.py',
+    '03-preprocess-wikidata.py', '04-identify-chain-restaurants.py',
+    '05-analyze-and-visualize.py'
+]
+
+AMENITIES = [
+    'restaurant', 'fast_food', 'cafe', 'bar', 'pub', 'bench', 'bicycle_parking',
+    'parking', 'bank', 'toilets', 'post_box', 'waste_basket'
+]
+CUISINES = [
+    'pizza', 'burger', 'coffee_shop', 'sushi', 'chinese', 'japanese',
+    'indian', 'mexican', 'sandwich', 'vietnamese'
+]
+
+LETTERS = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+
+# description, preprocessed description (as stage 03 would preprocess it),
+# amenity and cuisine of the kinds of brands in the synthetic Wikidata
+BRAND_KINDS = [
+    ('chain of pizza restaurants', 'chain pizza restaurant', 'restaurant', 'pizza'),
+    ('fast food restaurant chain', 'fast food restaurant chain', 'fast_food', 'burger'),
+    ('coffeehouse chain', 'coffeehouse chain', 'cafe', 'coffee_shop'),
+    ('chain of sushi restaurants', 'chain sushi restaurant', 'restaurant', 'sushi'),
+    ('casual dining restaurant chain', 'casual dining restaurant chain', 'restaurant', 'burger'),
+    ('sandwich restaurant chain', 'sandwich restaurant chain', 'fast_food', 'sandwich'),
+    ('bubble tea shop chain', 'bubble tea shop chain', 'cafe', 'bubble_tea'),
+    ('bank', 'bank', 'bank', None),
+    ('credit union', 'credit union', 'bank', None),
+    ('oil company', 'oil company', 'fuel', None),
+    ('car rental company', 'car rental company', 'car_rental', None),
+    ('pharmacy chain', 'pharmacy chain', 'pharmacy', None)
+]
+COUNTRIES = ['Canadian', 'American', 'British', 'Japanese', 'Taiwanese', 'Mexican']
+WIKIDATA_COLUMNS = ['qid', 'names', 'description']
+PREPROCESSED_WIKIDATA_COLUMNS = ['qid', 'preprocessed_names', 'preprocessed_description']
+
+# steps timed by the suite benchmark - stage 01's tag extraction and the
+# whole stage, stage 03's text preprocessing (needs the nltk corpora), stage
+# 04's keyword rule and clustering, the n-gram counts of the description
+# analysis and stage 05's distance filtering
+SUITE_BENCHMARKS = (
+    'tag_extraction', 'preprocess_osm_data', 'preprocess_text', 'clustering',
+    'ngram_counts', 'distance_filtering'
+)
+
+def make_tags(num_rows, num_distinct=1000, seed=0):
+    """Make a synthetic OSM tags column - rows reference a pool of distinct
+    tag dicts so very large inputs fit in memory
+
+    Args:
+        num_rows (int): number of OSM entries
+        num_distinct (int): number of distinct tag dicts
+        seed (int): random seed
+
+    Returns:
+        tags (series): dict (or NaN, for ~5% of the rows) per OSM entry
+    """
+
+    rng = np.random.default_rng(seed)
+    pool = []
+    for i in range(num_distinct):
+        tags = {'amenity': AMENITIES[i % len(AMENITIES)]}
+        if rng.random() < 0.4:
+            tags['cuisine'] = CUISINES[rng.integers(len(CUISINES))]
+        if rng.random() < 0.2:
+            tags['brand:wikidata'] = f'Q{rng.integers(1, 10 ** 6)}'
+        if rng.random() < 0.5:
+            tags['opening_hours'] = 'Mo-Su 09:00-21:00'
+        pool.append(tags)
+    pool.append(np.nan)
+
+    # the last pool entry (NaN) is picked for ~5% of the rows
+    is_missing = rng.random(num_rows) < 0.05
+    choices = rng.integers(num_distinct, size=num_rows)
+    choices[is_missing] = num_distinct
+    tags = pd.Series(np.array(pool, dtype=object)[choices])
+    return tags
+
+def make_osm_data(num_rows, seed=0):
+    """Make synthetic preprocessed OSM data (the output of stage 01)
+
+    Args:
+        num_rows (int): number of OSM entries
+        seed (int): random seed
+
+    Returns:
+        osm_data (dataframe):
+            lat, lon, amenity, name, tags, cuisine and qid columns
+    """
+
+    rng = np.random.default_rng(seed)
+    tags = make_tags(num_rows, seed=seed)
+    tags_data = transform.get_tags_data(tags, ['amenity', 'brand:wikidata', 'cuisine'])
+    osm_data = pd.DataFrame({
+        'lat': rng.uniform(49.0, 49.4, num_rows),
+        'lon': rng.uniform(-123.3, -122.5, num_rows),
+        'amenity': tags_data['amenity'],
+        'name': [f'Place {i}' for i in rng.integers(num_rows // 10 + 1, size=num_rows)],
+        'tags': tags,
+        'cuisine': tags_data['cuisine'],
+        'qid': tags_data['brand:wikidata']
+    })
+    return osm_data
+
+def make_descriptions(num_descriptions, vocabulary_size=5000, num_topics=20,
+                      seed=0):
+    """Make synthetic preprocessed Wikidata descriptions - each description
+    mixes a few words from one of num_topics topics with common words
+
+    Args:
+        num_descriptions (int): number of descriptions
+        vocabulary_size (int): number of distinct words
+        num_topics (int): number of groups of related words
+        seed (int): random seed
+
+    Returns:
+        descriptions (series): space separated words per description
+    """
+
+    rng = np.random.default_rng(seed)
+    words = np.array([f'word{i}' for i in range(vocabulary_size)])
+    topics = rng.integers(num_topics, size=num_descriptions)
+    topic_size = vocabulary_size // num_topics
+    lengths = rng.integers(3, 12, size=num_descriptions)
+
+    descriptions = []
+    for topic, length in zip(topics, lengths):
+        # ~3/4 of the words come from the description's topic, the rest from
+        # the 50 most common words
+        topic_words = rng.integers(topic_size, size=length) + topic * topic_size
+        common_words = rng.integers(50, size=length)
+        is_topic_word = rng.random(length) < 0.75
+        descriptions.append(
+            ' '.join(words[np.where(is_topic_word, topic_words, common_words)])
+        )
+    return pd.Series(descriptions)
+
+def make_word(rng):
+    """Make a random lowercase word of 5 to 10 letters"""
+
+    return ''.join(rng.choice(LETTERS, size=rng.integers(5, 11)))
+
+def make_names(num_known, num_unmatched, seed=0):
+    """Make synthetic OSM names - known names with a qid, and unmatched names
+    of which half are misspelt or suffixed known names and half are new
+
+    Args:
+        num_known (int): number of names with a qid
+        num_unmatched (int): number of names without a qid
+        seed (int): random seed
+
+    Returns:
+        name_qid, unmatched_names (tuple):
+            dict of (known name, qid) pairs and a list of unmatched names
+    """
+
+    rng = np.random.default_rng(seed)
+    known_names = [make_word(rng).title() + ' ' + make_word(rng).title() for _ in range(num_known)]
+    name_qid = {name: f'Q{i}' for i, name in enumerate(known_names)}
+
+    unmatched_names = []
+    for i in range(num_unmatched):
+        if i % 2 == 0:
+            unmatched_names.append(make_word(rng).title() + ' ' + make_word(rng).title())
+            continue
+        name = known_names[rng.integers(num_known)]
+        if i % 4 == 1:
+            # drop a letter
+            position = rng.integers(len(name))
+            unmatched_names.append(name[:position] + name[position + 1:])
+        else:
+            unmatched_names.append(name + "'s Pizza")
+    return name_qid, unmatched_names
+
+def make_brands(num_brands, seed=0):
+    """Make synthetic Wikidata entries of the brands OSM entries link to
+
+    Args:
+        num_brands (int): number of entries
+        seed (int): random seed
+
+    Returns:
+        brands (dataframe):
+            qid, names (list), description, preprocessed_names,
+            preprocessed_description, and the amenity and cuisine of the
+            brand's OSM entries
+    """
+
+    rng = np.random.default_rng(seed)
+    kinds = rng.integers(len(BRAND_KINDS), size=num_brands)
+    countries = rng.integers(len(COUNTRIES), size=num_brands)
+    has_place = rng.random(num_brands) < 0.5
+
+    rows = []
+    for i, (kind, country, with_place) in enumerate(zip(kinds, countries, has_place)):
+        description, preprocessed_description, amenity, cuisine = BRAND_KINDS[kind]
+        name = make_word(rng).title() + (' ' + make_word(rng).title() if i % 3 == 0 else '')
+        names = [name, f'{name} Inc.'] if i % 2 == 0 else [name]
+        description = f'{COUNTRIES[country]} {description}'
+        preprocessed_description = f'{COUNTRIES[country].lower()} {preprocessed_description}'
+        if with_place:
+            # a word of its own, so the vocabulary grows with the entries
+            place = make_word(rng)
+            description += f' based in {place.title()}'
+            preprocessed_description += f' based {place}'
+        rows.append({
+            'qid': f'Q{i + 1}',
+            'names': names,
+            'description': description,
+            'preprocessed_names': ' '.join(names).lower().replace('.', ''),
+            'preprocessed_description': preprocessed_description,
+            'amenity': amenity,
+            'cuisine': cuisine
+        })
+    return pd.DataFrame(rows)
+
+def make_amenities(num_rows, brands, seed=0):
+    """Make synthetic raw OSM amenities (the input of stage 01) - about 30%
+    of the entries are branches of brands (most popular brands first), 80%
+    of which have a brand:wikidata tag, the others only the brand's name
+
+    Args:
+        num_rows (int): number of OSM entries
+        brands (dataframe): output of make_brands
+        seed (int): random seed
+
+    Returns:
+        amenities (dataframe): lat, lon, timestamp, amenity, name and tags
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # entries are spread around a few centres (downtown, Burnaby, Richmond,
+    # Surrey, North Vancouver) like the Vancouver data
+    centres = np.array([
+        [49.2827, -123.1207], [49.2488, -122.9805], [49.1666, -123.1336],
+        [49.1913, -122.8490], [49.3200, -123.0724]
+    ])
+    centre = rng.integers(len(centres), size=num_rows)
+    lat = np.clip(centres[centre, 0] + rng.normal(0, 0.03, num_rows), 49.0, 49.4)
+    lon = np.clip(centres[centre, 1] + rng.normal(0, 0.05, num_rows), -123.3, -122.5)
+    timestamps = np.array([
+        f'20{year:02d}-{month:02d}-15T12:00:00.000-07:00'
+        for year in range(12, 21) for month in range(1, 13)
+    ])
+
+    # brands - Zipf-like popularity, each brand's tags with and without
+    # brand:wikidata are shared by its entries
+    popularity = 1 / np.arange(1, len(brands) + 1)
+    brand = rng.choice(len(brands), size=num_rows, p=popularity / popularity.sum())
+    brand_tags = []
+    for row in brands.itertuples():
+        tags = {
+            'brand': row.names[0], 'opening_hours': 'Mo-Su 07:00-22:00',
+            'addr:street': 'Main Street', 'brand:wikidata': row.qid
+        }
+        if isinstance(row.cuisine, str):
+            tags['cuisine'] = row.cuisine
+        brand_tags.append(tags)
+    brand_tags += [
+        {key: value for key, value in tags.items() if key != 'brand:wikidata'}
+        for tags in brand_tags
+    ]
+
+    # other entries - local places with a name, and unnamed amenities
+    num_places = num_rows // 20 + 1
+    place_names = np.array([make_word(rng).title() for _ in range(num_places)], dtype=object)
+    place_tags = [{}] + [
+        {'cuisine': cuisine, 'opening_hours': 'Mo-Fr 11:00-21:00'} for cuisine in CUISINES
+    ]
+
+    is_brand = rng.random(num_rows) < 0.3
+    has_qid = rng.random(num_rows) < 0.8
+    amenity = np.array(AMENITIES, dtype=object)[rng.integers(len(AMENITIES), size=num_rows)]
+    is_named = np.isin(amenity, ['restaurant', 'fast_food', 'cafe', 'bar', 'pub', 'bank'])
+    name = np.where(is_named, place_names[rng.integers(num_places, size=num_rows)], np.nan)
+    tags = np.array(place_tags, dtype=object)[
+        np.where(is_named, rng.integers(len(place_tags), size=num_rows), 0)
+    ]
+
+    amenity[is_brand] = brands['amenity'].values[brand[is_brand]]
+    name[is_brand] = np.array([names[0] for names in brands['names']], dtype=object)[brand[is_brand]]
+    tags[is_brand] = np.array(brand_tags, dtype=object)[
+        brand[is_brand] + np.where(has_qid[is_brand], 0, len(brands))
+    ]
+
+    amenities = pd.DataFrame({
+        'lat': np.round(lat, 7),
+        'lon': np.round(lon, 7),
+        'timestamp': timestamps[rng.integers(len(timestamps), size=num_rows)],
+        'amenity': amenity,
+        'name': name,
+        'tags': tags
+    })
+    return amenities
+
+def write_synthetic_data(directory, num_rows, num_brands=None, seed=0):
+    """Write synthetic inputs in the formats of the files in data/ - raw and
+    preprocessed Wikidata entries and a raw OSM amenities file linking to
+    them
+
+    Args:
+        directory (str): output directory
+        num_rows (int): number of OSM entries
+        num_brands (int): number of Wikidata entries, num_rows / 20 if None
+        seed (int): random seed
+
+    Returns:
+        paths (dict): contains (artifact name, file path) key value pairs
+    """
+
+    if num_brands is None:
+        num_brands = get_num_brands(num_rows)
+    brands = make_brands(num_brands, seed)
+    amenities = make_amenities(num_rows, brands, seed)
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        'amenities': os.path.join(directory, 'amenities-vancouver.json.gz'),
+        'wikidata': os.path.join(directory, 'wikidata.json'),
+        'preprocessed_wikidata': os.path.join(directory, 'preprocessed-wikidata.json')
+    }
+    amenities.to_json(paths['amenities'], orient='records', lines=True)
+    storage.write_frame(brands[WIKIDATA_COLUMNS], paths['wikidata'])
+    storage.write_frame(
+        brands[PREPROCESSED_WIKIDATA_COLUMNS], paths['preprocessed_wikidata']
+    )
+    return paths
+
+def get_num_brands(num_rows):
+    """Get the default number of Wikidata entries for num_rows OSM entries
+    (about the ratio of the Vancouver data)
+    """
+
+    return max(num_rows // 20, 10)
+
+def time_call(function, *args, **kwargs):
+    """Time a single call
+
+    Returns:
+        seconds, result (tuple): wall time of the call and its result
+    """
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def check(condition, message):
+    """Fail a benchmark whose results are wrong - unlike assert, the check
+    also runs under python -O
+
+    Args:
+        condition (bool): True if the results are as expected
+        message (str): what went wrong, reported if condition is False
+
+    Returns:
+        None
+    """
+
+    if not condition:
+        raise AssertionError(message)
+
+def trace_call(function, *args, **kwargs):
+    """Time a single call and trace its peak memory use
+
+    Returns:
+        seconds, peak_mb, result (tuple):
+            wall time of the call, peak traced allocations (python/numpy)
+            during the call and its result
+    """
+
+    tracemalloc.start()
+    try:
+        seconds, result = time_call(function, *args, **kwargs)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak_bytes / 2 ** 20, result
+
+def benchmark_tag_extraction(num_rows, tag_names=('brand:wikidata', 'cuisine')):
+    """Compare extracting tags with one apply per tag (get_tag_data) against
+    the single pass get_tags_data
+
+    Args:
+        num_rows (int): number of synthetic OSM entries
+        tag_names (tuple): tags to extract
+
+    Returns:
+        results (dict): seconds taken by each approach
+    """
+
+    tags = make_tags(num_rows)
+    tag_names = list(tag_names)
+
+    def extract_with_apply():
+        return pd.DataFrame({
+            tag_name: tags.apply(
+                lambda tag: transform.get_tag_data(tag, tag_name)
+            )
+            for tag_name in tag_names
+        })
+
+    apply_seconds, expected = time_call(extract_with_apply)
+    bulk_seconds, tags_data = time_call(transform.get_tags_data, tags, tag_names)
+    assert (
+        expected.astype(object).fillna('').equals(tags_data.fillna(''))
+    )
+
+    return {
+        'rows': num_rows,
+        'apply_seconds': apply_seconds,
+        'bulk_seconds': bulk_seconds,
+        'speedup': apply_seconds / bulk_seconds
+    }
+
+def benchmark_keywords(num_rows, terms=('word1', 'word2', 'word3 word4')):
+    """Compare searching descriptions with one get_match apply per term and
+    with one vectorized str.contains per term against the single combined
+    pattern of get_term_matches
+
+    Args:
+        num_rows (int): number of synthetic descriptions
+        terms (tuple): keywords to search for
+
+    Returns:
+        results (dict): seconds taken by each approach
+    """
+
+    descriptions = make_descriptions(num_rows)
+
+    def match_with_apply():
+        return pd.DataFrame({
+            term: descriptions.apply(
+                lambda description: transform.get_match(term, description)
+            ).notna()
+            for term in terms
+        })
+
+    def match_per_term():
+        return pd.DataFrame({
+            term: descriptions.str.contains(term, regex=True, na=False)
+            .astype(bool)
+            for term in terms
+        })
+
+    apply_seconds, expected = time_call(match_with_apply)
+    per_term_seconds, per_term_matches = time_call(match_per_term)
+    combined_seconds, term_matches = time_call(
+        transform.get_term_matches, descriptions, terms
+    )
+    assert expected.equals(per_term_matches)
+    assert expected.equals(term_matches)
+
+    return {
+        'rows': num_rows,
+        'terms': len(terms),
+        'matching_rows': int(term_matches.any(axis=1).sum()),
+        'apply_seconds': apply_seconds,
+        'per_term_seconds': per_term_seconds,
+        'combined_seconds': combined_seconds,
+        'speedup': apply_seconds / combined_seconds
+    }
+
+def benchmark_ngrams(num_rows, num_ngrams=1000, ngram_range=(1, 3),
+                     chunksize=10000, max_dense_bytes=2 ** 30):
+    """Compare counting n-grams with a dense document-term matrix (the
+    original get_ngram_counts) against summing the sparse matrix and
+    streaming chunks of documents
+
+    Args:
+        num_rows (int): number of synthetic descriptions
+        num_ngrams (int): number of top n-grams counted
+        ngram_range (tuple): range of n-grams counted
+        chunksize (int): number of documents counted at a time when streaming
+        max_dense_bytes (int): largest dense matrix the original approach uses
+
+    Returns:
+        results (dict): seconds and peak traced memory of each approach
+    """
+
+    descriptions = make_descriptions(num_rows)
+
+    def count_with_dense_matrix():
+        vectorizer = CountVectorizer(
+            lowercase=False, max_features=num_ngrams, ngram_range=ngram_range
+        )
+        X = vectorizer.fit_transform(descriptions)
+        document_ngram_df = pd.DataFrame(
+            X.toarray(), columns=vectorizer.get_feature_names_out()
+        )
+        ngram_counts = document_ngram_df.sum(axis=0).reset_index()
+        ngram_counts.rename(columns={'index': 'ngram', 0: 'count'}, inplace=True)
+        return ngram_counts
+
+    approaches = {
+        'sparse': lambda: transform.get_ngram_counts(
+            descriptions, num_ngrams, ngram_range
+        ),
+        'streaming': lambda: transform.get_ngram_counts(
+            descriptions, num_ngrams, ngram_range, chunksize
+        )
+    }
+    if num_rows * num_ngrams * 8 <= max_dense_bytes:
+        approaches['dense'] = count_with_dense_matrix
+
+    results = {'rows': num_rows}
+    counts = {}
+    for name, count in approaches.items():
+        seconds, peak_mb, ngram_counts = trace_call(count)
+        results[name] = {'seconds': seconds, 'peak_mb': peak_mb}
+        # the top n-grams can differ where counts tie, their counts cannot
+        counts[name] = sorted(ngram_counts['count'])
+    assert all(value == counts['sparse'] for value in counts.values())
+    return results
+
+def benchmark_io(num_rows, extensions=('json.gz', 'json', 'parquet', 'feather')):
+    """Compare writing/reading preprocessed OSM data in each storage format -
+    'projected_read_seconds' reads only the columns stage 05 needs
+
+    Args:
+        num_rows (int): number of synthetic OSM entries
+        extensions (tuple): file extensions of the formats to compare
+
+    Returns:
+        results (dict): seconds taken and file size for each format
+    """
+
+    osm_data = make_osm_data(num_rows)
+    columns = ['lat', 'lon', 'amenity', 'qid']
+
+    results = {'rows': num_rows}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for extension in extensions:
+            path = os.path.join(temp_dir, f'osm-data.{extension}')
+            write_seconds, _ = time_call(storage.write_frame, osm_data, path)
+            read_seconds, _ = time_call(storage.read_frame, path)
+            projected_read_seconds, _ = time_call(
+                storage.read_frame, path, columns=columns
+            )
+            results[extension] = {
+                'bytes': os.path.getsize(path),
+                'write_seconds': write_seconds,
+                'read_seconds': read_seconds,
+                'projected_read_seconds': projected_read_seconds
+            }
+    return results
+
+def benchmark_clustering(sizes=(1000, 10000, 50000, 200000),
+                         methods=cluster.CLUSTERING_METHODS, max_dense=2000):
+    """Compare the time and peak memory (traced python/numpy allocations) of
+    each clustering method on synthetic descriptions
+
+    Args:
+        sizes (tuple): numbers of descriptions
+        methods (tuple): clustering methods to compare
+        max_dense (int):
+            largest number of descriptions 'hierarchical' is run on - it
+            needs O(n^2) memory and roughly O(n^3) time
+
+    Returns:
+        results (list): dict of size, method, seconds and peak_mb per run
+    """
+
+    results = []
+    for size in sizes:
+        descriptions = make_descriptions(size)
+        document_term_matrix = CountVectorizer(lowercase=False).fit_transform(
+            descriptions
+        )
+        for method in methods:
+            if method == 'hierarchical' and size > max_dense:
+                continue
+            seconds, peak_mb, _ = trace_call(
+                cluster.get_clusters, document_term_matrix, 3, method
+            )
+            results.append({
+                'size': size, 'method': method, 'seconds': seconds, 'peak_mb': peak_mb
+            })
+            print(results[-1])
+    return results
+
+def benchmark_linkage(sizes=(1000, 2000, 4000), max_similarities=4000,
+                      num_clusters=3):
+    """Compare complete linkage of the condensed distances between rows of
+    cosine similarities against the original linkage of the rows themselves,
+    and check that both give the same clusters and that the condensed
+    distances match scipy's pdist of the rows
+
+    Args:
+        sizes (tuple): numbers of descriptions
+        max_similarities (int):
+            largest number of descriptions the rows of similarities are
+            clustered for
+        num_clusters (int): number of clusters compared
+
+    Returns:
+        results (list):
+            dict of size, mode (linkage input), seconds and peak_mb per run
+    """
+
+    results = []
+    for size in sizes:
+        document_term_matrix = CountVectorizer(lowercase=False).fit_transform(
+            make_descriptions(size)
+        )
+
+        modes = ['distances'] + (['similarities'] if size <= max_similarities else [])
+        clusters = {}
+        for mode in modes:
+            seconds, peak_mb, clusters[mode] = trace_call(
+                cluster.cluster_hierarchical,
+                document_term_matrix,
+                num_clusters,
+                linkage_input=mode
+            )
+            results.append({
+                'size': size, 'mode': mode, 'seconds': seconds, 'peak_mb': peak_mb
+            })
+            print(results[-1])
+
+        if size <= max_similarities:
+            # parity with scipy's float64 distances between the rows
+            expected_distances = pdist(
+                cosine_similarity(document_term_matrix), 'euclidean'
+            )
+            distances = cluster.get_condensed_similarity_distances(
+                document_term_matrix
+            )
+            assert distances.dtype == np.float32
+            assert np.allclose(distances, expected_distances, atol=1e-5)
+            assert (clusters['distances'] == clusters['similarities']).all()
+    return results
+
+def benchmark_amenities(num_rows):
+    """Compare filtering restaurants with the original per row scan of the
+    non restaurant list against categories.is_restaurant, and check they
+    keep the same rows
+
+    Args:
+        num_rows (int): number of synthetic OSM entries
+
+    Returns:
+        results (dict): seconds taken by each approach
+    """
+
+    amenities = make_osm_data(num_rows)['amenity']
+
+    def get_non_restaurants():
+        return list(categories.NON_RESTAURANT_AMENITIES)
+
+    def scan():
+        restaurant = list(dict.fromkeys(
+            [i for i in amenities if i not in get_non_restaurants()]
+        ))
+        return amenities.isin(restaurant)
+
+    scan_seconds, expected = time_call(scan)
+    categorical_seconds, is_restaurant = time_call(categories.is_restaurant, amenities)
+    # the scan keeps missing amenities, is_restaurant does not
+    assert (is_restaurant == (expected & amenities.notna())).all()
+
+    results = {
+        'rows': num_rows,
+        'scan_seconds': scan_seconds,
+        'categorical_seconds': categorical_seconds
+    }
+    return results
+
+def benchmark_qids(num_rows, num_chain_qids=100):
+    """Compare finding the chain restaurants of OSM data with a dictionary of
+    ones (get_num_chain_restaurants) and a merge on qid (the original stage
+    05) against Series.isin, and check all three agree
+
+    Args:
+        num_rows (int): number of synthetic OSM entries
+        num_chain_qids (int): number of chain restaurant qids
+
+    Returns:
+        results (dict): seconds taken by each approach
+    """
+
+    osm_data = make_osm_data(num_rows)[['qid']]
+    qids = osm_data['qid'].dropna().unique()
+    chain_qids = pd.DataFrame({
+        'qid': qids[:num_chain_qids], 'is_chain_restaurant': 1
+    })
+
+    def map_dict():
+        chain_restaurant_qids = transform.get_chain_restaurant_qids(chain_qids)
+        return transform.get_num_chain_restaurants(osm_data, chain_restaurant_qids)
+
+    def merge():
+        merged = osm_data.merge(chain_qids, how='left', on='qid')
+        return merged.is_chain_restaurant.fillna(0).values == 1
+
+    def isin():
+        return osm_data['qid'].isin(chain_qids['qid']).to_numpy()
+
+    map_seconds, num_chain_restaurants = time_call(map_dict)
+    merge_seconds, expected = time_call(merge)
+    isin_seconds, is_chain = time_call(isin)
+    check(
+        (is_chain == expected).all(),
+        'isin and the merge on qid found different chain restaurants'
+    )
+    check(
+        is_chain.sum() == num_chain_restaurants,
+        f'isin found {is_chain.sum()} chain restaurants, the dictionary '
+        f'{num_chain_restaurants}'
+    )
+
+    results = {
+        'rows': num_rows,
+        'map_seconds': map_seconds,
+        'merge_seconds': merge_seconds,
+        'isin_seconds': isin_seconds
+    }
+    return results
+
+def benchmark_names(sizes=(1000, 10000, 100000), threshold=0.8, max_dense=2000):
+    """Time fuzzy name matching (sparse products of character n-gram TF-IDF
+    vectors) and check it finds the same matches as comparing every pair of
+    names with dense vectors
+
+    Args:
+        sizes (tuple): numbers of known and of unmatched names
+        threshold (float): smallest similarity of a match
+        max_dense (int): largest size every pair is compared for
+
+    Returns:
+        results (list): dict of size, matches, seconds and dense_seconds per run
+    """
+
+    results = []
+    for size in sizes:
+        name_qid, unmatched_names = make_names(size, size)
+        seconds, matches = time_call(
+            names.get_fuzzy_matches, unmatched_names, name_qid, threshold
+        )
+        result = {'size': size, 'matches': len(matches), 'seconds': seconds}
+
+        if size <= max_dense:
+
+            def match_every_pair():
+                known_keys = [names.normalize_name(name) for name in name_qid]
+                keys = [names.normalize_name(name) for name in unmatched_names]
+                vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 3))
+                vectorizer.fit(known_keys + keys)
+                similarities = (
+                    vectorizer.transform(keys).toarray()
+                    @ vectorizer.transform(known_keys).toarray().T
+                )
+                best = similarities.max(axis=1)
+                return {
+                    name: list(name_qid.values())[index]
+                    for name, index, similarity in zip(
+                        unmatched_names, similarities.argmax(axis=1), best
+                    )
+                    if round(similarity, 6) >= threshold
+                }
+
+            result['dense_seconds'], expected = time_call(match_every_pair)
+            assert dict(zip(matches['name'], matches['qid'])) == expected
+
+        results.append(result)
+        print(result)
+    return results
+
+def benchmark_spatial(num_rows, num_locations=200, radius_km=5):
+    """Compare finding the points within radius_km of many locations with a
+    haversine_vector scan of every point per location (the original stage
+    05) against a ball tree built once, and check they find the same points
+
+    Args:
+        num_rows (int): number of synthetic OSM entries
+        num_locations (int): number of query locations
+        radius_km (float): distance in km
+
+    Returns:
+        results (dict): seconds taken by each approach
+    """
+
+    rng = np.random.default_rng(0)
+    points = make_osm_data(num_rows)[['lat', 'lon']].values
+    locations = np.column_stack([
+        rng.uniform(49.0, 49.4, num_locations),
+        rng.uniform(-123.3, -122.5, num_locations)
+    ])
+
+    def scan():
+        return [
+            np.flatnonzero(haversine_vector(
+                points.tolist(), [location] * num_rows, Unit.KILOMETERS
+            ) < radius_km)
+            for location in locations.tolist()
+        ]
+
+    scan_seconds, expected_indexes = time_call(scan)
+    build_seconds, spatial_index = time_call(spatial.build_spatial_index, points)
+    query_seconds, indexes = time_call(
+        spatial.query_radius, spatial_index, locations, radius_km
+    )
+    count_seconds, counts = time_call(
+        spatial.count_within_radius, spatial_index, locations, radius_km
+    )
+
+    for location_indexes, expected, count in zip(indexes, expected_indexes, counts):
+        assert np.array_equal(location_indexes, expected)
+        assert count == len(expected)
+
+    results = {
+        'rows': num_rows,
+        'locations': num_locations,
+        'scan_seconds': scan_seconds,
+        'build_seconds': build_seconds,
+        'query_seconds': query_seconds,
+        'count_seconds': count_seconds
+    }
+    return results
+
+def benchmark_comparisons(num_rows, grid_size=(10, 10), radii=(1, 2, 5),
+                          num_checked=200):
+    """Time the batch comparison of every pair of grid locations for each
+    radius against the original approach (a haversine_vector scan per
+    location and a chi2_contingency call per pair) on a sample of the pairs,
+    and check both give the same counts and p-values
+
+    Args:
+        num_rows (int): number of synthetic restaurants
+        grid_size (tuple): number of latitudes and longitudes of the grid
+        radii (tuple): distances in km
+        num_checked (int): number of comparisons run the original way
+
+    Returns:
+        results (dict): number of comparisons and comparisons per second
+    """
+
+    rng = np.random.default_rng(0)
+    restaurants = make_osm_data(num_rows)[['lat', 'lon']]
+    restaurants['is_chain_restaurant'] = (rng.random(num_rows) < 0.1).astype(int)
+    location_pairs = comparison.get_grid_pairs(49.0, -123.3, 49.4, -122.5, *grid_size)
+
+    seconds, batch_results = time_call(
+        comparison.compare_locations, restaurants, location_pairs, radii
+    )
+
+    points = restaurants[['lat', 'lon']].values.tolist()
+    is_chain_restaurant = restaurants.is_chain_restaurant.values == 1
+
+    def count(location, dist):
+        is_near = haversine_vector(
+            points, [location] * num_rows, Unit.KILOMETERS
+        ) < dist
+        return [(is_near & ~is_chain_restaurant).sum(), (is_near & is_chain_restaurant).sum()]
+
+    def compare(row):
+        contingency = np.array([
+            count([row.lat1, row.lon1], row.dist),
+            count([row.lat2, row.lon2], row.dist)
+        ])
+        try:
+            p_value = chi2_contingency(contingency)[1]
+        except ValueError:
+            p_value = np.nan
+        return contingency, p_value
+
+    checked = batch_results.sample(
+        min(num_checked, len(batch_results)), random_state=0
+    )
+    loop_seconds, expected = time_call(
+        lambda: [compare(row) for row in checked.itertuples()]
+    )
+    for row, (contingency, p_value) in zip(checked.itertuples(), expected):
+        assert contingency.ravel().tolist() == [
+            row.nonchain1, row.chain1, row.nonchain2, row.chain2
+        ]
+        assert np.isclose(row.p_value, p_value, rtol=1e-9, equal_nan=True)
+
+    results = {
+        'rows': num_rows,
+        'comparisons': len(batch_results),
+        'batch_per_second': len(batch_results) / seconds,
+        'loop_per_second': len(checked) / loop_seconds
+    }
+    return results
+
+def benchmark_maps(sizes=(1000, 10000, 100000), modes=maps.MARKER_MODES,
+                   max_circles=10000):
+    """Compare the time taken to build and save a map of restaurants and the
+    size of the html file for each marker mode
+
+    Args:
+        sizes (tuple): numbers of restaurants
+        modes (tuple): marker modes to compare
+        max_circles (int):
+            largest number of restaurants drawn with 'circles' - it creates
+            a python object and a block of javascript per restaurant
+
+    Returns:
+        results (list): dict of size, mode, seconds and bytes per run
+    """
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'map.html')
+        for size in sizes:
+            points = make_osm_data(size)[['lat', 'lon']].values
+            is_chain_restaurant = rng.random(size) < 0.1
+            for mode in modes:
+                if mode == 'circles' and size > max_circles:
+                    continue
+
+                def save_map():
+                    m = folium.Map(location=[49.2, -122.9], zoom_start=11)
+                    maps.add_restaurant_markers(m, points, is_chain_restaurant, mode)
+                    m.save(path)
+
+                seconds, _ = time_call(save_map)
+                results.append({
+                    'size': size, 'mode': mode, 'seconds': seconds,
+                    'bytes': os.path.getsize(path)
+                })
+                print(results[-1])
+    return results
+
+def benchmark_heat_maps(sizes=(1000, 10000, 100000, 1000000), zooms=(11, 13, 15)):
+    """Compare the time taken to build and save a heat map of restaurants and
+    the size of the html file when every point is sent to the browser and
+    when only grid cell counts are, at the resolution of each zoom level -
+    and check the cells hold every point
+
+    Args:
+        sizes (tuple): numbers of restaurants
+        zooms (tuple): zoom levels of the grid resolutions compared
+
+    Returns:
+        results (list): dict of size, mode, zoom, seconds and bytes per run
+    """
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'heat_map.html')
+        for size in sizes:
+            points = make_osm_data(size)[['lat', 'lon']].values
+            is_chain_restaurant = rng.random(size) < 0.1
+            runs = [('points', None)] + [('grid', zoom) for zoom in zooms]
+            for mode, zoom in runs:
+
+                def save_heat_map():
+                    m = folium.Map(location=[49.2, -122.9], zoom_start=11)
+                    maps.add_heat_map(m, points, is_chain_restaurant, mode, zoom)
+                    m.save(path)
+
+                seconds, _ = time_call(save_heat_map)
+                results.append({
+                    'size': size, 'mode': mode, 'zoom': zoom,
+                    'seconds': seconds, 'bytes': os.path.getsize(path)
+                })
+                print(results[-1])
+
+                if mode == 'grid':
+                    data = maps.get_heat_map_data(points, maps.get_cell_size(zoom))
+                    assert sum(weight for _, _, weight in data) == size
+    return results
+
+def get_import_times(script):
+    """Import a script in a fresh interpreter with python -X importtime
+    (without running its main)
+
+    Args:
+        script (str): python file
+
+    Returns:
+        total_seconds, import_seconds (tuple):
+            time taken by the whole import, and a dict with the cumulative
+            seconds of each module the script (or the interpreter's start up)
+            imports directly - modules imported by those are included in
+            their time
+    """
+
+    statement = (
+        'import importlib.util; '
+        f'spec = importlib.util.spec_from_file_location("stage", {script!r}); '
+        'spec.loader.exec_module(importlib.util.module_from_spec(spec))'
+    )
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+    )
+
+    # lines look like 'import time:   self [us] | cumulative |   package',
+    # nested imports are indented below the module importing them
+    import_seconds = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            import_seconds[name.strip()] = int(cumulative) / 10 ** 6
+    return sum(import_seconds.values()), import_seconds
+
+@contextmanager
+def serve(handler_class):
+    """Serve requests with handler_class on a free local port in a
+    background thread
+
+    Yields:
+        url (str): base url of the server, e.g. 'http://127.0.0.1:8000'
+    """
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield f'http://{host}:{port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def benchmark_fetch(workers=(1, 2, 4, 8), rate=50, num_requests=100,
+                    latency=0.1, error_every=5):
+    """Fetch from a local server that answers after latency seconds and
+    rate limits (429) or fails (503) some requests, with fetch.get and
+    fetch.fetch_all as stage 02 does - check the requests per second rise
+    with the number of workers until the rate limit and never exceed it
+
+    Args:
+        workers (tuple): numbers of workers (requests in flight) to try
+        rate (float): requests per second allowed by the token bucket
+        num_requests (int): number of keys fetched per run
+        latency (float): seconds the server takes to answer
+        error_every (int):
+            every error_every-th request is answered with a 429 (with a
+            Retry-After of 0) or, alternately, a 503 and retried
+
+    Returns:
+        results (list): dict of workers, seconds and requests per second per run
+    """
+
+    received = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with lock:
+                received.append(time.monotonic())
+                count = len(received)
+            time.sleep(latency)
+
+            headers = {}
+            if count % error_every == 0:
+                status = 429 if count % (2 * error_every) == 0 else 503
+                if status == 429:
+                    headers['Retry-After'] = '0'
+            else:
+                status = 200
+            body = b'{}'
+            self.send_response(status)
+            for header, value in headers.items():
+                self.send_header(header, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    results = []
+    with serve(Handler) as url:
+        for max_workers in workers:
+            session = fetch.create_session(pool_size=max_workers)
+            rate_limiter = fetch.TokenBucket(rate)
+            received.clear()
+
+            def get(key):
+                return fetch.get(
+                    url, session, rate_limiter, backoff=0.01, params={'key': key}
+                ).status_code
+
+            def fetch_every_key():
+                return list(fetch.fetch_all(
+                    range(num_requests), get, max_workers=max_workers
+                ))
+
+            seconds, fetched = time_call(fetch_every_key)
+            session.close()
+            failed = [
+                (key, status, error) for key, status, error in fetched
+                if status != 200 or error is not None
+            ]
+            check(not failed, f'{len(failed)} keys failed, e.g. {failed[:3]}')
+            check(
+                len(received) > num_requests,
+                f'{len(received)} requests for {num_requests} keys, the '
+                f'429 and 503 responses were not retried'
+            )
+
+            # most requests started in any one second - the token bucket
+            # allows a burst of one on top of the rate
+            times = np.array(received)
+            in_window = np.searchsorted(times, times + 1) - np.arange(len(times))
+            result = {
+                'workers': max_workers,
+                'requests': len(received),
+                'seconds': seconds,
+                'requests_per_second': len(received) / seconds,
+                'most_in_one_second': int(in_window.max())
+            }
+            check(
+                len(received) <= rate * seconds + 1,
+                f'{len(received)} requests in {seconds:.2f}s exceed the rate '
+                f'of {rate} per second'
+            )
+            check(
+                result['most_in_one_second'] <= rate + 2,
+                f'{result["most_in_one_second"]} requests in one second '
+                f'exceed the rate of {rate} per second'
+            )
+            results.append(result)
+            print(result)
+
+    # each worker waits latency seconds per request, so throughput rises
+    # with the workers until the rate limit caps it
+    for previous, result in zip(results, results[1:]):
+        expected_ratio = (
+            min(result['workers'] / latency, rate)
+            / min(previous['workers'] / latency, rate)
+        )
+        min_ratio = 1.2 if expected_ratio >= 1.5 else 0.8
+        check(
+            result['requests_per_second']
+            > min_ratio * previous['requests_per_second'],
+            f'{result["workers"]} workers sent '
+            f'{result["requests_per_second"]:.1f} requests per second, '
+            f'{previous["workers"]} workers '
+            f'{previous["requests_per_second"]:.1f}'
+        )
+    return results
+
+def benchmark_wikidata_modes(fixtures_dir=WIKIDATA_FIXTURES_DIR, languages=('en', 'fr')):
+    """Run stage 02 in api and html mode against a local server answering
+    with the fixtures - a wbgetentities response and the entity pages - and
+    check both modes write the same wikidata.json: a missing entity is left
+    out, a redirected qid gets the entry it redirects to and an entity
+    without a label or description in the first language falls back to the
+    next one. Then rerun the api mode with a cache and --incremental in
+    the reversed languages, and check neither reuses the entries of the
+    other languages
+
+    Args:
+        fixtures_dir (str):
+            directory with wbgetentities.json and html/<qid>.html
+        languages (tuple): language codes in order of preference
+
+    Returns:
+        results (dict): seconds and requests taken by each mode
+    """
+
+    languages = tuple(languages)
+    with open(os.path.join(fixtures_dir, 'wbgetentities.json'), encoding='utf-8') as f:
+        entities = json.load(f)['entities']
+    # entities are keyed by the qid requested, a redirected qid's entity has
+    # the id of the entity it redirects to
+    redirects = {
+        qid: entity['redirects']['to']
+        for qid, entity in entities.items() if 'redirects' in entity
+    }
+    requests_received = []
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            requests_received.append(self.path)
+            path, _, query = self.path.partition('?')
+            if path == '/w/api.php':
+                params = dict(urllib.parse.parse_qsl(query))
+                self.send_api_response(
+                    params['ids'].split('|'), params['languages'].split('|')
+                )
+            elif path.startswith('/wiki/'):
+                self.send_page(path[len('/wiki/'):])
+            else:
+                self.send_body(404, b'', 'text/plain')
+
+        def send_api_response(self, qids, languages):
+            # entities in the requested languages, as wbgetentities
+            # filters them
+            response = {}
+            for qid in qids:
+                entity = dict(entities.get(qid, {'id': qid, 'missing': ''}))
+                for terms in ['labels', 'descriptions', 'aliases']:
+                    if terms in entity:
+                        entity[terms] = {
+                            language: value for language, value in entity[terms].items()
+                            if language in languages
+                        }
+                response[qid] = entity
+            body = json.dumps({'entities': response, 'success': 1}).encode()
+            self.send_body(200, body, 'application/json')
+
+        def send_page(self, qid):
+            page_file = os.path.join(fixtures_dir, 'html', f'{qid}.html')
+            if qid in redirects:
+                self.send_response(301)
+                self.send_header('Location', f'/wiki/{redirects[qid]}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            elif os.path.exists(page_file):
+                with open(page_file, 'rb') as f:
+                    self.send_body(200, f.read(), 'text/html; charset=UTF-8')
+            else:
+                self.send_body(404, b'', 'text/plain')
+
+        def send_body(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    scrape_wikidata = load_stage('scrape-wikidata')
+    qids = list(entities)
+    results = {}
+    wikidata = {}
+    with serve(Handler) as url, tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'preprocessed-osm-data.json.gz')
+        storage.write_frame(pd.DataFrame({'qid': qids}), input_file)
+        for mode in ['api', 'html']:
+            output_file = os.path.join(directory, f'wikidata-{mode}.json')
+            requests_received.clear()
+            seconds, _ = time_call(
+                scrape_wikidata.main, input_file, output_file, max_workers=2,
+                rate=100, base_url=url, mode=mode, languages=languages,
+                resume=False
+            )
+            wikidata[mode] = storage.read_frame(output_file)
+            results[f'{mode}_seconds'] = seconds
+            results[f'{mode}_requests'] = len(requests_received)
+
+        # cached and previous entries are only reused in the same mode and
+        # languages
+        missing_qids = [
+            qid for qid, entity in entities.items() if 'missing' in entity
+        ]
+        cache_file = os.path.join(directory, 'wikidata-cache.sqlite')
+        output_file = os.path.join(directory, 'wikidata-incremental.json')
+        reversed_languages = tuple(reversed(languages))
+        for run_languages in [languages, reversed_languages, reversed_languages]:
+            requests_received.clear()
+            scrape_wikidata.main(
+                input_file, output_file, max_workers=2, rate=100,
+                base_url=url, cache_file=cache_file, mode='api',
+                languages=run_languages, resume=False, incremental=True
+            )
+            requested_qids = {
+                qid for path in requests_received
+                for qid in dict(urllib.parse.parse_qsl(
+                    path.partition('?')[2]
+                ))['ids'].split('|')
+            }
+            # missing entities are never cached, so they are requested again
+            if run_languages in wikidata:
+                check(
+                    requested_qids <= set(missing_qids),
+                    f'rerunning languages {run_languages} requested '
+                    f'{sorted(requested_qids)}, the cache and output were '
+                    f'not reused'
+                )
+            else:
+                check(
+                    requested_qids == set(qids),
+                    f'languages {run_languages} only requested '
+                    f'{sorted(requested_qids)}, entries of other languages '
+                    f'were reused'
+                )
+            wikidata[run_languages] = storage.read_frame(output_file)
+
+    for key, frame in wikidata.items():
+        check(
+            list(frame.columns) == WIKIDATA_COLUMNS,
+            f'{key}: columns {list(frame.columns)}, expected {WIKIDATA_COLUMNS}'
+        )
+        check(
+            all(
+                isinstance(names, list)
+                and all(isinstance(name, str) for name in names)
+                for names in frame['names']
+            ),
+            f'{key}: names are not lists of strings'
+        )
+        check(
+            all(isinstance(description, str) for description in frame['description']),
+            f'{key}: descriptions are not strings'
+        )
+    check(
+        (wikidata['api'].dtypes == wikidata['html'].dtypes).all(),
+        'api and html mode wrote different dtypes'
+    )
+    check(
+        wikidata['api'].to_dict('records') == wikidata['html'].to_dict('records'),
+        'api and html mode wrote different entries'
+    )
+    check(
+        wikidata['api'].equals(wikidata[languages]),
+        'the cached run wrote different entries'
+    )
+
+    for run_languages in [languages, reversed_languages]:
+        entries = wikidata[run_languages].set_index('qid')
+        check(
+            not entries.index.isin(missing_qids).any(),
+            f'{run_languages}: missing entities were not left out'
+        )
+        for qid, target_qid in redirects.items():
+            check(
+                entries.loc[qid, 'names'] == entries.loc[target_qid, 'names'],
+                f'{run_languages}: {qid} did not get the entry of {target_qid}'
+            )
+        for qid, entity in entities.items():
+            if 'missing' in entity:
+                continue
+            label_language = next(
+                language for language in run_languages
+                if language in entity['labels']
+            )
+            label = entity['labels'][label_language]['value']
+            check(
+                entries.loc[qid, 'names'][0] == label,
+                f'{run_languages}: {qid} is named '
+                f'{entries.loc[qid, "names"][0]!r}, expected {label!r}'
+            )
+
+    results['entries'] = len(entries)
+    return results
+
+def benchmark_imports(scripts=STAGE_SCRIPTS, num_modules=5):
+    """Report the import (start up) time of each stage script and the
+    modules costing the most
+
+    Args:
+        scripts (list): python files
+        num_modules (int): number of most expensive modules listed per script
+
+    Returns:
+        results (dict): total seconds and the most expensive modules per script
+    """
+
+    results = {}
+    for script in scripts:
+        total_seconds, import_seconds = get_import_times(script)
+        slowest = sorted(import_seconds.items(), key=lambda item: -item[1])
+        results[script] = {
+            'total_seconds': total_seconds,
+            'slowest_imports': dict(slowest[:num_modules])
+        }
+        print(script, results[script])
+    return results
+
+def load_stage(name):
+    """Import the script of a pipeline stage by the stage's name"""
+
+    stage = next(stage for stage in pipeline.STAGES if stage.name == name)
+    return pipeline.load_stage_module(stage)
+
+def get_version():
+    """Get the git commit benchmarked (suffixed with -dirty if the tree has
+    uncommitted changes), None outside a git checkout
+    """
+
+    completed = subprocess.run(
+        ['git', 'describe', '--always', '--dirty'],
+        cwd=SCRIPT_DIR, capture_output=True, text=True
+    )
+    return completed.stdout.strip() if completed.returncode == 0 else None
+
+def filter_by_distance(analyze_and_visualize, osm_data, chain_qids, locations,
+                       radius_km):
+    """Find the restaurants within radius_km of each location like stage 05
+    does - identify the (chain) restaurants, index them and query the index
+
+    Returns:
+        indexes (list): positions of the restaurants near each location
+    """
+
+    restaurants = analyze_and_visualize.get_restaurants(osm_data, chain_qids)
+    spatial_index = spatial.build_spatial_index(restaurants[['lat', 'lon']].values)
+    return spatial.query_radius(spatial_index, locations, radius_km)
+
+def benchmark_suite(sizes=(10000, 100000), benchmarks=SUITE_BENCHMARKS,
+                    max_dense=2000, num_locations=200, radius_km=5, seed=0):
+    """Time each stage's main step on synthetic data of each size and trace
+    its peak memory use (traced python/numpy allocations)
+
+    Args:
+        sizes (tuple):
+            numbers of OSM entries - the Wikidata entries number a 20th of
+            them (see get_num_brands)
+
+        benchmarks (tuple): names of the SUITE_BENCHMARKS to run
+        max_dense (int):
+            largest number of Wikidata entries stage 04 clusters with its
+            default 'hierarchical' method - 'kmeans' is used past it
+
+        num_locations (int): number of locations distances are filtered for
+        radius_km (float): distance in km
+        seed (int): random seed
+
+    Returns:
+        results (list):
+            dict of benchmark, size, rows_in, rows_out, seconds and peak_mb
+            per run
+    """
+
+    preprocess_osm_data = load_stage('preprocess-osm-data')
+    analyze_and_visualize = load_stage('analyze-and-visualize')
+    if 'preprocess_text' in benchmarks:
+        preprocess_wikidata = load_stage('preprocess-wikidata')
+    if 'clustering' in benchmarks:
+        identify_chain_restaurants = load_stage('identify-chain-restaurants')
+
+    results = []
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        brands = make_brands(get_num_brands(size), seed)
+        amenities = make_amenities(size, brands, seed)
+        wikidata = brands[WIKIDATA_COLUMNS]
+        preprocessed_wikidata = brands[PREPROCESSED_WIKIDATA_COLUMNS]
+        osm_data = preprocess_osm_data.preprocess_osm_data(amenities.copy())
+        chain_qids = pd.DataFrame({
+            'qid': brands.loc[brands['amenity'].isin(['restaurant', 'fast_food']), 'qid'],
+            'is_chain_restaurant': 1
+        })
+        locations = np.column_stack([
+            rng.uniform(49.0, 49.4, num_locations),
+            rng.uniform(-123.3, -122.5, num_locations)
+        ])
+        method = 'hierarchical' if len(wikidata) <= max_dense else 'kmeans'
+
+        # benchmark - rows in, function and its arguments
+        calls = {
+            'tag_extraction': (
+                len(amenities), transform.get_tags_data,
+                amenities['tags'], ['brand:wikidata', 'cuisine']
+            ),
+            'preprocess_osm_data': (
+                len(amenities), preprocess_osm_data.preprocess_osm_data,
+                amenities.copy()
+            ),
+            'preprocess_text': (
+                len(wikidata), lambda: preprocess_wikidata.preprocess_wikidata(wikidata)
+            ),
+            'clustering': (
+                len(wikidata),
+                lambda: identify_chain_restaurants.identify_chain_restaurants(
+                    osm_data, wikidata, preprocessed_wikidata, method=method
+                )
+            ),
+            'ngram_counts': (
+                len(preprocessed_wikidata), transform.get_ngram_counts,
+                preprocessed_wikidata['preprocessed_description'], 10, (1, 2)
+            ),
+            'distance_filtering': (
+                len(osm_data), filter_by_distance, analyze_and_visualize,
+                osm_data, chain_qids, locations, radius_km
+            )
+        }
+        for benchmark in benchmarks:
+            rows_in, function, *args = calls[benchmark]
+            seconds, peak_mb, output = trace_call(function, *args)
+            if benchmark == 'distance_filtering':
+                rows_out = sum(len(indexes) for indexes in output)
+            else:
+                rows_out = len(output)
+            results.append({
+                'benchmark': benchmark, 'size': size, 'rows_in': rows_in,
+                'rows_out': rows_out, 'seconds': seconds, 'peak_mb': peak_mb
+            })
+            if benchmark == 'clustering':
+                results[-1]['method'] = method
+            print(results[-1])
+    return results
+
+def write_results(results, output_file):
+    """Write benchmark results as JSON, with the version of the code and of
+    the main libraries, so runs of different versions can be compared
+
+    Args:
+        results (list): output of benchmark_suite
+        output_file (str): JSON file
+
+    Returns:
+        None
+    """
+
+    import scipy
+    import sklearn
+
+    report = {
+        'version': get_version(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'libraries': {
+            'numpy': np.__version__, 'pandas': pd.__version__,
+            'scipy': scipy.__version__, 'sklearn': sklearn.__version__
+        },
+        'results': results
+    }
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+def compare_results(results, previous_file):
+    """Compare benchmark results against those of an earlier run
+
+    Args:
+        results (list): output of benchmark_suite
+        previous_file (str): JSON file written by write_results
+
+    Returns:
+        comparisons (list):
+            dict of benchmark, size and the ratios of seconds and peak_mb
+            to the earlier run's, for the runs both have
+    """
+
+    with open(previous_file) as f:
+        previous = json.load(f)
+    previous_results = {
+        (result['benchmark'], result['size']): result for result in previous['results']
+    }
+
+    comparisons = []
+    for result in results:
+        key = (result['benchmark'], result['size'])
+        if key not in previous_results:
+            continue
+        comparisons.append({
+            'benchmark': result['benchmark'],
+            'size': result['size'],
+            'seconds_ratio': result['seconds'] / previous_results[key]['seconds'],
+            'peak_mb_ratio': result['peak_mb'] / previous_results[key]['peak_mb']
+        })
+        print(comparisons[-1])
+    return comparisons
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    tags_parser = subparsers.add_parser(
+        'tags', help='get_tag_data apply vs get_tags_data'
+    )
+    tags_parser.add_argument('--rows', type=int, default=10 ** 7)
+
+    keywords_parser = subparsers.add_parser(
+        'keywords',
+        help='get_match apply and str.contains per term vs get_term_matches'
+    )
+    keywords_parser.add_argument('--rows', type=int, default=10 ** 6)
+    keywords_parser.add_argument(
+        '--terms', nargs='+', default=['word1', 'word2', 'word3 word4']
+    )
+
+    ngrams_parser = subparsers.add_parser(
+        'ngrams', help='dense vs sparse vs streaming n-gram counts'
+    )
+    ngrams_parser.add_argument('--rows', type=int, default=10 ** 5)
+    ngrams_parser.add_argument('--ngrams', type=int, default=1000)
+
+    io_parser = subparsers.add_parser(
+        'io', help='json vs parquet vs feather intermediate files'
+    )
+    io_parser.add_argument('--rows', type=int, default=10 ** 6)
+
+    clustering_parser = subparsers.add_parser(
+        'clustering', help='hierarchical vs kmeans vs graph clustering'
+    )
+    clustering_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 50000, 200000]
+    )
+    clustering_parser.add_argument(
+        '--methods', nargs='+', default=list(cluster.CLUSTERING_METHODS)
+    )
+    clustering_parser.add_argument('--max-dense', type=int, default=2000)
+
+    linkage_parser = subparsers.add_parser(
+        'linkage', help='condensed distances vs rows of similarities'
+    )
+    linkage_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 2000, 4000, 20000]
+    )
+    linkage_parser.add_argument('--max-similarities', type=int, default=4000)
+
+    amenities_parser = subparsers.add_parser(
+        'amenities', help='non restaurant list scan vs categorical lookup'
+    )
+    amenities_parser.add_argument('--rows', type=int, default=10 ** 6)
+
+    qids_parser = subparsers.add_parser(
+        'qids', help='dict of ones / merge on qid vs Series.isin'
+    )
+    qids_parser.add_argument('--rows', type=int, default=10 ** 6)
+
+    names_parser = subparsers.add_parser(
+        'names', help='fuzzy name matching vs comparing every pair of names'
+    )
+    names_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000]
+    )
+    names_parser.add_argument('--threshold', type=float, default=0.8)
+    names_parser.add_argument('--max-dense', type=int, default=2000)
+
+    spatial_parser = subparsers.add_parser(
+        'spatial', help='haversine scan per location vs ball tree radius queries'
+    )
+    spatial_parser.add_argument('--rows', type=int, default=10 ** 5)
+    spatial_parser.add_argument('--locations', type=int, default=200)
+    spatial_parser.add_argument('--radius', type=float, default=5)
+
+    comparisons_parser = subparsers.add_parser(
+        'comparisons', help='batch location comparisons vs one scan per location'
+    )
+    comparisons_parser.add_argument('--rows', type=int, default=10 ** 5)
+    comparisons_parser.add_argument(
+        '--grid-size', type=int, nargs=2, default=[10, 10]
+    )
+    comparisons_parser.add_argument(
+        '--radii', type=float, nargs='+', default=[1, 2, 5]
+    )
+
+    maps_parser = subparsers.add_parser(
+        'maps', help='map.html size and build time per marker mode'
+    )
+    maps_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000]
+    )
+    maps_parser.add_argument(
+        '--modes', nargs='+', default=list(maps.MARKER_MODES)
+    )
+    maps_parser.add_argument('--max-circles', type=int, default=10000)
+
+    heat_maps_parser = subparsers.add_parser(
+        'heatmaps', help='heat_map.html size and build time, points vs grid'
+    )
+    heat_maps_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000]
+    )
+    heat_maps_parser.add_argument(
+        '--zooms', type=int, nargs='+', default=[11, 13, 15]
+    )
+
+    suite_parser = subparsers.add_parser(
+        'suite', help='time every stage on synthetic data, results written as JSON'
+    )
+    suite_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 100000]
+    )
+    suite_parser.add_argument(
+        '--benchmarks', nargs='+', choices=SUITE_BENCHMARKS,
+        default=list(SUITE_BENCHMARKS)
+    )
+    suite_parser.add_argument('--max-dense', type=int, default=2000)
+    suite_parser.add_argument('--output', default='benchmark-results.json')
+    suite_parser.add_argument(
+        '--compare', default=None,
+        help='results file of an earlier run to compare against'
+    )
+
+    generate_parser = subparsers.add_parser(
+        'generate', help='write synthetic amenities and Wikidata files'
+    )
+    generate_parser.add_argument('--rows', type=int, default=10 ** 5)
+    generate_parser.add_argument('--brands', type=int, default=None)
+    generate_parser.add_argument('--output-dir', default='synthetic-data')
+    generate_parser.add_argument('--seed', type=int, default=0)
+
+    fetch_parser = subparsers.add_parser(
+        'fetch', help='stage 02 requests per second against a local stub server'
+    )
+    fetch_parser.add_argument(
+        '--workers', type=int, nargs='+', default=[1, 2, 4, 8]
+    )
+    fetch_parser.add_argument('--rate', type=float, default=50)
+    fetch_parser.add_argument('--requests', type=int, default=100)
+    fetch_parser.add_argument('--latency', type=float, default=0.1)
+
+    wikidata_parser = subparsers.add_parser(
+        'wikidata', help='stage 02 api vs html mode against local fixtures'
+    )
+    wikidata_parser.add_argument('--fixtures', default=WIKIDATA_FIXTURES_DIR)
+    wikidata_parser.add_argument('--languages', nargs='+', default=['en', 'fr'])
+
+    imports_parser = subparsers.add_parser(
+        'imports', help='start up (import) time of each stage script'
+    )
+    imports_parser.add_argument('--scripts', nargs='+', default=STAGE_SCRIPTS)
+
+    args = parser.parse_args()
+    if args.benchmark == 'tags':
+        print(benchmark_tag_extraction(args.rows))
+    elif args.benchmark == 'keywords':
+        print(benchmark_keywords(args.rows, args.terms))
+    elif args.benchmark == 'ngrams':
+        print(benchmark_ngrams(args.rows, args.ngrams))
+    elif args.benchmark == 'io':
+        print(benchmark_io(args.rows))
+    elif args.benchmark == 'clustering':
+        benchmark_clustering(args.sizes, args.methods, args.max_dense)
+    elif args.benchmark == 'fetch':
+        benchmark_fetch(args.workers, args.rate, args.requests, args.latency)
+    elif args.benchmark == 'wikidata':
+        print(benchmark_wikidata_modes(args.fixtures, args.languages))
+    elif args.benchmark == 'imports':
+        benchmark_imports(args.scripts)
+    elif args.benchmark == 'linkage':
+        benchmark_linkage(args.sizes, args.max_similarities)
+    elif args.benchmark == 'amenities':
+        print(benchmark_amenities(args.rows))
+    elif args.benchmark == 'maps':
+        benchmark_maps(args.sizes, args.modes, args.max_circles)
+    elif args.benchmark == 'heatmaps':
+        benchmark_heat_maps(args.sizes, args.zooms)
+    elif args.benchmark == 'qids':
+        print(benchmark_qids(args.rows))
+    elif args.benchmark == 'names':
+        benchmark_names(args.sizes, args.threshold, args.max_dense)
+    elif args.benchmark == 'spatial':
+        print(benchmark_spatial(args.rows, args.locations, args.radius))
+    elif args.benchmark == 'comparisons':
+        print(benchmark_comparisons(args.rows, args.grid_size, args.radii))
+    elif args.benchmark == 'suite':
+        results = benchmark_suite(args.sizes, args.benchmarks, args.max_dense)
+        write_results(results, args.output)
+        if args.compare is not None:
+            compare_results(results, args.compare)
+    elif args.benchmark == 'generate':
+        print(write_synthetic_data(args.output_dir, args.rows, args.brands, args.seed))
@@ -0,0 +1,218 @@
+import json
+import sqlite3
+import time
+
+class WikidataCache:
+    """Persistent SQLite cache mapping qids to the names and description
+    extracted from their Wikidata entries - entries are keyed by qid, mode
+    and languages, so entries fetched in one language are never returned
+    for another
+
+    Args:
+        path (str):
+            SQLite database file, created if it does not exist
+
+        ttl (float):
+            seconds before an entry expires and has to be fetched again,
+            None to never expire entries
+
+        max_entries (int):
+            maximum number of entries kept - the least recently used entries
+            are evicted once the cache grows past it, None for no limit
+
+        mode (str):
+            how the entries were fetched ('api' or 'html')
+
+        languages (tuple):
+            language codes the entries were fetched in, in order of
+            preference
+
+    Attributes:
+        hits (int): number of lookups answered by the cache
+        misses (int): number of lookups that were missing or expired
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None, mode='api',
+                 languages=('en',)):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.mode = mode
+        self.languages = tuple(languages)
+        self.hits = 0
+        self.misses = 0
+        self._key = (mode, ','.join(self.languages))
+        self._connection = sqlite3.connect(path)
+
+        # caches written before entries were keyed by mode and languages do
+        # not say how their entries were fetched, so they are discarded
+        columns = [
+            row[1] for row in
+            self._connection.execute('PRAGMA table_info(wikidata)')
+        ]
+        if columns and 'languages' not in columns:
+            self._connection.execute('DROP TABLE wikidata')
+
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS wikidata ('
+            'qid TEXT, mode TEXT, languages TEXT, names TEXT, '
+            'description TEXT, fetched_at REAL, accessed_at REAL, '
+            'PRIMARY KEY (qid, mode, languages))'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS wikidata_accessed_at '
+            'ON wikidata (accessed_at)'
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM wikidata'
+        ).fetchone()[0]
+
+    def is_expired(self, fetched_at, now=None):
+        """Check whether an entry fetched at fetched_at has expired
+
+        Args:
+            fetched_at (float): unix timestamp of when the entry was fetched
+            now (float): current unix timestamp, defaults to time.time()
+
+        Returns:
+            expired (bool): True if the entry is older than the ttl
+        """
+
+        if self.ttl is None:
+            return False
+        now = time.time() if now is None else now
+        return now - fetched_at > self.ttl
+
+    def get(self, qid):
+        """Get the cached names and description for qid in the cache's mode
+        and languages
+
+        Args:
+            qid (str): Wikidata identifier
+
+        Returns:
+            entry (tuple or None):
+                (names, description, fetched_at) if qid is cached and has
+                not expired, else None
+        """
+
+        row = self._connection.execute(
+            'SELECT names, description, fetched_at FROM wikidata '
+            'WHERE qid = ? AND mode = ? AND languages = ?',
+            (qid, *self._key)
+        ).fetchone()
+
+        now = time.time()
+        if row is None or self.is_expired(row[2], now):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._touch(qid, now)
+        names, description, fetched_at = row
+        return json.loads(names), description, fetched_at
+
+    def is_fresh(self, qid):
+        """Check whether qid has a cached entry in the cache's mode and
+        languages that has not expired - an
+        entry reused from elsewhere (e.g. a previous output) is only up to
+        date while this holds. Marks the entry as used, so it is not the
+        first evicted, and does not count as a hit or miss
+
+        Args:
+            qid (str): Wikidata identifier
+
+        Returns:
+            fresh (bool):
+                True if qid has a valid entry, False if its entry expired,
+                was evicted or qid was never cached
+        """
+
+        row = self._connection.execute(
+            'SELECT fetched_at FROM wikidata '
+            'WHERE qid = ? AND mode = ? AND languages = ?',
+            (qid, *self._key)
+        ).fetchone()
+
+        now = time.time()
+        if row is None or self.is_expired(row[0], now):
+            return False
+        self._touch(qid, now)
+        return True
+
+    def _touch(self, qid, now):
+        """Mark the entry for qid as used at now"""
+
+        self._connection.execute(
+            'UPDATE wikidata SET accessed_at = ? '
+            'WHERE qid = ? AND mode = ? AND languages = ?',
+            (now, qid, *self._key)
+        )
+
+    def put(self, qid, names, description, fetched_at=None):
+        """Add or replace the cached names and description for qid in the
+        cache's mode and languages
+
+        Args:
+            qid (str): Wikidata identifier
+            names (list): names for the Wikidata entry
+            description (str): description for the Wikidata entry
+            fetched_at (float): unix timestamp, defaults to time.time()
+
+        Returns:
+            None
+        """
+
+        now = time.time()
+        fetched_at = now if fetched_at is None else fetched_at
+        self._connection.execute(
+            'INSERT OR REPLACE INTO wikidata VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (qid, *self._key, json.dumps(names), description, fetched_at, now)
+        )
+
+    def evict(self):
+        """Remove expired entries, then the least recently used entries
+        until the cache holds at most max_entries - of every mode and
+        language
+
+        Returns:
+            num_evicted (int): number of entries removed
+        """
+
+        num_evicted = 0
+        if self.ttl is not None:
+            num_evicted += self._connection.execute(
+                'DELETE FROM wikidata WHERE fetched_at < ?',
+                (time.time() - self.ttl,)
+            ).rowcount
+
+        if self.max_entries is not None:
+            num_evicted += self._connection.execute(
+                'DELETE FROM wikidata WHERE rowid IN ('
+                'SELECT rowid FROM wikidata ORDER BY accessed_at DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+
+        self._connection.commit()
+        return num_evicted
+
+    def commit(self):
+        """Write pending changes to disk"""
+
+        self._connection.commit()
+
+    def close(self):
+        """Evict old entries, write pending changes and close the database"""
+
+        self.evict()
+        self._connection.close()
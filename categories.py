@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# OSM amenities that are not restaurants - every other amenity is treated as
+# a restaurant (bar, cafe, fast_food, food_court, ice_cream, pub, ...)
+NON_RESTAURANT_AMENITIES = frozenset([
+    'ATLAS_clean_room', 'EVSE', 'Observation Platform', 'Pharmacy',
+    'animal_shelter', 'arts_centre', 'atm', 'atm;bank', 'bank', 'bench',
+    'bicycle_parking', 'bicycle_rental', 'bicycle_repair_station',
+    'boat_rental', 'bureau_de_change', 'bus_station', 'car_rental',
+    'car_rep', 'car_sharing', 'car_wash', 'casino', 'charging_station',
+    'childcare', 'chiropractor', 'cinema', 'clinic', 'clock', 'college',
+    'community_centre', 'compressed_air', 'conference_centre',
+    'construction', 'courthouse', 'cram_school', 'dentist', 'doctors',
+    'dojo', 'drinking_water', 'driving_school', 'events_venue',
+    'family_centre', 'ferry_terminal', 'fire_station', 'first_aid',
+    'fountain', 'fuel', 'gambling', 'gym', 'healthcare', 'hospital',
+    'housing co-op', 'hunting_stand', 'internet_cafe', 'kindergarten',
+    'language_school', 'leisure', 'letter_box', 'library', 'loading_dock',
+    'lobby', 'lounge', 'luggage_locker', 'marketplace', 'meditation_centre',
+    'monastery', 'money_transfer', 'motorcycle_parking',
+    'motorcycle_rental', 'music_school', 'nightclub', 'nursery',
+    'office|financial', 'park', 'parking', 'parking_entrance',
+    'parking_space', 'payment_terminal', 'pharmacy', 'photo_booth',
+    'place_of_worship', 'playground', 'police', 'post_box', 'post_depot',
+    'post_office', 'prep_school', 'public_bookcase', 'public_building',
+    'ranger_station', 'recycling', 'research_institute', 'safety',
+    'sanitary_dump_station', 'school', 'science', 'scrapyard',
+    'seaplane terminal', 'shelter', 'shop|clothes', 'shower', 'smoking_area',
+    'social_centre', 'social_facility', 'spa', 'storage', 'storage_rental',
+    'stripclub', 'studio', 'taxi', 'telephone', 'theatre', 'toilets',
+    'townhall', 'training', 'trash', 'trolley_bay', 'university',
+    'vacuum_cleaner', 'vending_machine', 'veterinary', 'waste_basket',
+    'waste_disposal', 'waste_transfer_station', 'water_point',
+    'watering_place', 'workshop'
+])
+
+def is_restaurant_amenity(amenity):
+    """Check whether an amenity is a restaurant amenity
+
+    Args:
+        amenity (str): OSM amenity
+
+    Returns:
+        is_restaurant (bool):
+            True unless amenity is missing or in NON_RESTAURANT_AMENITIES
+    """
+
+    return isinstance(amenity, str) and amenity not in NON_RESTAURANT_AMENITIES
+
+def get_restaurant_amenities(amenities):
+    """Get the distinct restaurant amenities among some amenities - the one
+    classification stage 05 (is_restaurant) and
+    transform.get_restaurant_amenities share
+
+    Args:
+        amenities (iterable): OSM amenities, may repeat or be missing
+
+    Returns:
+        restaurant_amenities (frozenset):
+            the amenities that are restaurant amenities (see
+            is_restaurant_amenity)
+    """
+
+    return frozenset(
+        amenity for amenity in set(amenities) if is_restaurant_amenity(amenity)
+    )
+
+def is_restaurant(amenities):
+    """Check which entries are restaurants - the amenities are converted to
+    a categorical, so each distinct amenity is classified once (see
+    get_restaurant_amenities) and the rows are then looked up by their
+    category codes
+
+    Args:
+        amenities (series): OSM amenities
+
+    Returns:
+        is_restaurant (series):
+            True where the amenity is a restaurant amenity - shares the
+            index of amenities
+    """
+
+    amenities = amenities.astype('category')
+    categories = amenities.cat.categories
+    restaurant_amenities = get_restaurant_amenities(categories)
+    is_restaurant_category = np.append(categories.isin(restaurant_amenities), False)
+    # missing amenities have the code -1, i.e. the trailing False
+    is_restaurant = is_restaurant_category[amenities.cat.codes.values]
+    return pd.Series(is_restaurant, index=amenities.index)
@@ -0,0 +1,342 @@
+import numpy as np
+
+from scipy import sparse
+from scipy.cluster.hierarchy import fcluster, linkage
+from sklearn.cluster import MiniBatchKMeans, SpectralClustering
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+# clustering methods accepted by get_clusters - 'hierarchical' needs all
+# n * (n - 1) / 2 distances and is only practical for tens of thousands of
+# descriptions
+CLUSTERING_METHODS = ('hierarchical', 'kmeans', 'graph')
+
+# what 'hierarchical' passes to scipy's linkage - rows of cosine similarities
+# as observations (the original analysis) or the condensed euclidean
+# distances between those rows, which give the same clusters
+LINKAGE_INPUTS = ('similarities', 'distances')
+
+def get_condensed_similarity_distances(document_term_matrix, block_size=512,
+                                       decimals=6, dtype=np.float32):
+    """Get the euclidean distances between every pair of rows of the cosine
+    similarity matrix (the distances linkage computes when given the rows of
+    similarities as observations) as a condensed distance vector (the format
+    returned by scipy's pdist) - computed a block of rows at a time from
+    products of the sparse normalized term counts, so the n x n similarity
+    matrix is never held in memory and time grows like n^2 instead of n^3
+
+    Cosine distances themselves are no use here - most pairs of short
+    descriptions share no words, so their cosine distance is exactly 1 and
+    every linkage merges the remaining clusters at the same height
+
+    Args:
+        document_term_matrix (sparse matrix): term counts, one row per document
+        block_size (int): number of rows compared at a time
+        decimals (int):
+            number of decimals the distances are rounded to - equal
+            distances then stay exactly equal whatever the order of the
+            sums, so ties in linkage are broken the same way
+
+        dtype (type):
+            dtype of the distances - scipy's linkage makes a float64 copy
+            of anything else while it runs
+
+    Returns:
+        distances (ndarray):
+            distances, pair (i, j) with i < j at index
+            n * i - i * (i + 1) / 2 + j - i - 1
+    """
+
+    matrix = normalize(document_term_matrix).tocsr()
+    matrix_t = matrix.T.tocsr()
+    num_documents = matrix.shape[0]
+    # squared norm of each row of similarities S = M M^T - the diagonal of
+    # S S^T = M (M^T M) M^T
+    squared_norms = np.asarray(
+        (matrix @ (matrix_t @ matrix)).multiply(matrix).sum(axis=1)
+    ).ravel()
+    distances = np.empty(num_documents * (num_documents - 1) // 2, dtype=dtype)
+
+    position = 0
+    for start in range(0, num_documents, block_size):
+        end = min(start + block_size, num_documents)
+        # dot products of the block's rows of similarities with every later
+        # row, (M_block M^T) M M_later^T
+        block_similarities = (matrix[start:end] @ matrix_t).toarray()
+        dot_products = (matrix[start:] @ (matrix_t @ block_similarities.T)).T
+        for i in range(start, end):
+            row = dot_products[i - start, i - start + 1:]
+            # |s_i - s_j|^2, clipped since rounding can make equal rows negative
+            squared = squared_norms[i] + squared_norms[i + 1:] - 2 * row
+            np.maximum(squared, 0, out=squared)
+            distances[position:position + len(row)] = np.round(
+                np.sqrt(squared), decimals
+            )
+            position += len(row)
+    return distances
+
+def cluster_hierarchical(document_term_matrix, num_clusters=3,
+                         linkage_method='complete', linkage_input='similarities'):
+    """Cluster documents by hierarchical clustering of their rows of cosine
+    similarities
+
+    Args:
+        document_term_matrix (sparse matrix): term counts, one row per document
+        num_clusters (int): maximum number of clusters
+        linkage_method (str): scipy linkage method
+        linkage_input (str):
+            'similarities' clusters the rows of the dense n x n cosine
+            similarity matrix as observations (the original approach -
+            O(n^3) time), 'distances' clusters the condensed distances
+            between those rows (see get_condensed_similarity_distances,
+            O(n^2) time and a float32 vector of n * (n - 1) / 2 distances)
+            - both give the same clusters
+
+    Returns:
+        clusters (ndarray): cluster (1 to num_clusters) of each document
+
+    Raises:
+        ValueError:
+            the documents end up in a single cluster although more were
+            asked for - the top merges of the tree are tied, so the tree
+            cannot be cut into num_clusters clusters
+    """
+
+    if linkage_input == 'similarities':
+        cosine_similarities = cosine_similarity(document_term_matrix)
+        Z = linkage(cosine_similarities, method=linkage_method)
+    elif linkage_input == 'distances':
+        distances = get_condensed_similarity_distances(document_term_matrix)
+        Z = linkage(distances, method=linkage_method)
+    else:
+        raise ValueError(
+            f'Unknown linkage input {linkage_input!r}, expected one of '
+            f'{LINKAGE_INPUTS}'
+        )
+    clusters = fcluster(Z, t=num_clusters, criterion='maxclust')
+    if num_clusters > 1 and len(clusters) > 1 and clusters.max() == 1:
+        raise ValueError(
+            f'{linkage_method} linkage put all {len(clusters)} documents in a '
+            f'single cluster - the top {num_clusters - 1} merges are tied at '
+            f'distance {Z[-1, 2]:g}'
+        )
+    return clusters
+
+def cluster_kmeans(document_term_matrix, num_clusters=3, batch_size=4096,
+                   random_state=0):
+    """Cluster documents with mini-batch k-means on their L2 normalized term
+    counts (so euclidean distances order documents like cosine distances) -
+    works on the sparse matrix directly, memory grows linearly with the
+    number of documents
+
+    Args:
+        document_term_matrix (sparse matrix): term counts, one row per document
+        num_clusters (int): number of clusters
+        batch_size (int): number of documents per mini-batch
+        random_state (int): seed for the initial centroids and batches
+
+    Returns:
+        clusters (ndarray): cluster (1 to num_clusters) of each document
+    """
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=num_clusters,
+        batch_size=batch_size,
+        n_init=3,
+        random_state=random_state
+    )
+    labels = kmeans.fit_predict(normalize(document_term_matrix))
+    # start at 1 like fcluster
+    return labels + 1
+
+def get_top_neighbors(rows, cols, similarities, num_documents, num_neighbors):
+    """Keep the num_neighbors most similar distinct neighbours of each
+    document out of a list of (row, col, similarity) candidates
+
+    Returns:
+        rows, cols, similarities (tuple): arrays of the kept candidates
+    """
+
+    # drop duplicate pairs found by several trees
+    _, unique_indexes = np.unique(rows * num_documents + cols, return_index=True)
+    rows = rows[unique_indexes]
+    cols = cols[unique_indexes]
+    similarities = similarities[unique_indexes]
+
+    # rank the candidates of each row by decreasing similarity
+    order = np.lexsort((-similarities, rows))
+    rows = rows[order]
+    row_starts = np.searchsorted(rows, rows)
+    is_top = (np.arange(len(rows)) - row_starts) < num_neighbors
+    return rows[is_top], cols[order][is_top], similarities[order][is_top]
+
+def get_neighbors_graph(document_term_matrix, num_neighbors=10, num_trees=8,
+                        leaf_size=64, block_size=1 << 18, random_state=0):
+    """Get an approximate k nearest neighbour (cosine similarity) graph with a
+    random projection forest - each tree recursively splits the documents
+    at the median of a random projection until at most leaf_size remain,
+    and only documents sharing a leaf are compared, so time grows like
+    n log(n) and memory like n * num_neighbors instead of n^2
+
+    Args:
+        document_term_matrix (sparse matrix): term counts, one row per document
+        num_neighbors (int): number of neighbours of each document
+        num_trees (int): number of trees - more trees find more true neighbours
+        leaf_size (int): maximum number of documents compared at a time
+        block_size (int): approximate number of candidate pairs compared at a time
+        random_state (int): seed for the random projections
+
+    Returns:
+        graph (sparse matrix):
+            n x n connectivity matrix with num_neighbors ones per row (fewer
+            for tiny inputs)
+    """
+
+    matrix = normalize(document_term_matrix).astype(np.float32).tocsr()
+    num_documents, num_terms = matrix.shape
+    depth = max(0, int(np.ceil(np.log2(num_documents / leaf_size))))
+    rng = np.random.default_rng(random_state)
+
+    rows = np.empty(0, dtype=np.int64)
+    cols = np.empty(0, dtype=np.int64)
+    similarities = np.empty(0, dtype=np.float32)
+    for _ in range(num_trees):
+        # one random direction per level of the tree
+        directions = rng.standard_normal((num_terms, depth), dtype=np.float32)
+        projections = matrix @ directions
+
+        leaves = [np.arange(num_documents)]
+        for level in range(depth):
+            split_leaves = []
+            for leaf in leaves:
+                if len(leaf) <= leaf_size:
+                    split_leaves.append(leaf)
+                    continue
+                order = np.argsort(projections[leaf, level], kind='stable')
+                half = len(leaf) // 2
+                split_leaves.extend([leaf[order[:half]], leaf[order[half:]]])
+            leaves = split_leaves
+
+        tree_rows = [rows]
+        tree_cols = [cols]
+        tree_similarities = [similarities]
+        for leaf in leaves:
+            k = min(num_neighbors, len(leaf) - 1)
+            if k <= 0:
+                continue
+            leaf_matrix = matrix[leaf]
+            leaf_similarities = (leaf_matrix @ leaf_matrix.T).toarray()
+            np.fill_diagonal(leaf_similarities, -np.inf)
+            top = np.argpartition(-leaf_similarities, k - 1, axis=1)[:, :k]
+            tree_rows.append(np.repeat(leaf, k))
+            tree_cols.append(leaf[top].ravel())
+            tree_similarities.append(
+                np.take_along_axis(leaf_similarities, top, axis=1).ravel()
+            )
+
+        rows, cols, similarities = get_top_neighbors(
+            np.concatenate(tree_rows),
+            np.concatenate(tree_cols),
+            np.concatenate(tree_similarities),
+            num_documents,
+            num_neighbors
+        )
+
+    # one round of nn-descent style refinement - the neighbours of a
+    # document's neighbours are likely to be its neighbours too - done a
+    # block of documents at a time to bound memory
+    graph = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)),
+        shape=(num_documents, num_documents)
+    )
+    block_rows = max(1, block_size // (num_neighbors * num_neighbors))
+    refined = []
+    for start in range(0, num_documents, block_rows):
+        candidates = (graph[start:start + block_rows] @ graph).tocoo()
+        candidate_rows = candidates.row.astype(np.int64) + start
+        candidate_cols = candidates.col.astype(np.int64)
+        is_other = candidate_rows != candidate_cols
+        candidate_rows = candidate_rows[is_other]
+        candidate_cols = candidate_cols[is_other]
+        candidate_similarities = np.asarray(
+            matrix[candidate_rows].multiply(matrix[candidate_cols]).sum(axis=1),
+            dtype=np.float32
+        ).ravel()
+
+        is_block = (rows >= start) & (rows < start + block_rows)
+        refined.append(get_top_neighbors(
+            np.concatenate([rows[is_block], candidate_rows]),
+            np.concatenate([cols[is_block], candidate_cols]),
+            np.concatenate([similarities[is_block], candidate_similarities]),
+            num_documents,
+            num_neighbors
+        ))
+    rows, cols, similarities = (np.concatenate(arrays) for arrays in zip(*refined))
+
+    graph = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)),
+        shape=(num_documents, num_documents)
+    )
+    return graph
+
+def cluster_graph(document_term_matrix, num_clusters=3, num_neighbors=10,
+                  random_state=0):
+    """Cluster documents by spectral clustering of their approximate k nearest
+    neighbour (cosine similarity) graph - only the sparse graph is held in
+    memory
+
+    Args:
+        document_term_matrix (sparse matrix): term counts, one row per document
+        num_clusters (int): number of clusters
+        num_neighbors (int): number of neighbours of each document
+        random_state (int): seed for the eigensolver and label assignment
+
+    Returns:
+        clusters (ndarray): cluster (1 to num_clusters) of each document
+    """
+
+    graph = get_neighbors_graph(
+        document_term_matrix, num_neighbors, random_state=random_state
+    )
+    # the graph is symmetrized and the eigenvectors of its laplacian found
+    # with lobpcg, which scales to large sparse graphs (unlike arpack's
+    # shift-invert mode)
+    spectral = SpectralClustering(
+        n_clusters=num_clusters,
+        affinity='precomputed',
+        eigen_solver='lobpcg',
+        assign_labels='cluster_qr',
+        random_state=random_state
+    )
+    graph = 0.5 * (graph + graph.T)
+    labels = spectral.fit_predict(graph)
+    return np.asarray(labels) + 1
+
+def get_clusters(document_term_matrix, num_clusters=3, method='hierarchical',
+                 linkage_method='complete', linkage_input='similarities'):
+    """Cluster documents with one of CLUSTERING_METHODS
+
+    Args:
+        document_term_matrix (sparse matrix): term counts, one row per document
+        num_clusters (int): (maximum) number of clusters
+        method (str): 'hierarchical', 'kmeans' or 'graph'
+        linkage_method (str): scipy linkage method ('hierarchical' only)
+        linkage_input (str):
+            'similarities' or 'distances' ('hierarchical' only, see
+            cluster_hierarchical)
+
+    Returns:
+        clusters (ndarray): cluster (1 to num_clusters) of each document
+    """
+
+    if method == 'hierarchical':
+        return cluster_hierarchical(
+            document_term_matrix, num_clusters, linkage_method, linkage_input
+        )
+    if method == 'kmeans':
+        return cluster_kmeans(document_term_matrix, num_clusters)
+    if method == 'graph':
+        return cluster_graph(document_term_matrix, num_clusters)
+    raise ValueError(
+        f'Unknown clustering method {method!r}, expected one of {CLUSTERING_METHODS}'
+    )
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from scipy.stats import chi2
+
+from spatial import build_spatial_index, count_within_radius
+
+# columns of a location pairs CSV
+LOCATION_PAIR_COLUMNS = ['lat1', 'lon1', 'lat2', 'lon2']
+
+def read_location_pairs(path):
+    """Read the locations to compare from a CSV with lat1, lon1, lat2 and
+    lon2 columns (any other columns are ignored)
+
+    Args:
+        path (str): CSV file
+
+    Returns:
+        location_pairs (dataframe): one row per pair of locations
+    """
+
+    location_pairs = pd.read_csv(path, usecols=LOCATION_PAIR_COLUMNS)
+    return location_pairs[LOCATION_PAIR_COLUMNS].astype(float)
+
+def get_grid_pairs(lat_min, lon_min, lat_max, lon_max, num_lats, num_lons):
+    """Get every pair of locations of a num_lats x num_lons grid
+
+    Args:
+        lat_min, lon_min, lat_max, lon_max (float): corners of the grid
+        num_lats (int): number of latitudes
+        num_lons (int): number of longitudes
+
+    Returns:
+        location_pairs (dataframe):
+            lat1, lon1, lat2 and lon2 of the n * (n - 1) / 2 pairs of the
+            n = num_lats * num_lons grid locations
+
+    Example:
+        get_grid_pairs(49.2, -123.2, 49.3, -123.0, 3, 3) returns the 36
+        pairs of 9 locations
+    """
+
+    lats, lons = np.meshgrid(
+        np.linspace(lat_min, lat_max, num_lats),
+        np.linspace(lon_min, lon_max, num_lons),
+        indexing='ij'
+    )
+    locations = np.column_stack([lats.ravel(), lons.ravel()])
+    first, second = np.triu_indices(len(locations), k=1)
+    location_pairs = pd.DataFrame(
+        np.hstack([locations[first], locations[second]]),
+        columns=LOCATION_PAIR_COLUMNS
+    )
+    return location_pairs
+
+def get_chi2_p_values(contingency_tables):
+    """Get the chi-squared p-values of many 2 x 2 contingency tables at once -
+    the same as chi2_contingency(table)[1] for each table (with Yates'
+    correction), without a python call per table
+
+    Args:
+        contingency_tables (ndarray): m x 2 x 2 counts
+
+    Returns:
+        p_values (ndarray):
+            p-value of each table, NaN where a row or column is all zeros
+            (chi2_contingency raises a ValueError for these tables)
+    """
+
+    observed = np.asarray(contingency_tables, dtype=np.float64)
+    row_sums = observed.sum(axis=2, keepdims=True)
+    col_sums = observed.sum(axis=1, keepdims=True)
+    totals = observed.sum(axis=(1, 2), keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = row_sums * col_sums / totals
+
+        # Yates' correction - move each count up to 0.5 towards its expected
+        # count
+        diff = expected - observed
+        observed = observed + np.minimum(0.5, np.abs(diff)) * np.sign(diff)
+
+        statistics = ((observed - expected) ** 2 / expected).sum(axis=(1, 2))
+    p_values = chi2.sf(statistics, 1)
+    p_values[(expected == 0).any(axis=(1, 2))] = np.nan
+    return p_values
+
+def count_restaurants(spatial_index, locations, radius_km):
+    """Count the restaurants closer than radius_km to each location - a
+    spatial_index of None stands for no restaurants
+    """
+
+    if spatial_index is None:
+        return np.zeros(len(locations), dtype=np.int64)
+    return count_within_radius(spatial_index, locations, radius_km)
+
+def compare_locations(restaurants, location_pairs, radii):
+    """Compare the density of chain restaurants near each pair of locations
+    for each radius - the restaurants near each distinct location are
+    counted once per radius with ball tree queries, then every pair's
+    chi-squared p-value is computed at once
+
+    Args:
+        restaurants (dataframe):
+            lat, lon and is_chain_restaurant (0/1) of each restaurant
+
+        location_pairs (dataframe): lat1, lon1, lat2 and lon2 of each pair
+        radii (list): distances in km
+
+    Returns:
+        results (dataframe):
+            the columns of location_pairs, dist and the number of non chain
+            and chain restaurants within dist of each location (nonchain1,
+            chain1, nonchain2, chain2) and the chi-squared p-value, one row
+            per pair and radius
+    """
+
+    locations = np.vstack([
+        location_pairs[['lat1', 'lon1']].values,
+        location_pairs[['lat2', 'lon2']].values
+    ])
+    unique_locations, inverse = np.unique(locations, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    num_pairs = len(location_pairs)
+
+    is_chain_restaurant = (restaurants.is_chain_restaurant == 1).values
+    points = restaurants[['lat', 'lon']].values
+    chain_index, nonchain_index = (
+        build_spatial_index(points[mask]) if mask.any() else None
+        for mask in (is_chain_restaurant, ~is_chain_restaurant)
+    )
+
+    results = []
+    for dist in radii:
+        chain_counts = count_restaurants(chain_index, unique_locations, dist)[inverse]
+        nonchain_counts = count_restaurants(nonchain_index, unique_locations, dist)[inverse]
+
+        contingency_tables = np.stack([
+            np.column_stack([nonchain_counts[:num_pairs], chain_counts[:num_pairs]]),
+            np.column_stack([nonchain_counts[num_pairs:], chain_counts[num_pairs:]])
+        ], axis=1)
+        dist_results = location_pairs[LOCATION_PAIR_COLUMNS].reset_index(drop=True)
+        dist_results['dist'] = dist
+        dist_results['nonchain1'] = contingency_tables[:, 0, 0]
+        dist_results['chain1'] = contingency_tables[:, 0, 1]
+        dist_results['nonchain2'] = contingency_tables[:, 1, 0]
+        dist_results['chain2'] = contingency_tables[:, 1, 1]
+        dist_results['p_value'] = get_chi2_p_values(contingency_tables)
+        results.append(dist_results)
+
+    results = pd.concat(results, ignore_index=True)
+    return results
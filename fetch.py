@@ -0,0 +1,170 @@
+import itertools
+import random
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+# status codes worth retrying - rate limited or a temporary server error
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+class TokenBucket:
+    """Thread-safe token bucket used to cap the number of requests per second
+
+    Args:
+        rate (float):
+            number of tokens added per second - the sustained request rate
+
+        capacity (float):
+            maximum number of tokens that can be saved up - the largest burst
+            of requests allowed, defaults to 1 (no bursts)
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+
+            # sleep outside of the lock so other threads can refill/check
+            time.sleep(delay)
+
+def create_session(pool_size=10):
+    """Create a requests session whose connection pool can be shared by
+    pool_size threads
+
+    Args:
+        pool_size (int): number of connections kept alive per host
+
+    Returns:
+        session (requests.Session): session with a pooled HTTP(S) adapter
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_retry_delay(response, attempt, backoff):
+    """Get the number of seconds to wait before retrying a request - uses the
+    Retry-After header when the server sends one, else exponential backoff
+    with jitter
+
+    Args:
+        response (requests.models.Response or None):
+            response that failed, None if the request raised an exception
+
+        attempt (int): number of attempts made so far, starting at 0
+        backoff (float): base delay in seconds
+
+    Returns:
+        delay (float): seconds to wait
+    """
+
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return float(retry_after)
+    delay = backoff * (2 ** attempt)
+    return delay + random.uniform(0, delay / 2)
+
+def get(url, session, rate_limiter=None, max_retries=5, backoff=1, **kwargs):
+    """Send a GET request, retrying with exponential backoff on 429/5xx
+    responses and connection errors
+
+    Args:
+        url (str): url to request
+        session (requests.Session): shared session
+        rate_limiter (TokenBucket): limits requests per second, optional
+        max_retries (int): number of retries before giving up
+        backoff (float): base delay in seconds between retries
+        **kwargs: passed on to session.get (params, timeout, etc)
+
+    Returns:
+        response (requests.models.Response): successful response
+
+    Raises:
+        requests.exceptions.HTTPError:
+            non-retryable status code or retries exhausted
+
+        requests.exceptions.ConnectionError / Timeout: retries exhausted
+    """
+
+    kwargs.setdefault('timeout', 30)
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        response = None
+        try:
+            response = session.get(url, **kwargs)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.HTTPError:
+            if response.status_code not in RETRY_STATUS_CODES:
+                raise
+            if attempt == max_retries:
+                raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == max_retries:
+                raise
+
+        time.sleep(get_retry_delay(response, attempt, backoff))
+
+def fetch_all(keys, fetch, max_workers=8):
+    """Call fetch on every key using a bounded thread pool - at most
+    2 * max_workers keys are queued at a time so finished results do not
+    pile up in memory
+
+    Args:
+        keys (iterable): keys to fetch, e.g. qids
+        fetch (callable): takes a key and returns its result
+        max_workers (int): maximum number of requests in flight
+
+    Yields:
+        key, result, error (tuple):
+            result of fetch(key) in order of completion - error is the
+            exception raised by fetch (result is None), else None
+    """
+
+    keys = iter(keys)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for key in itertools.islice(keys, 2 * max_workers):
+            pending[executor.submit(fetch, key)] = key
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, e
+                yield key, result, error
+
+            for key in itertools.islice(keys, len(done)):
+                pending[executor.submit(fetch, key)] = key
@@ -0,0 +1,256 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from functools import wraps
+
+# where spans are recorded - set by configure, spans are not measured while
+# metrics_file is None
+CONFIG = {
+    'metrics_file': None,
+    'profile_file': None,
+    'trace_memory': True,
+    'run': None
+}
+
+# spans entered and not yet exited, outermost first - spans are meant to be
+# opened by the main thread only
+OPEN_SPANS = []
+
+class Span:
+    """A named, timed part of a run - rows_in and rows_out can be set while
+    the span is open
+    """
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.path = name
+        self.started = None
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self.profiler = None
+
+def configure(metrics_file=None, profile_file=None, trace_memory=True, run=None):
+    """Turn instrumentation on (or off, with metrics_file None)
+
+    Args:
+        metrics_file (str):
+            json-lines file a record is appended to as each span ends, None
+            to not measure spans
+
+        profile_file (str):
+            file the cProfile stats of the outermost span are dumped to
+            (read them with pstats or snakeviz), None to not profile
+
+        trace_memory (bool):
+            trace allocations with tracemalloc to report each span's peak
+            memory - python and numpy allocations slow down while traced
+
+        run (str): identifier of the run in the metrics, None for a new one
+
+    Returns:
+        run (str): identifier of the run
+    """
+
+    if run is None:
+        run = f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}'
+    CONFIG.update({
+        'metrics_file': metrics_file,
+        'profile_file': profile_file,
+        'trace_memory': trace_memory and metrics_file is not None,
+        'run': run
+    })
+    if CONFIG['trace_memory'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return run
+
+def add_arguments(parser):
+    """Add the --metrics, --profile and --no-trace-memory options of
+    configure to an argparse parser
+    """
+
+    parser.add_argument(
+        '--metrics', default=None, metavar='FILE',
+        help='append timings, peak memory and row counts of each step to a '
+             'json-lines file'
+    )
+    parser.add_argument(
+        '--profile', default=None, metavar='FILE',
+        help='dump cProfile stats of the whole run to a file'
+    )
+    parser.add_argument(
+        '--no-trace-memory', action='store_false', dest='trace_memory',
+        help='do not trace peak memory (faster) with --metrics'
+    )
+
+def configure_from_args(args):
+    """Configure instrumentation from the options of add_arguments"""
+
+    return configure(args.metrics, args.profile, args.trace_memory)
+
+def count_rows(value):
+    """Get the number of rows of a dataframe, series, array or list - None
+    for anything else (or None)
+    """
+
+    if value is None or isinstance(value, (str, bytes, dict)):
+        return None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+def update_peak(span):
+    """Fold the peak traced memory since the last reset into a span's peak
+    and start a new peak
+    """
+
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    span.peak_bytes = max(span.peak_bytes, peak_bytes)
+    tracemalloc.reset_peak()
+
+def write_record(span, seconds):
+    """Append the record of a span that ended to the metrics file"""
+
+    record = {
+        'run': CONFIG['run'],
+        'span': span.path,
+        'name': span.name,
+        'depth': len(OPEN_SPANS),
+        'started': round(span.started, 6),
+        'seconds': seconds,
+        'peak_mb': (
+            (span.peak_bytes - span.start_bytes) / 2 ** 20
+            if CONFIG['trace_memory'] else None
+        ),
+        'rows_in': span.rows_in,
+        'rows_out': span.rows_out,
+        'pid': os.getpid()
+    }
+    with open(CONFIG['metrics_file'], 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+@contextmanager
+def span(name, rows_in=None):
+    """Measure a part of a run - its wall time, the peak traced memory above
+    the memory in use when it started, and its rows in and out. Spans nest,
+    a span's path is the names of the spans it is in joined by '/'
+
+    Args:
+        name (str): name of the span, e.g. 'read' or 'linkage'
+        rows_in (int): number of rows the span processes
+
+    Yields:
+        span (Span): set span.rows_out to record the rows produced
+
+    Example:
+        with instrument.span('read') as read_span:
+            osm_data = pd.read_json(input_file, lines=True)
+            read_span.rows_out = len(osm_data)
+    """
+
+    current = Span(name, rows_in)
+    if CONFIG['metrics_file'] is None:
+        yield current
+        return
+
+    if OPEN_SPANS:
+        parent = OPEN_SPANS[-1]
+        current.path = f'{parent.path}/{name}'
+        if CONFIG['trace_memory']:
+            update_peak(parent)
+    elif CONFIG['profile_file'] is not None:
+        current.profiler = cProfile.Profile()
+
+    if CONFIG['trace_memory']:
+        current.start_bytes, _ = tracemalloc.get_traced_memory()
+        current.peak_bytes = current.start_bytes
+    OPEN_SPANS.append(current)
+    current.started = time.time()
+    start = time.perf_counter()
+    if current.profiler is not None:
+        current.profiler.enable()
+    try:
+        yield current
+    finally:
+        if current.profiler is not None:
+            current.profiler.disable()
+            current.profiler.dump_stats(CONFIG['profile_file'])
+        seconds = time.perf_counter() - start
+        OPEN_SPANS.pop()
+        if CONFIG['trace_memory']:
+            update_peak(current)
+            if OPEN_SPANS:
+                OPEN_SPANS[-1].peak_bytes = max(
+                    OPEN_SPANS[-1].peak_bytes, current.peak_bytes
+                )
+        write_record(current, seconds)
+
+def traced(function):
+    """Decorate a function so each call is a span named after it - rows in
+    are counted from its first argument and rows out from its result (see
+    count_rows)
+    """
+
+    @wraps(function)
+    def traced_function(*args, **kwargs):
+        if CONFIG['metrics_file'] is None:
+            return function(*args, **kwargs)
+        with span(function.__name__, count_rows(args[0]) if args else None) as current:
+            result = function(*args, **kwargs)
+            current.rows_out = count_rows(result)
+        return result
+    return traced_function
+
+def read_metrics(metrics_file, run=None):
+    """Read the records of one run from a metrics file
+
+    Args:
+        metrics_file (str): json-lines file written by the spans
+        run (str): identifier of the run, None for the last run in the file
+
+    Returns:
+        metrics (dataframe): one row per span, in the order they started
+    """
+
+    import pandas as pd
+
+    metrics = pd.read_json(metrics_file, lines=True, dtype={'run': str})
+    if run is None:
+        run = metrics['run'].iloc[-1]
+    metrics = metrics[metrics['run'] == run]
+    return metrics.sort_values('started', kind='stable').reset_index(drop=True)
+
+def summarize_metrics(metrics):
+    """Sum the records of each span path - spans run several times (e.g. per
+    chunk) are summed, peak memory is the largest of their peaks
+
+    Args:
+        metrics (dataframe): output of read_metrics
+
+    Returns:
+        summary (dataframe):
+            span, calls, seconds, share (of the time of the outermost spans),
+            peak_mb, rows_in and rows_out per span path, in the order the
+            paths first started
+    """
+
+    summary = metrics.groupby('span', sort=False).agg(
+        calls=('seconds', 'size'),
+        seconds=('seconds', 'sum'),
+        peak_mb=('peak_mb', 'max'),
+        rows_in=('rows_in', 'sum'),
+        rows_out=('rows_out', 'sum')
+    ).reset_index()
+    total_seconds = metrics.loc[metrics['depth'] == 0, 'seconds'].sum()
+    summary.insert(3, 'share', summary['seconds'] / total_seconds)
+    # spans without row counts show as missing rather than 0
+    for column in ['rows_in', 'rows_out']:
+        has_rows = metrics.groupby('span', sort=False)[column].count().values > 0
+        summary[column] = summary[column].astype('Int64').where(has_rows)
+    return summary
@@ -0,0 +1,250 @@
+import branca.colormap
+import folium
+import numpy as np
+
+from folium.plugins import FastMarkerCluster, HeatMap
+
+# how the restaurants are drawn on map.html - 'circles' adds a circle marker
+# per restaurant (the original map, slow in the browser past a few thousand
+# restaurants), 'cluster' clusters the restaurants in the browser from a
+# single array of coordinates and 'grid' only draws the cells of a grid
+# holding restaurants
+MARKER_MODES = ('circles', 'cluster', 'grid')
+
+# how the restaurants are drawn on heat_map.html - 'points' sends every
+# restaurant to the browser (the original heat map), 'grid' only sends the
+# number of restaurants in each cell of a grid, with separate layers for
+# chain and non chain restaurants
+HEAT_MAP_MODES = ('points', 'grid')
+
+# width of a 'grid' heat map cell in screen pixels at the zoom level the
+# resolution is chosen for - leaflet.heat itself sums the points into cells
+# of half its 25 pixel radius before drawing, so at that zoom level nothing
+# is lost
+HEAT_MAP_CELL_PIXELS = 12
+
+# draws each [lat, lon, is_chain_restaurant] row of a cluster layer like the
+# circle markers - blue for chain restaurants, red for the others
+CIRCLE_MARKER_CALLBACK = """function (row) {
+    var isChain = row[2] == 1;
+    return L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: isChain ? 8 : 2,
+        color: isChain ? 'blue' : 'red',
+        fill: true
+    });
+}"""
+
+def get_grid_counts(points, cell_size, weights=None):
+    """Count the points in each cell of a lat/lon grid covering them
+
+    Args:
+        points (ndarray): n x 2 latitudes and longitudes in degrees
+        cell_size (float): width and height of a cell in degrees
+        weights (ndarray): weight of each point, None for counts
+
+    Returns:
+        counts, lat_edges, lon_edges (tuple):
+            (number of lats) x (number of lons) summed weights and the
+            edges of the cells
+    """
+
+    # cells are aligned on multiples of cell_size, the last one holds the
+    # largest lat/lon
+    mins = np.floor(points.min(axis=0) / cell_size) * cell_size
+    num_cells = np.floor((points.max(axis=0) - mins) / cell_size).astype(int) + 1
+    lat_edges, lon_edges = (
+        start + np.arange(num + 1) * cell_size for start, num in zip(mins, num_cells)
+    )
+    counts, lat_edges, lon_edges = np.histogram2d(
+        points[:, 0], points[:, 1], bins=[lat_edges, lon_edges], weights=weights
+    )
+    return counts, lat_edges, lon_edges
+
+def add_circle_markers(m, points, is_chain_restaurant):
+    """Add a circle marker per restaurant to a map"""
+
+    chain_restaurant = points[is_chain_restaurant]
+    non_chain_restaurant = points[~is_chain_restaurant]
+
+    # blue for chain restaurants
+    for i in range(len(chain_restaurant)):
+        folium.CircleMarker(chain_restaurant[i], radius=8, color='blue', fill=True).add_to(m)
+
+    # red for non chain restaurants
+    for i in range(len(non_chain_restaurant)):
+        folium.CircleMarker(non_chain_restaurant[i], radius=2, color='red', s=25, fill=True).add_to(m)
+
+def add_marker_cluster(m, points, is_chain_restaurant, decimals=6):
+    """Add the restaurants to a map as one marker cluster layer - the
+    coordinates are written once as a single array (rounded to decimals,
+    about 0.1 m) and the markers created and clustered by the browser
+    """
+
+    data = np.column_stack([
+        np.round(points, decimals), is_chain_restaurant.astype(int)
+    ]).tolist()
+    FastMarkerCluster(data, callback=CIRCLE_MARKER_CALLBACK).add_to(m)
+
+def add_grid_cells(m, points, is_chain_restaurant, cell_size=0.005):
+    """Add the cells of a grid holding restaurants to a map as one GeoJSON
+    layer - each cell is coloured by its share of chain restaurants (red
+    for none, blue for all) and shows its counts when hovered over
+
+    Args:
+        m (folium.Map): map
+        points (ndarray): n x 2 latitudes and longitudes of the restaurants
+        is_chain_restaurant (ndarray): True for chain restaurants
+        cell_size (float): width and height of a cell in degrees
+    """
+
+    if len(points) == 0:
+        return
+
+    counts, lat_edges, lon_edges = get_grid_counts(points, cell_size)
+    chain_counts, _, _ = get_grid_counts(
+        points, cell_size, weights=is_chain_restaurant.astype(float)
+    )
+    # edges like 49.245000000000005 would otherwise be written out in full
+    lat_edges = np.round(lat_edges, 6).tolist()
+    lon_edges = np.round(lon_edges, 6).tolist()
+    colormap = branca.colormap.LinearColormap(['red', 'blue'], vmin=0, vmax=1)
+
+    features = []
+    for i, j in zip(*np.nonzero(counts)):
+        lat0, lat1 = lat_edges[i], lat_edges[i + 1]
+        lon0, lon1 = lon_edges[j], lon_edges[j + 1]
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Polygon',
+                'coordinates': [[
+                    [lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1], [lon0, lat0]
+                ]]
+            },
+            'properties': {
+                'restaurants': int(counts[i, j]),
+                'chain_restaurants': int(chain_counts[i, j]),
+                'color': colormap(chain_counts[i, j] / counts[i, j])
+            }
+        })
+
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        style_function=lambda feature: {
+            'color': feature['properties']['color'],
+            'fillColor': feature['properties']['color'],
+            'weight': 1,
+            'fillOpacity': 0.5
+        },
+        tooltip=folium.GeoJsonTooltip(['restaurants', 'chain_restaurants'])
+    ).add_to(m)
+
+def get_cell_size(zoom, pixels=HEAT_MAP_CELL_PIXELS):
+    """Get the size in degrees of a cell covering a number of screen pixels
+    at a zoom level - a 256 pixel map tile spans 360 / 2^zoom degrees of
+    longitude
+
+    Args:
+        zoom (int): leaflet zoom level (0 to 18)
+        pixels (int): width of a cell in pixels
+
+    Returns:
+        cell_size (float): width and height of a cell in degrees
+    """
+
+    return 360 / (256 * 2 ** zoom) * pixels
+
+def get_heat_map_data(points, cell_size, weights=None):
+    """Aggregate points into grid cells for a heat map
+
+    Args:
+        points (ndarray): n x 2 latitudes and longitudes in degrees
+        cell_size (float): width and height of a cell in degrees
+        weights (ndarray): weight of each point, None for counts
+
+    Returns:
+        data (list):
+            [lat, lon, weight] of the center of each cell holding points,
+            the weight being the cell's number of points (or summed weights)
+    """
+
+    if len(points) == 0:
+        return []
+
+    counts, lat_edges, lon_edges = get_grid_counts(points, cell_size, weights)
+    lat_indexes, lon_indexes = np.nonzero(counts)
+    lats = np.round((lat_edges[lat_indexes] + lat_edges[lat_indexes + 1]) / 2, 6)
+    lons = np.round((lon_edges[lon_indexes] + lon_edges[lon_indexes + 1]) / 2, 6)
+    cell_weights = counts[lat_indexes, lon_indexes]
+    if weights is None:
+        # written as 3 rather than 3.0
+        cell_weights = cell_weights.astype(int)
+    data = [
+        [lat, lon, weight]
+        for lat, lon, weight in zip(lats.tolist(), lons.tolist(), cell_weights.tolist())
+    ]
+    return data
+
+def add_heat_map(m, points, is_chain_restaurant, heat_map_mode='points', zoom=13):
+    """Add a heat map of restaurants to a map in one of HEAT_MAP_MODES
+
+    Args:
+        m (folium.Map): map
+        points (ndarray): n x 2 latitudes and longitudes of the restaurants
+        is_chain_restaurant (ndarray): True for chain restaurants
+        heat_map_mode (str):
+            'points' or 'grid' - the size of a 'grid' heat map only depends
+            on the area covered and the resolution, not on the number of
+            restaurants
+
+        zoom (int):
+            zoom level whose resolution the 'grid' cells have (see
+            get_cell_size) - higher levels give finer, more numerous cells
+
+    Returns:
+        None
+    """
+
+    if heat_map_mode == 'points':
+        HeatMap(points).add_to(m)
+    elif heat_map_mode == 'grid':
+        cell_size = get_cell_size(zoom)
+        layers = [
+            ('Restaurants', points, True),
+            ('Chain restaurants', points[is_chain_restaurant], False),
+            ('Non chain restaurants', points[~is_chain_restaurant], False)
+        ]
+        for name, layer_points, show in layers:
+            data = get_heat_map_data(layer_points, cell_size)
+            if len(data) > 0:
+                HeatMap(data, name=name, show=show).add_to(m)
+        folium.LayerControl().add_to(m)
+    else:
+        raise ValueError(
+            f'Unknown heat map mode {heat_map_mode!r}, expected one of '
+            f'{HEAT_MAP_MODES}'
+        )
+
+def add_restaurant_markers(m, points, is_chain_restaurant, marker_mode='circles'):
+    """Add restaurants to a map in one of MARKER_MODES
+
+    Args:
+        m (folium.Map): map
+        points (ndarray): n x 2 latitudes and longitudes of the restaurants
+        is_chain_restaurant (ndarray): True for chain restaurants
+        marker_mode (str): 'circles', 'cluster' or 'grid'
+
+    Returns:
+        None
+    """
+
+    if marker_mode == 'circles':
+        add_circle_markers(m, points, is_chain_restaurant)
+    elif marker_mode == 'cluster':
+        add_marker_cluster(m, points, is_chain_restaurant)
+    elif marker_mode == 'grid':
+        add_grid_cells(m, points, is_chain_restaurant)
+    else:
+        raise ValueError(
+            f'Unknown marker mode {marker_mode!r}, expected one of {MARKER_MODES}'
+        )
@@ -0,0 +1,243 @@
+import ast
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+def hash_file(path, block_size=1 << 20):
+    """Get the sha256 hex digest of a file's content
+
+    Args:
+        path (str): file to hash
+        block_size (int): number of bytes read at a time
+
+    Returns:
+        digest (str): sha256 hex digest
+    """
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def hash_value(value):
+    """Get the sha256 hex digest of a json serializable value (parameters,
+    lists of digests, etc) - dict keys are sorted first
+
+    Args:
+        value: json serializable value
+
+    Returns:
+        digest (str): sha256 hex digest
+    """
+
+    text = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def get_local_imports(path, search_dir):
+    """Get the local modules (files in search_dir) imported by a script,
+    including the modules they import in turn
+
+    Args:
+        path (str): python file
+        search_dir (str): directory the local modules live in
+
+    Returns:
+        module_paths (list): sorted paths of the local modules
+    """
+
+    module_paths = set()
+    to_visit = [path]
+    while to_visit:
+        with open(to_visit.pop(), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+
+            for name in names:
+                module_path = os.path.join(search_dir, name.split('.')[0] + '.py')
+                if os.path.exists(module_path) and module_path not in module_paths:
+                    module_paths.add(module_path)
+                    to_visit.append(module_path)
+
+    return sorted(module_paths)
+
+def get_code_hash(script, search_dir):
+    """Get a digest of a script and every local module it imports, so
+    editing any of them changes the digest
+
+    Args:
+        script (str): python file
+        search_dir (str): directory the local modules live in
+
+    Returns:
+        digest (str): sha256 hex digest
+    """
+
+    paths = [script] + get_local_imports(script, search_dir)
+    return hash_value([hash_file(path) for path in paths])
+
+def hash_pickled(data):
+    """Get the sha256 hex digest of a pickled stage output"""
+
+    return hashlib.sha256(data).hexdigest()
+
+def hash_output(value):
+    """Get the digest of a stage output that is not cached - the same
+    digest StageCache.put gives the output
+
+    Args:
+        value: picklable stage output
+
+    Returns:
+        digest (str): sha256 hex digest of the pickled output
+    """
+
+    return hash_pickled(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+class StageCache:
+    """Directory of pickled stage outputs keyed by a digest of the stage's
+    code, inputs and parameters - least recently used entries are evicted
+    once the directory grows past max_bytes
+
+    Args:
+        cache_dir (str): directory holding the cached outputs
+        max_bytes (int): maximum total size of the cached outputs
+
+    Attributes:
+        hits (int): number of lookups answered by the cache
+        misses (int): number of lookups that were not cached
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def __contains__(self, key):
+        return os.path.exists(self.get_path(key))
+
+    def get(self, key):
+        """Get the outputs cached under key
+
+        Args:
+            key (str): digest from get_stage_key
+
+        Returns:
+            outputs, digests (tuple):
+                cached outputs and the digests of their content, (None, None)
+                if key is not cached
+        """
+
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None, None
+
+        # the modification time doubles as the last access time for eviction
+        os.utime(path)
+        self.hits += 1
+        outputs = {
+            name: pickle.loads(data) for name, data in entry['outputs'].items()
+        }
+        return outputs, entry['digests']
+
+    def put(self, key, outputs):
+        """Cache the outputs of a stage under key, then evict the least
+        recently used entries if the cache is too large
+
+        Args:
+            key (str): digest from get_stage_key
+            outputs (dict): picklable outputs of the stage
+
+        Returns:
+            digests (dict):
+                contains (output name, digest of its pickled content) key
+                value pairs - lets later stages reuse their cached outputs
+                when a rerun produces the same content
+        """
+
+        pickled_outputs = {
+            name: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            for name, value in outputs.items()
+        }
+        digests = {
+            name: hash_pickled(data) for name, data in pickled_outputs.items()
+        }
+
+        # write to a temporary file first so an interrupted write never
+        # leaves a truncated entry behind
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(
+                {'outputs': pickled_outputs, 'digests': digests},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temp_path, self.get_path(key))
+        self.evict()
+        return digests
+
+    def evict(self):
+        """Remove the least recently used entries until the cache holds at
+        most max_bytes
+
+        Returns:
+            num_evicted (int): number of entries removed
+        """
+
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.pkl'):
+                path = os.path.join(self.cache_dir, file_name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        num_evicted = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+            num_evicted += 1
+        return num_evicted
+
+def get_stage_key(stage_name, code_hash, input_keys, params):
+    """Get the digest identifying a stage run
+
+    Args:
+        stage_name (str): name of the stage
+        code_hash (str): digest from get_code_hash
+        input_keys (dict): contains (input name, digest) key value pairs
+        params (dict): parameters the stage's outputs depend on
+
+    Returns:
+        key (str): sha256 hex digest
+    """
+
+    return hash_value({
+        'stage': stage_name,
+        'code': code_hash,
+        'inputs': input_keys,
+        'params': params
+    })
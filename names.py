@@ -0,0 +1,103 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# characters dropped inside words, so "McDonald's" and "McDonalds" get the
+# same key
+APOSTROPHES = re.compile(r"['‘’ʼ`]")
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+def normalize_name(name):
+    """Get the key a name is matched by - lowercase ascii letters and digits
+    separated by single spaces
+
+    Args:
+        name (str): OSM name
+
+    Returns:
+        key (str): normalized name
+
+    Example:
+        normalize_name("Caffè Artigiano") -> 'caffe artigiano'
+        normalize_name("McDonald's") -> 'mcdonalds'
+    """
+
+    key = unicodedata.normalize('NFKD', name)
+    key = key.encode('ascii', 'ignore').decode('ascii').lower()
+    key = APOSTROPHES.sub('', key)
+    key = NON_ALPHANUMERIC.sub(' ', key).strip()
+    return key
+
+def get_fuzzy_matches(names, name_qid, threshold=0.8, ngram_range=(3, 3),
+                      block_size=1024):
+    """Propose qids for names that are not keys of name_qid by matching them
+    to the most similar known name - names are compared by the cosine
+    similarity of the TF-IDF weighted character n-grams of their normalized
+    keys, and only the nonzero products of the sparse vectors are computed
+    (a block of names at a time), so time grows about linearly with the
+    number of names rather than with every pair
+
+    Args:
+        names (iterable): names to find qids for (duplicates and missing
+            names are ignored)
+
+        name_qid (dict): contains (name, qid) key value pairs of known names
+        threshold (float):
+            smallest similarity (0 to 1) of a match - 1 only matches names
+            with the same normalized key
+
+        ngram_range (tuple): smallest and largest n-gram lengths
+        block_size (int): number of names compared at a time
+
+    Returns:
+        matches (dataframe):
+            name, matched_name (known name with the most similar key), qid
+            and similarity of each matched name
+    """
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    columns = ['name', 'matched_name', 'qid', 'similarity']
+    names = pd.Series(pd.unique(pd.Series(list(names), dtype=object).dropna()))
+    names = names[~names.isin(name_qid.keys())].reset_index(drop=True)
+    if len(names) == 0 or len(name_qid) == 0:
+        return pd.DataFrame(columns=columns)
+
+    # known names with the same key share a vector - later names win, like
+    # in name_qid
+    known = pd.DataFrame({'name': list(name_qid.keys()), 'qid': list(name_qid.values())})
+    known['key'] = known['name'].map(normalize_name)
+    known = known.drop_duplicates('key', keep='last').reset_index(drop=True)
+    keys = names.map(normalize_name)
+
+    # the vocabulary includes the n-grams of the names being matched, so
+    # n-grams no known name has still lower their similarity
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=ngram_range)
+    vectorizer.fit(pd.concat([known['key'], keys], ignore_index=True))
+    known_matrix = vectorizer.transform(known['key']).T.tocsr()
+    matrix = vectorizer.transform(keys)
+
+    best_indexes = np.zeros(len(names), dtype=np.int64)
+    best_similarities = np.zeros(len(names))
+    for start in range(0, len(names), block_size):
+        similarities = (matrix[start:start + block_size] @ known_matrix).tocsr()
+        best_indexes[start:start + block_size] = np.asarray(
+            similarities.argmax(axis=1)
+        ).ravel()
+        best_similarities[start:start + block_size] = (
+            similarities.max(axis=1).toarray().ravel()
+        )
+
+    # identical keys can come out a rounding error below 1
+    best_similarities = np.minimum(np.round(best_similarities, 6), 1)
+    is_match = (best_similarities >= threshold) & (keys.str.len() > 0).values
+    matched = known.iloc[best_indexes[is_match]]
+    matches = pd.DataFrame({
+        'name': names[is_match].values,
+        'matched_name': matched['name'].values,
+        'qid': matched['qid'].values,
+        'similarity': best_similarities[is_match]
+    }, columns=columns)
+    return matches
@@ -0,0 +1,180 @@
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# nltk resources used and their paths for nltk.data.find
+NLTK_RESOURCES = {'stopwords': 'corpora/stopwords', 'wordnet': 'corpora/wordnet'}
+
+# maximum number of distinct tokens whose lemma is remembered - names and
+# descriptions reuse a small vocabulary ('restaurant', 'chain', 'coffee')
+LEMMA_CACHE_SIZE = 1 << 16
+
+@lru_cache(maxsize=None)
+def ensure_nltk_resource(name):
+    """Make sure an nltk resource is installed - it is looked up on disk
+    first and only downloaded if it is missing, once per process
+
+    Args:
+        name (str): key of NLTK_RESOURCES
+
+    Returns:
+        None
+    """
+
+    import nltk
+
+    try:
+        nltk.data.find(NLTK_RESOURCES[name])
+    except LookupError:
+        if not nltk.download(name, quiet=True):
+            raise LookupError(
+                f'nltk resource {name!r} is not installed and could not be '
+                f'downloaded - install it with python -m nltk.downloader {name}'
+            )
+
+@lru_cache(maxsize=None)
+def get_stopwords():
+    """Get the english nltk stopwords, loaded the first time they are used
+
+    Returns:
+        stopwords (frozenset):
+            stopwords - checking whether a token is one does not scan a list
+    """
+
+    ensure_nltk_resource('stopwords')
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    """Get a WordNet lemmatizer - WordNet itself is read the first time a
+    word is lemmatized
+
+    Returns:
+        lemmatizer (WordNetLemmatizer): nltk lemmatizer
+    """
+
+    ensure_nltk_resource('wordnet')
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
+
+def remove_stopwords(tokens):
+    """Remove words that do not contain any additional information
+    (nltk stopwords) from a list of words
+
+    Args:
+        tokens (list): list of words which may contain stopwords
+
+    Returns:
+        filtered_tokens (list): list of words without stopwords
+    """
+
+    stopwords = get_stopwords()
+    filtered_tokens = [token for token in tokens if token not in stopwords]
+    return filtered_tokens
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_token(token):
+    """Reduce a word to its base, remembering the LEMMA_CACHE_SIZE most
+    recently used words
+
+    Args:
+        token (str): word
+
+    Returns:
+        lemma (str): lemmatized word
+    """
+
+    return get_lemmatizer().lemmatize(token)
+
+def lemmatize_tokens(tokens):
+    """Reduce words to their base (lemmatization) - the base words should
+    be actual words
+
+    Args:
+        tokens (list): words
+
+    Returns:
+        lemmatized_tokens (list): lemmatized words
+    """
+
+    lemmatized_tokens = [lemmatize_token(token) for token in tokens]
+    return lemmatized_tokens
+
+def preprocess_text(text):
+    """Preprocess text by tokenizing it, converting it to lowercase,
+    removing punctuation along with stopwords and lemmatizing it
+
+    Args:
+        text (str): wikidata names or descriptions
+
+    Returns:
+        preprocessed_tokens (list):
+            tokens that have been converted to lowercase, lemmatized and
+            have had punctuation/stopwords removed
+
+    Example:
+        Calling preprocess_text with the description for Pizza Factory
+        (Q39054369):
+        'chain of pizza restaurants' -> ['chain', 'pizza', 'restaurant']
+    """
+
+    # gensim is slow to import, so it is only imported once there is text
+    from gensim.utils import simple_preprocess
+
+    preprocessed_tokens = simple_preprocess(text)
+    preprocessed_tokens = remove_stopwords(preprocessed_tokens)
+    preprocessed_tokens = lemmatize_tokens(preprocessed_tokens)
+    return preprocessed_tokens
+
+def preprocess_text_batch(texts):
+    """Preprocess a list of texts, joining the tokens of each with spaces
+
+    Args:
+        texts (list): wikidata names or descriptions
+
+    Returns:
+        preprocessed_texts (list): space separated preprocessed tokens
+    """
+
+    preprocessed_texts = [' '.join(preprocess_text(text)) for text in texts]
+    return preprocessed_texts
+
+def preprocess_texts(texts, workers=1, batch_size=10000):
+    """Preprocess a column of texts - each distinct text is preprocessed
+    once, and with workers > 1 batches of distinct texts are spread over a
+    pool of processes (worth it for very large corpora only)
+
+    Args:
+        texts (series): wikidata names or descriptions
+        workers (int): number of processes
+        batch_size (int): number of distinct texts sent to a process at a time
+
+    Returns:
+        preprocessed_texts (series):
+            space separated preprocessed tokens, the same as
+            texts.apply(preprocess_text).apply(' '.join) - shares the index
+            of texts
+    """
+
+    unique_texts = list(dict.fromkeys(texts.tolist()))
+    if workers > 1 and len(unique_texts) > batch_size:
+        batches = [
+            unique_texts[start:start + batch_size]
+            for start in range(0, len(unique_texts), batch_size)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            preprocessed_batches = list(executor.map(preprocess_text_batch, batches))
+        unique_preprocessed_texts = [
+            text for batch in preprocessed_batches for text in batch
+        ]
+    else:
+        unique_preprocessed_texts = preprocess_text_batch(unique_texts)
+
+    preprocessed = dict(zip(unique_texts, unique_preprocessed_texts))
+    preprocessed_texts = pd.Series(
+        [preprocessed[text] for text in texts.tolist()],
+        index=texts.index
+    )
+    return preprocessed_texts
@@ -0,0 +1,759 @@
+import argparse
+import importlib.util
+import json
+import os
+
+from collections import namedtuple
+
+import pandas as pd
+
+import instrument
+import memo
+
+from storage import read_frame, write_frame
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# path - default file of the artifact
+# load - function reading the file, None for files only written by a stage
+Artifact = namedtuple('Artifact', ['path', 'load'])
+
+# script - file defining the stage, imported only if the stage runs
+# inputs/outputs - names of the artifacts the stage reads/produces
+# run - function calling the stage with its inputs, returns its outputs
+# params - function getting the options the stage's outputs depend on
+# cached - whether the stage's outputs are kept in the stage cache - stage 02
+#          has its own SQLite cache of entries, and its outputs depend on
+#          the network (a failed scrape leaves entries out), so it is not
+Stage = namedtuple(
+    'Stage', ['name', 'script', 'inputs', 'outputs', 'run', 'params', 'cached'],
+    defaults=[True]
+)
+
+def read_amenities(path):
+    """Read the raw OSM amenities (json lines)"""
+
+    return pd.read_json(path, lines=True)
+
+ARTIFACTS = {
+    'amenities': Artifact('data/amenities-vancouver.json.gz', read_amenities),
+    'osm_data': Artifact('data/preprocessed-osm-data.json.gz', read_frame),
+    'wikidata': Artifact('data/wikidata.json', read_frame),
+    'preprocessed_wikidata': Artifact(
+        'data/preprocessed-wikidata.json', read_frame
+    ),
+    'chain_restaurant_qids': Artifact(
+        'data/chain-restaurant-qids.json', read_frame
+    ),
+    'map': Artifact('map.html', None),
+    'heat_map': Artifact('heat_map.html', None)
+}
+
+def run_preprocess_osm_data(module, inputs, options):
+    osm_data = module.preprocess_osm_data(
+        inputs['amenities'], **get_preprocess_osm_data_params(options)
+    )
+    return {'osm_data': osm_data}
+
+def run_scrape_wikidata(module, inputs, options):
+    output_file = options.paths['wikidata']
+
+    # the same defaults as running 02-scrape-wikidata.py on output_file
+    cache_file = options.wikidata_cache
+    if options.no_wikidata_cache:
+        cache_file = None
+    elif cache_file is None:
+        cache_file = module.get_default_cache_file(output_file)
+
+    languages = tuple(options.languages.split(','))
+    previous_wikidata = None
+    if options.incremental:
+        previous_wikidata = module.read_previous_wikidata(
+            output_file, options.scrape_mode, languages
+        )
+
+    partial_file = module.get_partial_file(output_file)
+    wikidata = module.get_wikidata(
+        inputs['osm_data'], partial_file, previous_wikidata,
+        options.scrape_workers, options.scrape_rate, options.wikidata_url,
+        cache_file, options.wikidata_cache_ttl * 24 * 60 * 60,
+        options.wikidata_cache_size, options.scrape_mode, languages,
+        not options.restart_scrape
+    )
+    # stage 02 is not cached, so its output is written right after it runs
+    module.write_source(
+        output_file, module.get_source(options.scrape_mode, languages)
+    )
+    module.remove_partial_file(partial_file)
+    return {'wikidata': wikidata}
+
+def run_preprocess_wikidata(module, inputs, options):
+    preprocessed_wikidata = module.preprocess_wikidata(inputs['wikidata'])
+    return {'preprocessed_wikidata': preprocessed_wikidata}
+
+def run_identify_chain_restaurants(module, inputs, options):
+    chain_restaurant_qids = module.identify_chain_restaurants(
+        inputs['osm_data'],
+        inputs['wikidata'],
+        inputs['preprocessed_wikidata'],
+        **get_identify_chain_restaurants_params(options)
+    )
+    return {'chain_restaurant_qids': chain_restaurant_qids}
+
+def run_analyze_and_visualize(module, inputs, options):
+    # writes map.html and heat_map.html itself
+    module.analyze_and_visualize(
+        inputs['osm_data'],
+        inputs['chain_restaurant_qids'],
+        **get_analyze_and_visualize_params(options)
+    )
+    return {}
+
+def get_no_params(options):
+    return {}
+
+def get_preprocess_osm_data_params(options):
+    # fuzzy matching is off by default - leaving the threshold out then
+    # keeps the stage up to date by file modification times
+    if options.fuzzy_threshold is None:
+        return {}
+    return {'fuzzy_threshold': options.fuzzy_threshold}
+
+def get_identify_chain_restaurants_params(options):
+    return {
+        'num_clusters': options.num_clusters,
+        'method': options.method,
+        'linkage_method': options.linkage,
+        'linkage_input': options.linkage_input,
+        'required_terms': options.required_terms,
+        'optional_terms': options.optional_terms
+    }
+
+def get_analyze_and_visualize_params(options):
+    return {
+        'location1': options.location1,
+        'location2': options.location2,
+        'dist': options.dist,
+        'marker_mode': options.markers,
+        'heat_map_mode': options.heat_map,
+        'heat_map_zoom': options.heat_map_zoom
+    }
+
+STAGES = [
+    Stage(
+        'preprocess-osm-data', '01-preprocess-osm-data.py',
+        ['amenities'], ['osm_data'], run_preprocess_osm_data,
+        get_preprocess_osm_data_params
+    ),
+    Stage(
+        'scrape-wikidata', '02-scrape-wikidata.py',
+        ['osm_data'], ['wikidata'], run_scrape_wikidata, get_no_params,
+        cached=False
+    ),
+    Stage(
+        'preprocess-wikidata', '03-preprocess-wikidata.py',
+        ['wikidata'], ['preprocessed_wikidata'], run_preprocess_wikidata,
+        get_no_params
+    ),
+    Stage(
+        'identify-chain-restaurants', '04-identify-chain-restaurants.py',
+        ['osm_data', 'wikidata', 'preprocessed_wikidata'],
+        ['chain_restaurant_qids'], run_identify_chain_restaurants,
+        get_identify_chain_restaurants_params
+    ),
+    Stage(
+        'analyze-and-visualize', '05-analyze-and-visualize.py',
+        ['osm_data', 'chain_restaurant_qids'], ['map', 'heat_map'],
+        run_analyze_and_visualize, get_analyze_and_visualize_params
+    )
+]
+
+def get_stage_order(stages):
+    """Sort stages so every stage comes after the stages producing its
+    inputs
+
+    Args:
+        stages (list): Stage tuples
+
+    Returns:
+        ordered_stages (list): stages in dependency order
+
+    Raises:
+        ValueError: if the stages have a dependency cycle
+    """
+
+    producers = {
+        output: stage.name for stage in stages for output in stage.outputs
+    }
+    dependencies = {
+        stage.name: {
+            producers[name] for name in stage.inputs if name in producers
+        }
+        for stage in stages
+    }
+
+    ordered_stages = []
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [
+            stage for stage in remaining if dependencies[stage.name] <= done
+        ]
+        if not ready:
+            raise ValueError('stage dependencies contain a cycle')
+        for stage in ready:
+            ordered_stages.append(stage)
+            done.add(stage.name)
+            remaining.remove(stage)
+    return ordered_stages
+
+def load_stage_module(stage):
+    """Import the script of a stage as a module (the scripts' file names are
+    not valid module names)
+
+    Args:
+        stage (Stage): stage to import
+
+    Returns:
+        module (module): the stage's script
+    """
+
+    module_name = stage.script[:-len('.py')].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(
+        module_name, os.path.join(SCRIPT_DIR, stage.script)
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def get_stamp_path(stage, paths):
+    """Get the file recording what the output files of a stage were made
+    with - a hidden file next to its first output, e.g.
+    data/.preprocess-osm-data.stamp
+
+    Args:
+        stage (Stage): stage
+        paths (dict): contains (artifact name, file path) key value pairs
+
+    Returns:
+        stamp_path (str): json file
+    """
+
+    output_path = paths[stage.outputs[0]]
+    return os.path.join(os.path.dirname(output_path), f'.{stage.name}.stamp')
+
+def read_stamp(stage, paths):
+    """Read the stamp of a stage's output files
+
+    Returns:
+        stamp (dict):
+            digest of the params, and digests of the inputs and outputs
+            (empty without the stage cache) the files were written with,
+            None if there is no (readable) stamp
+    """
+
+    try:
+        with open(get_stamp_path(stage, paths)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_stamp(stage, paths, params, input_keys, digests):
+    """Record the params, input digests and output digests a stage's output
+    files were just written with
+
+    Returns:
+        None
+    """
+
+    stamp = {
+        'params': memo.hash_value(params),
+        'inputs': input_keys,
+        'outputs': digests
+    }
+    with open(get_stamp_path(stage, paths), 'w') as f:
+        json.dump(stamp, f)
+
+def is_up_to_date(stage, paths, params, input_keys=None):
+    """Check whether the output files of a stage exist, are newer than its
+    input files, script and the local modules it imports, and were made with
+    the same params
+
+    Args:
+        stage (Stage): stage to check
+        paths (dict): contains (artifact name, file path) key value pairs
+        params (dict): parameters the stage's outputs depend on
+        input_keys (dict):
+            digests of inputs that are not (or not only) in their files, e.g.
+            outputs of a cached stage - the output files must then have been
+            made from inputs with these digests rather than be newer than
+            the input files
+
+    Returns:
+        up_to_date (bool):
+            True if the stage does not need to run - outputs without a stamp
+            (e.g. written by running the stage's script) count as made with
+            default params from the input files, so only a stage without
+            params and with input_keys None is up to date
+    """
+
+    output_paths = [paths[name] for name in stage.outputs]
+    if not all(os.path.exists(path) for path in output_paths):
+        return False
+
+    script = os.path.join(SCRIPT_DIR, stage.script)
+    input_paths = [script] + memo.get_local_imports(script, SCRIPT_DIR)
+    if input_keys is None:
+        input_paths.extend(paths[name] for name in stage.inputs)
+    if not all(os.path.exists(path) for path in input_paths):
+        return False
+
+    newest_input = max(os.path.getmtime(path) for path in input_paths)
+    oldest_output = min(os.path.getmtime(path) for path in output_paths)
+    if newest_input > oldest_output:
+        return False
+
+    stamp = read_stamp(stage, paths)
+    if stamp is None:
+        return input_keys is None and not params
+    if stamp['params'] != memo.hash_value(params):
+        return False
+    if input_keys is None:
+        return True
+    stamp_time = os.path.getmtime(get_stamp_path(stage, paths))
+    return (
+        stamp.get('inputs') == input_keys
+        and max(os.path.getmtime(path) for path in output_paths) <= stamp_time
+    )
+
+def has_output_files(stage, paths, digests):
+    """Check whether the output files of a stage hold the outputs with the
+    given digests - they were written with them and not changed since
+
+    Args:
+        stage (Stage): stage to check
+        paths (dict): contains (artifact name, file path) key value pairs
+        digests (dict): contains (output name, digest) key value pairs
+
+    Returns:
+        has_outputs (bool): True if the files hold the outputs
+    """
+
+    stamp = read_stamp(stage, paths)
+    if stamp is None or not digests or stamp['outputs'] != digests:
+        return False
+    stamp_time = os.path.getmtime(get_stamp_path(stage, paths))
+    return all(
+        os.path.exists(paths[name]) and os.path.getmtime(paths[name]) <= stamp_time
+        for name in stage.outputs
+    )
+
+def run_pipeline(options, stages=STAGES, artifacts=ARTIFACTS):
+    """Run the pipeline in a single process, handing dataframes from one
+    stage to the next in memory
+
+    A stage is skipped if
+        - no stage it depends on produced new outputs, its output files are
+          newer than its input files and code and its stamp file records
+          the same parameters (see is_up_to_date) - or, with the stage
+          cache, its stamp records the same digests of the new outputs it
+          takes as inputs. The outputs are then read from disk only when a
+          later stage needs them, or
+        - its outputs are cached under a key made from its code (script and
+          local modules), its inputs (a digest of the input file, or of the
+          output of the stage producing it) and its parameters - stages
+          with cached=False are never looked up in (or added to) the cache.
+          Cached outputs the output files already hold (see
+          has_output_files) do not count as new outputs for later stages
+
+    The stamp file is written whenever all of a stage's output files are
+    written - with write_intermediates, for stages with cached=False (their
+    outputs are always written, they are not kept anywhere else) and for
+    stages such as stage 05 that only write files themselves
+
+    Args:
+        options (argparse.Namespace):
+            paths, force, write_intermediates, dry_run, cache_dir (None to
+            disable the cache), cache_size and the stage parameters
+
+        stages (list): Stage tuples
+        artifacts (dict): contains (artifact name, Artifact) key value pairs
+
+    Returns:
+        stage_names (list): names of the stages that ran, in order
+    """
+
+    stages = get_stage_order(stages)
+
+    stage_cache = None
+    if options.cache_dir is not None:
+        stage_cache = memo.StageCache(options.cache_dir, options.cache_size)
+
+    values = {}
+    def get_value(name):
+        # outputs of skipped stages are read from disk when needed
+        if name not in values:
+            with instrument.span(f'read {name}') as read_span:
+                values[name] = artifacts[name].load(options.paths[name])
+                read_span.rows_out = instrument.count_rows(values[name])
+        return values[name]
+
+    artifact_keys = {}
+    def get_artifact_key(name):
+        if name not in artifact_keys:
+            artifact_keys[name] = memo.hash_file(options.paths[name])
+        return artifact_keys[name]
+
+    # artifacts whose value differs from (or is not in) their file
+    new_artifacts = set()
+    ran = []
+    for stage in stages:
+        is_forced = stage.name in options.force
+        has_new_inputs = bool(new_artifacts.intersection(stage.inputs))
+        params = stage.params(options)
+
+        # new outputs are compared by their digests - unknown for stages
+        # that would run in a dry run
+        input_keys = None
+        if (
+            has_new_inputs
+            and stage_cache is not None
+            and all(name in artifact_keys for name in stage.inputs if name in new_artifacts)
+        ):
+            input_keys = {name: get_artifact_key(name) for name in stage.inputs}
+
+        if (
+            not is_forced
+            and (not has_new_inputs or input_keys is not None)
+            and is_up_to_date(stage, options.paths, params, input_keys)
+        ):
+            print(f'{stage.name}: up to date')
+            # later stages are keyed by the digests the files were written
+            # with, the same keys as when this stage runs
+            stamp = read_stamp(stage, options.paths)
+            if stamp is not None and has_output_files(stage, options.paths, stamp['outputs']):
+                artifact_keys.update(stamp['outputs'])
+            continue
+
+        key = None
+        if (
+            stage_cache is not None
+            and stage.cached
+            and not (options.dry_run and has_new_inputs)
+        ):
+            key = memo.get_stage_key(
+                stage.name,
+                memo.get_code_hash(
+                    os.path.join(SCRIPT_DIR, stage.script), SCRIPT_DIR
+                ),
+                {name: get_artifact_key(name) for name in stage.inputs},
+                params
+            )
+
+        if key is not None and not is_forced:
+            if options.dry_run:
+                if key in stage_cache:
+                    print(f'{stage.name}: cached')
+                    continue
+            else:
+                outputs, digests = stage_cache.get(key)
+                if outputs is not None:
+                    print(f'{stage.name}: cached')
+                    values.update(
+                        (name, value) for name, value in outputs.items()
+                        if artifacts[name].load is not None
+                    )
+                    artifact_keys.update(digests)
+                    if has_output_files(stage, options.paths, digests):
+                        continue
+                    if save_outputs(stage, outputs, options, artifacts):
+                        write_stamp(
+                            stage, options.paths, params,
+                            {name: get_artifact_key(name) for name in stage.inputs},
+                            digests
+                        )
+                    new_artifacts.update(stage.outputs)
+                    continue
+
+        print(f'{stage.name}: running')
+        ran.append(stage.name)
+        new_artifacts.update(stage.outputs)
+        if options.dry_run:
+            continue
+
+        with instrument.span(stage.name) as stage_span:
+            with instrument.span('import'):
+                module = load_stage_module(stage)
+            inputs = {name: get_value(name) for name in stage.inputs}
+            stage_span.rows_in = count_frame_rows(inputs)
+            outputs = stage.run(module, inputs, options)
+            stage_span.rows_out = count_frame_rows(outputs)
+            values.update(outputs)
+            with instrument.span('write'):
+                is_saved = save_outputs(stage, outputs, options, artifacts)
+
+        digests = {}
+        if key is not None:
+            outputs.update(read_file_outputs(stage, options, artifacts))
+            digests = stage_cache.put(key, outputs)
+        elif stage_cache is not None:
+            # later stages are keyed by the content of these outputs, not by
+            # the (possibly outdated) files
+            digests = {
+                name: memo.hash_output(value) for name, value in outputs.items()
+            }
+        artifact_keys.update(digests)
+        if is_saved:
+            input_keys = {}
+            if stage_cache is not None:
+                input_keys = {name: get_artifact_key(name) for name in stage.inputs}
+            write_stamp(stage, options.paths, params, input_keys, digests)
+
+    if stage_cache is not None:
+        print(
+            f'Stage cache hits: {stage_cache.hits}, '
+            f'misses: {stage_cache.misses}'
+        )
+    return ran
+
+def count_frame_rows(artifact_values):
+    """Count the rows of the dataframes among the values of some artifacts
+    (files such as map.html are not counted)
+
+    Args:
+        artifact_values (dict): contains (artifact name, value) pairs
+
+    Returns:
+        num_rows (int): total number of rows, None if there are no dataframes
+    """
+
+    frames = [
+        value for value in artifact_values.values()
+        if isinstance(value, pd.DataFrame)
+    ]
+    return sum(len(frame) for frame in frames) if frames else None
+
+def print_metrics_summary(metrics_file, run=None):
+    """Print the time, peak memory and rows of each span of a run recorded
+    with --metrics (see instrument.py)
+
+    Args:
+        metrics_file (str): json-lines metrics file
+        run (str): identifier of the run, None for the last run in the file
+
+    Returns:
+        None
+    """
+
+    metrics = instrument.read_metrics(metrics_file, run)
+    summary = instrument.summarize_metrics(metrics)
+    print(f'Run {metrics["run"].iloc[0]} ({metrics_file}):')
+    print(summary.to_string(index=False, float_format='{:.3f}'.format))
+
+def read_file_outputs(stage, options, artifacts):
+    """Read the files a stage writes itself (e.g. map.html) so they can be
+    cached with its other outputs
+
+    Returns:
+        file_outputs (dict): contains (artifact name, file bytes) pairs
+    """
+
+    file_outputs = {}
+    for name in stage.outputs:
+        if artifacts[name].load is None:
+            with open(options.paths[name], 'rb') as f:
+                file_outputs[name] = f.read()
+    return file_outputs
+
+def save_outputs(stage, outputs, options, artifacts):
+    """Write the outputs of a stage that ran or was cached - files the stage
+    writes itself are restored from their cached bytes, dataframes are only
+    written with --write-intermediates or by stages with cached=False
+
+    Returns:
+        is_saved (bool): True if every output file of the stage is written
+    """
+
+    for name, value in outputs.items():
+        path = options.paths[name]
+        if artifacts[name].load is None:
+            if isinstance(value, bytes):
+                with open(path, 'wb') as f:
+                    f.write(value)
+        elif options.write_intermediates or not stage.cached:
+            write_frame(value, path)
+    return options.write_intermediates or not stage.cached or all(
+        artifacts[name].load is None for name in stage.outputs
+    )
+
+def parse_location(text):
+    """Parse a 'lat,lon' argument"""
+
+    lat, lon = text.split(',')
+    return [float(lat), float(lon)]
+
+def parse_path(text):
+    """Parse a 'name=path' argument"""
+
+    name, path = text.split('=', 1)
+    if name not in ARTIFACTS:
+        raise argparse.ArgumentTypeError(
+            f'unknown artifact {name!r}, expected one of {", ".join(ARTIFACTS)}'
+        )
+    return name, path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run the out of date pipeline stages in one process'
+    )
+    parser.add_argument(
+        '--path', type=parse_path, action='append', default=[],
+        metavar='NAME=PATH',
+        help='file used for an artifact, e.g. osm_data=data/osm.parquet'
+    )
+    parser.add_argument(
+        '--write-intermediates', action='store_true',
+        help='write the outputs of the stages that run to their files'
+    )
+    parser.add_argument(
+        '--force', action='append', default=[], metavar='STAGE',
+        choices=[stage.name for stage in STAGES],
+        help='run a stage (and the stages after it) even if up to date'
+    )
+    parser.add_argument(
+        '--dry-run', action='store_true',
+        help='only print which stages would run'
+    )
+    parser.add_argument(
+        '--location1', type=parse_location, default=[49.2768, -122.9180]
+    )
+    parser.add_argument(
+        '--location2', type=parse_location, default=[49.284478, -123.112349]
+    )
+    parser.add_argument('--dist', type=float, default=5)
+    parser.add_argument(
+        '--markers', choices=('circles', 'cluster', 'grid'), default='circles',
+        help='how restaurants are drawn on map.html - one circle per '
+             'restaurant, clustered in the browser or grid cells'
+    )
+    parser.add_argument(
+        '--heat-map', choices=('points', 'grid'), default='points',
+        help='send every restaurant to heat_map.html or only the number of '
+             'restaurants per grid cell (with chain/non chain layers)'
+    )
+    parser.add_argument(
+        '--heat-map-zoom', type=int, default=13,
+        help='zoom level whose resolution the heat map grid cells have'
+    )
+    parser.add_argument(
+        '--fuzzy-threshold', type=float, default=None,
+        help='fill in qids of OSM names similar to a name with a qid in '
+             'stage 01 (off by default)'
+    )
+    parser.add_argument(
+        '--scrape-workers', type=int, default=8,
+        help='maximum number of concurrent Wikidata requests in stage 02'
+    )
+    parser.add_argument(
+        '--scrape-rate', type=float, default=5,
+        help='maximum number of Wikidata requests per second in stage 02'
+    )
+    parser.add_argument(
+        '--wikidata-url', default='https://www.wikidata.org',
+        help='Wikidata host scraped by stage 02'
+    )
+    parser.add_argument(
+        '--wikidata-cache', default=None, metavar='FILE',
+        help='SQLite cache of scraped Wikidata entries (default: '
+             'wikidata-cache.sqlite next to the wikidata file)'
+    )
+    parser.add_argument(
+        '--no-wikidata-cache', action='store_true',
+        help='scrape every Wikidata entry without using the SQLite cache'
+    )
+    parser.add_argument(
+        '--wikidata-cache-ttl', type=float, default=30,
+        help='days before a cached Wikidata entry is scraped again'
+    )
+    parser.add_argument(
+        '--wikidata-cache-size', type=int, default=100000,
+        help='maximum number of cached Wikidata entries'
+    )
+    parser.add_argument(
+        '--scrape-mode', choices=('api', 'html'), default='api',
+        help='request Wikidata entries in bulk from the JSON API or scrape '
+             'each page'
+    )
+    parser.add_argument(
+        '--languages', default='en',
+        help='comma separated language codes in order of preference'
+    )
+    parser.add_argument(
+        '--restart-scrape', action='store_true',
+        help='discard the entries left by an interrupted scrape'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='only scrape qids that are new or stale compared to the '
+             'existing wikidata file'
+    )
+    parser.add_argument(
+        '--num-clusters', type=int, default=3,
+        help='number of clusters for identifying chain restaurants'
+    )
+    parser.add_argument(
+        '--method', choices=('hierarchical', 'kmeans', 'graph'),
+        default='hierarchical',
+        help='clustering method for identifying chain restaurants'
+    )
+    parser.add_argument(
+        '--linkage', default='complete',
+        help='scipy linkage method for --method hierarchical'
+    )
+    parser.add_argument(
+        '--linkage-input', choices=('similarities', 'distances'),
+        default='similarities',
+        help='cluster rows of cosine similarities (the original analysis) or '
+             'the condensed distances between them (same clusters, faster)'
+    )
+    parser.add_argument(
+        '--required-terms', nargs='+', default=['chain', 'restaurant'],
+        help='keywords that must all be in a chain restaurant\'s description'
+    )
+    parser.add_argument(
+        '--optional-terms', nargs='*', default=[],
+        help='keywords of which at least one must also be in the description'
+    )
+    parser.add_argument(
+        '--cache-dir', default='.pipeline-cache',
+        help='directory of cached stage outputs'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_const', const=None, dest='cache_dir',
+        help='do not read or write cached stage outputs'
+    )
+    parser.add_argument(
+        '--cache-size', type=float, default=1024,
+        help='maximum size of the cache directory in MB'
+    )
+    instrument.add_arguments(parser)
+    parser.add_argument(
+        '--summarize', default=None, metavar='FILE',
+        help='only print the summary of the last run in a metrics file '
+             '(of the pipeline or of a stage script run on its own)'
+    )
+    options = parser.parse_args()
+    if options.summarize is not None:
+        print_metrics_summary(options.summarize)
+        parser.exit()
+    options.cache_size = int(options.cache_size * 1024 * 1024)
+
+    paths = {name: artifact.path for name, artifact in ARTIFACTS.items()}
+    paths.update(options.path)
+    options.paths = paths
+
+    run = instrument.configure_from_args(options)
+    with instrument.span('pipeline'):
+        run_pipeline(options)
+    if options.metrics is not None:
+        print_metrics_summary(options.metrics, run)
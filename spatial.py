@@ -0,0 +1,74 @@
+import numpy as np
+
+from sklearn.neighbors import BallTree
+
+# mean earth radius used by the haversine package, so distances agree with
+# haversine_vector
+EARTH_RADIUS_KM = 6371.0088
+
+def build_spatial_index(points, leaf_size=40):
+    """Build a ball tree over (lat, lon) points using great circle
+    (haversine) distances - built once in O(n log(n)), it then finds the
+    points near a location without computing the distance to every point
+
+    Args:
+        points (array-like): n x 2 latitudes and longitudes in degrees
+        leaf_size (int): maximum number of points compared at a time
+
+    Returns:
+        spatial_index (BallTree): index of the points in radians
+    """
+
+    points = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    spatial_index = BallTree(points, leaf_size=leaf_size, metric='haversine')
+    return spatial_index
+
+def get_radius(radius_km):
+    """Convert a distance in km to the largest radius (in radians) below it,
+    so the ball tree's <= comparisons keep the points closer than
+    radius_km, like haversine_vector(...) < radius_km
+    """
+
+    return np.nextafter(radius_km / EARTH_RADIUS_KM, 0)
+
+def query_radius(spatial_index, locations, radius_km):
+    """Find the indexed points closer than radius_km to each location
+
+    Args:
+        spatial_index (BallTree): output of build_spatial_index
+        locations (array-like): m x 2 latitudes and longitudes in degrees
+        radius_km (float): distance in km
+
+    Returns:
+        indexes (list):
+            for each location, a sorted array of the positions (in the
+            points passed to build_spatial_index) of the points within
+            radius_km
+
+    Example:
+        query_radius(spatial_index, [[49.2768, -122.9180]], 5)[0] returns
+        the positions of the points within 5 km of SFU Burnaby
+    """
+
+    locations = np.radians(np.asarray(locations, dtype=np.float64).reshape(-1, 2))
+    indexes = spatial_index.query_radius(locations, get_radius(radius_km))
+    return [np.sort(location_indexes) for location_indexes in indexes]
+
+def count_within_radius(spatial_index, locations, radius_km):
+    """Count the indexed points closer than radius_km to each location
+    without collecting their positions
+
+    Args:
+        spatial_index (BallTree): output of build_spatial_index
+        locations (array-like): m x 2 latitudes and longitudes in degrees
+        radius_km (float): distance in km
+
+    Returns:
+        counts (ndarray): number of points within radius_km of each location
+    """
+
+    locations = np.radians(np.asarray(locations, dtype=np.float64).reshape(-1, 2))
+    counts = spatial_index.query_radius(
+        locations, get_radius(radius_km), count_only=True
+    )
+    return counts
@@ -0,0 +1,298 @@
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+
+import pandas as pd
+
+# extensions of the columnar formats, anything else is read/written as json
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+
+# compression used by pandas when writing to a file with these extensions
+COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+def open_output(output_file):
+    """Open output_file for writing bytes, compressed according to its
+    extension the way pandas would compress it
+
+    Args:
+        output_file (str): file to write
+
+    Returns:
+        f (file object): binary file object opened for writing
+    """
+
+    extension = os.path.splitext(output_file)[1]
+    opener = COMPRESSED_OPENERS.get(extension, open)
+    return opener(output_file, 'wb')
+
+def write_json_chunks(chunks, output_file, columns):
+    """Write dataframe chunks to a single json file with the same content as
+    pd.concat(chunks).to_json(output_file), without holding more than one
+    chunk in memory - every column is streamed to its own temporary file
+    and the files are joined at the end
+
+    Args:
+        chunks (iterable):
+            dataframes with consecutive, non-overlapping indexes - columns
+            missing from a chunk are written as null
+
+        output_file (str): json output file (optionally .gz/.bz2/.xz)
+        columns (list): columns to write, in order
+
+    Returns:
+        num_rows (int): number of rows written
+    """
+
+    num_rows = 0
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=output_dir) as temp_dir:
+        column_files = [
+            open(os.path.join(temp_dir, str(i)), 'w+', encoding='utf-8')
+            for i in range(len(columns))
+        ]
+        try:
+            for chunk in chunks:
+                chunk = chunk.reindex(columns=columns)
+                for column, column_file in zip(columns, column_files):
+                    # '{"0":...,"1":...}' -> '"0":...,"1":...'
+                    values = chunk[column].to_json()[1:-1]
+                    if not values:
+                        continue
+                    if column_file.tell() > 0:
+                        column_file.write(',')
+                    column_file.write(values)
+                num_rows += chunk.shape[0]
+
+            with open_output(output_file) as f:
+                f.write(b'{')
+                for i, (column, column_file) in enumerate(
+                    zip(columns, column_files)
+                ):
+                    # '{"column":{}}' -> '"column":' with pandas' escaping
+                    key = pd.DataFrame(columns=[column]).to_json()[1:-3]
+                    f.write(((',' if i > 0 else '') + key + '{').encode('utf-8'))
+                    column_file.seek(0)
+                    while True:
+                        block = column_file.read(1 << 20)
+                        if not block:
+                            break
+                        f.write(block.encode('utf-8'))
+                    f.write(b'}')
+                f.write(b'}')
+        finally:
+            for column_file in column_files:
+                column_file.close()
+
+    return num_rows
+
+def get_format(path):
+    """Get the file format of path from its extension
+
+    Args:
+        path (str): file path
+
+    Returns:
+        file_format (str): 'parquet', 'feather' or 'json'
+    """
+
+    path = path.lower()
+    if path.endswith(PARQUET_EXTENSIONS):
+        return 'parquet'
+    if path.endswith(FEATHER_EXTENSIONS):
+        return 'feather'
+    return 'json'
+
+def is_dict_column(series):
+    """Check whether a column holds dicts (e.g. OSM tags)"""
+
+    if series.dtype != object:
+        return False
+    first_valid_index = series.first_valid_index()
+    return (
+        first_valid_index is not None
+        and isinstance(series[first_valid_index], dict)
+    )
+
+def to_arrow_table(df):
+    """Convert a dataframe to an arrow table - dict columns are stored as
+    map<string, string> columns instead of one struct field per key
+
+    Args:
+        df (dataframe): data to convert
+
+    Returns:
+        table (pyarrow.Table): converted data
+    """
+
+    import pyarrow as pa
+
+    dict_columns = [column for column in df.columns if is_dict_column(df[column])]
+    table = pa.Table.from_pandas(df.drop(columns=dict_columns))
+    for column in dict_columns:
+        map_array = pa.array(
+            [
+                list(tags.items()) if isinstance(tags, dict) else None
+                for tags in df[column].tolist()
+            ],
+            type=pa.map_(pa.string(), pa.string())
+        )
+        table = table.add_column(df.columns.get_loc(column), column, map_array)
+    return table
+
+def from_arrow_table(table):
+    """Convert an arrow table written by to_arrow_table back to a dataframe -
+    map columns become dicts and list columns become lists, like the
+    columns read from json
+
+    Args:
+        table (pyarrow.Table): data to convert
+
+    Returns:
+        df (dataframe): converted data
+    """
+
+    import pyarrow as pa
+
+    nested_columns = {}
+    for i, field in enumerate(table.schema):
+        if pa.types.is_map(field.type):
+            nested_columns[field.name] = [
+                dict(pairs) if pairs is not None else None
+                for pairs in table.column(i).to_pylist()
+            ]
+        elif pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            nested_columns[field.name] = table.column(i).to_pylist()
+
+    df = table.drop_columns(list(nested_columns)).to_pandas()
+    for column, values in nested_columns.items():
+        df[column] = pd.Series(values, index=df.index, dtype=object)
+    # restore the column order (index columns are already in the index)
+    return df[[column for column in table.column_names if column in df.columns]]
+
+def write_arrow_chunks(chunks, output_file, columns):
+    """Write dataframe chunks to a single parquet or feather file with the
+    same content as write_frame(pd.concat(chunks), output_file), without
+    holding more than one chunk in memory - every chunk is written to a
+    temporary arrow stream as it arrives and the streams are copied to
+    output_file at the end with one schema for every chunk (a column that
+    is all null in one chunk gets its type from the others)
+
+    Args:
+        chunks (iterable):
+            dataframes with consecutive indexes starting at 0 - columns
+            missing from a chunk are written as null
+
+        output_file (str): .parquet/.pq or .feather/.arrow output file
+        columns (list): columns to write, in order
+
+    Returns:
+        num_rows (int): number of rows written
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    num_rows = 0
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=output_dir) as temp_dir:
+        chunk_files = []
+        schemas = []
+        for chunk in chunks:
+            chunk = chunk.reindex(columns=columns).reset_index(drop=True)
+            table = to_arrow_table(chunk)
+            for column in columns:
+                if chunk[column].isna().all():
+                    table = table.set_column(
+                        table.schema.get_field_index(column), column,
+                        pa.nulls(len(chunk))
+                    )
+
+            chunk_file = os.path.join(temp_dir, str(len(chunk_files)))
+            with pa.ipc.new_stream(chunk_file, table.schema) as writer:
+                writer.write_table(table)
+            chunk_files.append(chunk_file)
+            schemas.append(table.schema)
+            num_rows += len(chunk)
+
+        # the pandas metadata of a chunk describes its own index and dtypes,
+        # so it is left out - the columns are read back by their arrow types
+        if schemas:
+            schema = pa.unify_schemas(
+                schemas, promote_options='permissive'
+            ).remove_metadata()
+        else:
+            schema = to_arrow_table(
+                pd.DataFrame(columns=columns)
+            ).schema.remove_metadata()
+
+        if get_format(output_file) == 'parquet':
+            writer = pq.ParquetWriter(output_file, schema)
+        else:
+            # compressed like pyarrow.feather.write_feather
+            writer = pa.ipc.new_file(
+                output_file, schema,
+                options=pa.ipc.IpcWriteOptions(compression='lz4')
+            )
+        with writer:
+            for chunk_file in chunk_files:
+                with pa.ipc.open_stream(chunk_file) as reader:
+                    writer.write_table(reader.read_all().cast(schema))
+
+    return num_rows
+
+def read_frame(path, columns=None):
+    """Read a dataframe written by write_frame - the format is chosen by the
+    file extension (.parquet/.pq, .feather/.arrow, else json)
+
+    Args:
+        path (str): file to read
+        columns (list):
+            columns to read, None for every column - parquet and feather only
+            read these columns from disk
+
+    Returns:
+        df (dataframe): data read from path
+    """
+
+    file_format = get_format(path)
+    if file_format == 'json':
+        df = pd.read_json(path)
+        return df if columns is None else df[columns]
+
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if file_format == 'parquet':
+        table = pq.read_table(path, columns=columns)
+    else:
+        table = feather.read_table(path, columns=columns)
+    return from_arrow_table(table)
+
+def write_frame(df, path):
+    """Write a dataframe - the format is chosen by the file extension
+    (.parquet/.pq, .feather/.arrow, else json as written by df.to_json)
+
+    Args:
+        df (dataframe): data to write
+        path (str): output file
+
+    Returns:
+        None
+    """
+
+    file_format = get_format(path)
+    if file_format == 'json':
+        df.to_json(path)
+        return
+
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table = to_arrow_table(df)
+    if file_format == 'parquet':
+        pq.write_table(table, path)
+    else:
+        feather.write_feather(table, path)
@@ -1,8 +1,12 @@
+import heapq
 import numpy as np
 import pandas as pd
 import re
 
-from sklearn.feature_extraction.text import CountVectorizer
+from collections import Counter
+
+import categories
+from instrument import traced
 
 def get_tag_data(tags, tag_name):
     """Get a tag from the OSM entry's tags column 
@@ -22,7 +26,108 @@ def get_tag_data(tags, tag_name):
         
     return tag_data
 
-def get_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1)):
+@traced
+def get_tags_data(tags, tag_names):
+    """Get several tags from the OSM entries' tags column at once - equivalent
+    to calling get_tag_data once per tag name, without the per row apply
+    and try/except
+
+    Args:
+        tags (series): tags column, contains a dict (or NaN) per OSM entry
+        tag_names (list): keys for the tag data
+
+    Returns:
+        tags_data (dataframe):
+            one column per tag name, containing the tag data if the tag
+            name is a valid key, else None - shares the index of tags
+
+    Example:
+        get_tags_data(osm_data['tags'], ['brand:wikidata', 'cuisine'])
+        returns a dataframe with the columns 'brand:wikidata' and 'cuisine'
+    """
+
+    # replace missing tags (NaN) with an empty dict once, so each tag is a
+    # plain list comprehension of dict lookups
+    no_tags = {}
+    tags_list = [
+        tag if isinstance(tag, dict) else no_tags for tag in tags.tolist()
+    ]
+    tags_data = pd.DataFrame({
+        tag_name: pd.Series(
+            [tag.get(tag_name) for tag in tags_list],
+            index=tags.index,
+            dtype=object
+        )
+        for tag_name in tag_names
+    })
+    return tags_data
+
+def count_ngrams(chunks, ngram_range=(1, 1)):
+    """Count every n-gram in chunks of documents, one chunk at a time -
+    memory is proportional to the number of distinct n-grams rather than
+    the number of documents. The documents are split into n-grams the same
+    way as in get_ngram_counts
+
+    Args:
+        chunks (iterable):
+            collections (e.g. series) of preprocessed names or descriptions,
+            such as a column of each chunk read with pd.read_json(...,
+            chunksize=...)
+
+        ngram_range (tuple):
+            range of n-grams to be counted, see get_ngram_counts
+
+    Returns:
+        counts (Counter): contains (n-gram, count) key value pairs
+    """
+
+    # sklearn is slow to import and only needed here
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    analyzer = CountVectorizer(
+        lowercase=False,
+        ngram_range=ngram_range
+    ).build_analyzer()
+
+    # a Counter over the analyzer's n-grams is as fast as summing the
+    # chunks' HashingVectorizer matrices and, unlike hashing, keeps the
+    # n-grams themselves and never merges two of them into one count
+    counts = Counter()
+    for chunk in chunks:
+        for document in chunk:
+            counts.update(analyzer(document))
+    return counts
+
+def get_top_ngram_counts(counts, num_ngrams=10):
+    """Get the most frequent n-grams from (n-gram, count) pairs with a
+    heap, without sorting every n-gram
+
+    Args:
+        counts (dict): contains (n-gram, count) key value pairs
+        num_ngrams (int): number of top n-grams to be returned, None for all
+
+    Returns:
+        ngram_counts (dataframe):
+            the top n-grams along with their counts in 'ngram' and 'count'
+            columns, ordered by n-gram - ties are broken in favour of the
+            alphabetically first n-grams
+    """
+
+    if num_ngrams is None:
+        top_ngrams = counts.items()
+    else:
+        top_ngrams = heapq.nsmallest(
+            num_ngrams, counts.items(), key=lambda item: (-item[1], item[0])
+        )
+
+    ngram_counts = pd.DataFrame(
+        sorted(top_ngrams), columns=['ngram', 'count']
+    ).astype({'count': 'int64'})
+    return ngram_counts
+
+@traced
+def get_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1),
+                     chunksize=None):
     """Get the counts of the most frequent n-grams within a collection 
     of documents - the variable name ngram_range was taken from the 
     documentation for sklearn's CountVectorizer 
@@ -39,6 +144,12 @@ def get_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1)):
             range of n-grams to be counted - (1, 1) returns single words
             and their counts, (1, 2) for single words and pairs of words, 
             (2, 2) for pairs of words, etc
+
+        chunksize (int):
+            count the n-grams of chunksize documents at a time with
+            count_ngrams, so memory does not grow with the number of
+            documents - None to count them all at once with a sparse
+            document-term matrix
         
     Returns:
         ngram_counts (dataframe): 
@@ -46,21 +157,33 @@ def get_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1)):
             'count' columns
     """
     
+    if chunksize is not None:
+        chunks = (
+            documents[start:start + chunksize]
+            for start in range(0, len(documents), chunksize)
+        )
+        counts = count_ngrams(chunks, ngram_range)
+        return get_top_ngram_counts(counts, num_ngrams)
+
+    # sklearn is slow to import and only needed here
+    from sklearn.feature_extraction.text import CountVectorizer
+
     vectorizer = CountVectorizer(
         lowercase=False, 
         max_features=num_ngrams,
         ngram_range=ngram_range
     )
     
-    # number of documents (row) by number of grams (column)
+    # number of documents (row) by number of grams (column) - summed while
+    # sparse, the dense matrix would have an entry for every pair
     X = vectorizer.fit_transform(documents)
-    ngrams = vectorizer.get_feature_names()
-    document_ngram_df = pd.DataFrame(X.toarray(), columns=ngrams)
-    ngram_counts = document_ngram_df.sum(axis=0).reset_index()
-    ngram_counts.rename(columns={'index': 'ngram', 0: 'count'}, inplace=True)
-    return ngram_counts   
+    ngram_counts = pd.DataFrame({
+        'ngram': vectorizer.get_feature_names_out(),
+        'count': np.asarray(X.sum(axis=0), dtype='int64').ravel()
+    })
+    return ngram_counts
 
-def sort_ngram_counts(ngram_counts, ascending=False):
+def sort_ngram_counts(ngram_counts, ascending=False, num_ngrams=None):
     """Sort n-grams by their count 
     
     Args:
@@ -70,20 +193,30 @@ def sort_ngram_counts(ngram_counts, ascending=False):
         ascending (bool): 
             determines whether the counts are sorted in ascending or descending
             order
+
+        num_ngrams (int):
+            only keep this many n-grams (the most frequent, or the least
+            frequent if ascending) - picked with a partial sort instead of
+            sorting every n-gram, None to keep all
         
     Returns:
         sorted_ngram_counts (dataframe):
             n-grams sorted by count
     """
     
-    sorted_ngram_counts = ngram_counts.sort_values(
-        by=['count'],
-        ascending=ascending
-    )
-    sorted_ngram_counts.reset_index(drop=True, inplace=True)
+    if num_ngrams is not None:
+        select = ngram_counts.nsmallest if ascending else ngram_counts.nlargest
+        sorted_ngram_counts = select(num_ngrams, 'count')
+    else:
+        sorted_ngram_counts = ngram_counts.sort_values(
+            by=['count'],
+            ascending=ascending
+        )
+    sorted_ngram_counts = sorted_ngram_counts.reset_index(drop=True)
     return sorted_ngram_counts
 
-def get_sorted_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1), ascending=False):
+def get_sorted_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1), ascending=False,
+                            chunksize=None):
     """Get n-grams sorted by their count
 
     Args:
@@ -103,13 +236,16 @@ def get_sorted_ngram_counts(documents, num_ngrams=10, ngram_range=(1, 1), ascend
             determines whether the counts are sorted in ascending or descending
             order
 
+        chunksize (int):
+            number of documents counted at a time, see get_ngram_counts
+
     Returns:
         sorted_ngram_counts (dataframe):
             n-grams sorted by count
     """
     
-    ngram_counts = get_ngram_counts(documents, num_ngrams, ngram_range)
-    sorted_ngram_counts = sort_ngram_counts(ngram_counts, ascending)
+    ngram_counts = get_ngram_counts(documents, num_ngrams, ngram_range, chunksize)
+    sorted_ngram_counts = sort_ngram_counts(ngram_counts, ascending, num_ngrams)
     return sorted_ngram_counts
 
 def get_match(pattern, text):
@@ -128,6 +264,96 @@ def get_match(pattern, text):
     match = re.search(pattern, text)
     return match
 
+@traced
+def get_term_matches(texts, terms):
+    """Check which keyword terms each text contains - equivalent to
+    texts.apply(lambda text: get_match(term, text)).notna() for each term,
+    but all terms are combined into one compiled pattern so adding a term
+    does not add another pass over the texts
+
+    A vectorized str.contains on the alternation of every term (run in C by
+    pyarrow for pandas string columns) first picks the texts which contain
+    any term. In those texts the alternation finds each position where some
+    term starts, and one optional named lookahead group per term records
+    every term starting there, so overlapping terms such as 'fast' and
+    'fast food' are both found
+
+    Args:
+        texts (series): Wikidata descriptions (missing texts match nothing)
+        terms (list): keywords (regex patterns, as used by get_match)
+
+    Returns:
+        term_matches (dataframe):
+            boolean column per term, True where the text contains the term -
+            shares the index of texts
+
+    Example:
+        get_term_matches(descriptions, ['chain', 'restaurant', 'fast food'])
+        returns a dataframe with the columns 'chain', 'restaurant' and
+        'fast food'
+    """
+
+    terms = list(terms)
+    found = np.zeros((len(texts), len(terms)), dtype=bool)
+
+    if len(terms) > 0:
+        any_term = '|'.join(f'(?:{term})' for term in terms)
+        group_names = [f'term{i}' for i in range(len(terms))]
+        any_term_pattern = re.compile(any_term)
+        terms_pattern = re.compile(''.join(
+            f'(?=(?P<{group_name}>{term}))?'
+            for group_name, term in zip(group_names, terms)
+        ))
+        groups = [
+            terms_pattern.groupindex[group_name] for group_name in group_names
+        ]
+
+        # descriptions repeat, so each distinct candidate is searched once
+        is_candidate = texts.str.contains(
+            any_term, regex=True, na=False
+        ).to_numpy(dtype=bool)
+        codes, candidates = pd.factorize(texts[is_candidate])
+        candidates = candidates.to_numpy(dtype=object)
+
+        candidate_found = []
+        for text in candidates:
+            text_found = [False] * len(terms)
+            match = any_term_pattern.search(text)
+            while match is not None:
+                start = match.start()
+                term_spans = terms_pattern.match(text, start).regs
+                for column, group in enumerate(groups):
+                    if term_spans[group][0] != -1:
+                        text_found[column] = True
+                match = any_term_pattern.search(text, start + 1)
+            candidate_found.append(text_found)
+        candidate_found = np.array(candidate_found, dtype=bool).reshape(
+            len(candidates), len(terms)
+        )
+        found[is_candidate] = candidate_found[codes]
+
+    term_matches = pd.DataFrame(found, index=texts.index, columns=terms)
+    return term_matches
+
+def get_rule_matches(term_matches, required_terms, optional_terms=()):
+    """Apply a keyword rule to the output of get_term_matches - a text
+    matches if it contains every required term and, if there are optional
+    terms, at least one of them
+
+    Args:
+        term_matches (dataframe): output of get_term_matches
+        required_terms (list): terms that must all be found
+        optional_terms (list): terms of which at least one must be found
+
+    Returns:
+        rule_matches (series): True where the text matches the rule
+    """
+
+    rule_matches = term_matches[list(required_terms)].all(axis=1)
+    if len(optional_terms) > 0:
+        rule_matches &= term_matches[list(optional_terms)].any(axis=1)
+    return rule_matches
+
 def get_chain_restaurant_qids(chain_restaurant_wikidata):
     """Get a dictionary which maps chain restaurant qids to 1
     
@@ -209,7 +435,15 @@ def num_to_long_df(num_chain_qids, num_chains, approach):
     return long_df[['type', 'value', 'approach']]
 
 def get_restaurant_amenities(osm_data):
-    """Get a dictionary which maps restaurant amenities to 1
+    """Get a dictionary which maps restaurant amenities to 1 - the amenities
+    of osm_data that categories.py classifies as restaurant amenities, so
+    this estimate and stage 05 count the same restaurants
+
+    This used to be the amenities of entries with a cuisine tag - on the
+    Vancouver data the classification adds bbq, biergarten, bistro,
+    disused:restaurant, food_court and juice_bar (entries without a cuisine
+    tag) and leaves out construction (sites tagged with the cuisine of the
+    restaurant being built)
     
     Args:
         osm_data (dataframe):
@@ -217,14 +451,15 @@ def get_restaurant_amenities(osm_data):
         
     Returns:
         restaurant_amenities (dict):
-            contains (amenity, 1) key value pairs for amenities associated
-            with a cuisine tag / restaurants
+            contains (amenity, 1) key value pairs for restaurant amenities,
+            in the order they first appear in osm_data
     """
-    has_cuisine = osm_data['cuisine'].notna()
-    amenities = osm_data.loc[has_cuisine, 'amenity'].unique()
+    amenities = osm_data['amenity'].dropna().unique()
+    restaurant_amenities = categories.get_restaurant_amenities(amenities)
+    amenities = [amenity for amenity in amenities if amenity in restaurant_amenities]
     restaurant_amenities = dict(zip(
         amenities, 
-        np.ones_like(amenities, dtype=int)
+        np.ones(len(amenities), dtype=int)
     ))
     return restaurant_amenities
 